@@ -0,0 +1 @@
+"""Performance benchmarks, run them as modules from the project directory"""
@@ -0,0 +1,75 @@
+"""Throughput of the async api under ASGI against the sync api under WSGI
+
+Start the same project twice with the same number of workers, once with
+synchronous WSGI workers and once with the uvicorn workers of
+gunicorn.conf.py, for example:
+
+    gunicorn facepad.wsgi --worker-class sync -w 4 -b 127.0.0.1:8001
+    GUNICORN_WORKERS=4 GUNICORN_BIND=127.0.0.1:8002 gunicorn -c gunicorn.conf.py
+
+then run the same load against both:
+
+    python -m benchmarks.asgi_vs_wsgi --username jdoe --password secret \\
+        --path content/get/jdoe --path friends/requests/ \\
+        --clients 100 --slow-clients 200 --slow-delay 1
+
+The WSGI server is sent the paths under /api/v1/ and the ASGI server the
+same paths under /api/v1/async/. The results of both are printed as JSON.
+gunicorn reads gunicorn.conf.py from the working directory, which is why
+the WSGI server is told to use the sync worker.
+"""
+
+import argparse
+import asyncio
+import json
+
+from . import loadgen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--wsgi", default="http://127.0.0.1:8001")
+    parser.add_argument("--asgi", default="http://127.0.0.1:8002")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument(
+        "--path",
+        action="append",
+        required=True,
+        help="api path to request, relative to /api/v1/, can be repeated",
+    )
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--slow-clients", type=int, default=0)
+    parser.add_argument(
+        "--slow-delay",
+        type=float,
+        default=1.0,
+        help="seconds a slow client pauses in the middle of each request",
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    token = loadgen.login(args.wsgi, args.username, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for name, base_url in (
+        ("wsgi", f"{args.wsgi.rstrip('/')}/api/v1/"),
+        ("asgi", f"{args.asgi.rstrip('/')}/api/v1/async/"),
+    ):
+        result = asyncio.run(
+            loadgen.run(
+                base_url,
+                args.path,
+                headers,
+                clients=args.clients,
+                duration=args.duration,
+                slow_clients=args.slow_clients,
+                slow_delay=args.slow_delay,
+            )
+        )
+        results[name] = result.summary()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
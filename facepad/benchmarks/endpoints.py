@@ -0,0 +1,244 @@
+"""Latency, throughput and query counts of every read endpoint
+
+Generate a dataset, start a server and point the harness at it:
+
+    SECRET_KEY=x python manage.py generate_dataset --users 2000
+    GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py
+    python -m benchmarks.endpoints --base-url http://127.0.0.1:8000 \\
+        --clients 20 --duration 10 --output results.json
+
+Each endpoint is loaded on its own by ``--clients`` concurrent keep-alive
+clients for ``--duration`` seconds, as a user of the dataset that has
+friends with content, comments and ratings. The results are printed as JSON
+with sorted keys and rounded numbers so the files of two commits can be
+diffed, and ``--baseline`` compares the run against an earlier file and
+exits with 1 when an endpoint got slower or runs more queries than the
+tolerance allows.
+
+Query counts come from the /metrics/ endpoint, which has to be reachable
+from the machine running the harness (METRICS_ALLOWED_IPS). Every worker only
+reports its own totals, so query counting needs a server with a single worker:
+the harness checks that the scrapes before and after each endpoint were
+answered by the same worker and stops with an error when they were not.
+``--no-queries`` skips the query counts to load a server with more workers.
+Repeated reads are served from the response cache, start the server with
+RESPONSE_CACHE_TIMEOUT=0 to measure the uncached endpoints.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import subprocess
+import sys
+import urllib.parse
+import urllib.request
+
+from . import loadgen
+
+METRIC_RE = re.compile(
+    r'^facepad_(\w+)\{endpoint="([^"]*)",method="([^"]*)"\} ([0-9.e+-]+)$'
+)
+WORKER_RE = re.compile(r"^facepad_worker_pid (\d+)$", re.MULTILINE)
+# read endpoints by url name, with their paths relative to /api/v1/
+ENDPOINTS = {
+    "users:get_user": "user/{username}/",
+    "users:friends": "user/{username}/friends/",
+    "users:mutual_friends": "user/{friend}/friends/mutual/",
+    "users:get_friend_requests": "friends/requests/",
+    "users:friend_suggestions": "friends/suggestions/",
+    "content:content": "content/create/",
+    "content:get_friend": "content/get/{friend}",
+    "content:feed": "content/feed/",
+    "content:search": "content/search/?q={word}",
+    "content:content_comment": "content/comment/{title}/",
+    "content:content_comment_comment": "content/comment/{title}/{comment}/",
+    "content:ratings": "content/rating/{title}/",
+    "content:ratings_summary": "content/rating/{title}/summary/",
+    "users_async:get_friend_requests": "async/friends/requests/",
+    "content_async:get_friend": "async/content/get/{friend}",
+    "content_async:content_comment": "async/content/comment/{title}/",
+    "content_async:content_comment_comment": (
+        "async/content/comment/{title}/{comment}/"
+    ),
+    "content_async:ratings": "async/content/rating/{title}/",
+}
+# how much worse than the baseline a number may get
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+LOWER_IS_WORSE = ("throughput",)
+
+
+def get_json(url, token):
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def discover(api_url, token, username, word):
+    """Values for the placeholders of ENDPOINTS, taken from the data of
+    ``username``: a friend with content that has comments"""
+    quote = urllib.parse.quote
+    friends = get_json(f"{api_url}user/{quote(username)}/friends/", token)
+    for friend in friends["results"]:
+        content = get_json(f"{api_url}content/get/{quote(friend['username'])}", token)
+        for item in content["results"]:
+            title = quote(item["title"])
+            comments = get_json(f"{api_url}content/comment/{title}/", token)
+            if comments["results"]:
+                return {
+                    "username": quote(username),
+                    "friend": quote(friend["username"]),
+                    "title": title,
+                    "comment": comments["results"][0]["id"],
+                    "word": quote(word),
+                }
+    raise SystemExit(f"{username} has no friend with commented content")
+
+
+def scrape(base_url):
+    """Pid of the worker that answered /metrics/ and its totals by
+    (endpoint, method)"""
+    with urllib.request.urlopen(f"{base_url}/metrics/") as response:
+        text = response.read().decode()
+    worker = WORKER_RE.search(text)
+    totals = {}
+    for line in text.splitlines():
+        match = METRIC_RE.match(line)
+        if match:
+            name, endpoint, method, value = match.groups()
+            totals.setdefault((endpoint, method), {})[name] = float(value)
+    return worker and int(worker.group(1)), totals
+
+
+def queries_per_request(before, after, endpoint):
+    """Queries per GET of ``endpoint`` between two scrapes of one worker"""
+    (before_pid, before), (after_pid, after) = before, after
+    if before_pid != after_pid:
+        raise SystemExit(
+            "/metrics/ was answered by different workers, count queries against "
+            "a server with a single worker (GUNICORN_WORKERS=1) or pass --no-queries"
+        )
+    old = before.get((endpoint, "GET"), {})
+    new = after.get((endpoint, "GET"), {})
+    requests = new.get("requests_total", 0) - old.get("requests_total", 0)
+    if not requests:
+        return None
+    queries = new.get("db_queries_total", 0) - old.get("db_queries_total", 0)
+    return round(queries / requests, 2)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as readable lines"""
+    regressions = []
+    for name, result in sorted(results["endpoints"].items()):
+        old = baseline.get("endpoints", {}).get(name)
+        if old is None:
+            continue
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            before, now = old.get(metric), result.get(metric)
+            if before is None or now is None:
+                continue
+            if metric == "queries_per_request":
+                worse = now > before
+            elif metric in HIGHER_IS_WORSE:
+                worse = now > before * (1 + tolerance)
+            else:
+                worse = now < before * (1 - tolerance)
+            if worse:
+                regressions.append(f"{name} {metric}: {before} -> {now}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--username",
+        default="bench0",
+        help="user to run as, the first users of a dataset have the most friends",
+    )
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--search-word", default="holiday")
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        choices=sorted(ENDPOINTS),
+        help="url name of an endpoint to run, can be repeated, default all",
+    )
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--no-queries",
+        action="store_false",
+        dest="queries",
+        help="do not count queries, for servers with more than one worker",
+    )
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="fraction latency and throughput may get worse than the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url.rstrip("/")
+    api_url = f"{base_url}/api/v1/"
+    token = loadgen.login(base_url, args.username, args.password)
+    values = discover(api_url, token, args.username, args.search_word)
+    results = {
+        "commit": git_commit(),
+        "config": {"clients": args.clients, "duration": args.duration},
+        "endpoints": {},
+    }
+    for name in args.endpoint or sorted(ENDPOINTS):
+        # a fresh token for every endpoint, access tokens are short lived
+        headers = {
+            "Authorization": "Bearer "
+            + loadgen.login(base_url, args.username, args.password)
+        }
+        before = scrape(base_url) if args.queries else None
+        result = asyncio.run(
+            loadgen.run(
+                api_url,
+                [ENDPOINTS[name].format(**values)],
+                headers,
+                clients=args.clients,
+                duration=args.duration,
+            )
+        )
+        summary = result.summary()
+        if args.queries:
+            summary["queries_per_request"] = queries_per_request(
+                before, scrape(base_url), name
+            )
+        results["endpoints"][name] = summary
+    output = json.dumps(results, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
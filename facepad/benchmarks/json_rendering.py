@@ -0,0 +1,156 @@
+"""Throughput of the JSON renderer and parser against DRF's stdlib ones
+
+Pages of content, comments and ratings are serialized with the serializers
+of the api, without a database, then rendered and parsed back over and over
+by both implementations:
+
+    SECRET_KEY=x python -m benchmarks.json_rendering --page-size 100
+
+The results are printed as JSON, per payload and implementation, along with
+whether both rendered exactly the same bytes.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+from io import BytesIO
+
+
+def pages(page_size):
+    """Paginated payloads shaped like the responses of the listings"""
+    from content.models import Comment, Content, MediaDerivative, Rating
+    from content.serializers import (
+        CommentSerializer,
+        ContentSerializer,
+        RatingSerializer,
+    )
+
+    today = date.today()
+    content = []
+    for number in range(1, page_size + 1):
+        item = Content(
+            pk=number,
+            media=f"content/2023/01/01/{number}.jpg",
+            title=f"Title {number}",
+            description="Holiday pictures, très jolies " * 4,
+            owner_id=number % 7 + 1,
+            created_date=today - timedelta(days=number),
+            rating_count=number,
+            rating_sum=number * 3,
+            rating_3=number,
+        )
+        # stands in for prefetch_related("derivatives")
+        item._prefetched_objects_cache = {
+            "derivatives": [
+                MediaDerivative(
+                    content=item,
+                    label=label,
+                    file=f"derivatives/2023/01/01/{number}-{label}.webp",
+                )
+                for label in ("thumbnail", "medium")
+            ]
+        }
+        content.append(item)
+    comments = [
+        Comment(
+            pk=number,
+            owner_id=number % 7 + 1,
+            content_id=1,
+            text=f"Comment number {number}, with an émoji 🎉 and some words",
+            created_date=today,
+            parent_id=None if number % 3 else number - 1,
+            depth=0 if number % 3 else 1,
+        )
+        for number in range(1, page_size + 1)
+    ]
+    ratings = [
+        Rating(
+            pk=number,
+            owner_id=number,
+            content_id=1,
+            value=number % 5 + 1,
+            created_date=today,
+        )
+        for number in range(1, page_size + 1)
+    ]
+
+    def page(serializer_class, items):
+        return {
+            "next": "http://testserver/api/v1/next/?cursor=cD0yMDIzLTAxLTAx",
+            "previous": None,
+            "results": serializer_class(items, many=True).data,
+        }
+
+    return {
+        "content": page(ContentSerializer, content),
+        "comments": page(CommentSerializer, comments),
+        "ratings": page(RatingSerializer, ratings),
+    }
+
+
+def measure(function, repeat):
+    """Calls per second of ``function``, best of three rounds"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return repeat / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "facepad.settings")
+    import django
+
+    django.setup()
+    from facepad import fastjson
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    implementations = {
+        "stdlib": (JSONRenderer(), JSONParser()),
+        "fast": (fastjson.JSONRenderer(), fastjson.JSONParser()),
+    }
+    results = {"orjson": fastjson.orjson is not None}
+    for name, data in pages(args.page_size).items():
+        rendered = {
+            implementation: renderer.render(data)
+            for implementation, (renderer, _) in implementations.items()
+        }
+        result = {
+            "bytes": len(rendered["stdlib"]),
+            "identical": rendered["stdlib"] == rendered["fast"],
+        }
+        for implementation, (renderer, parser) in implementations.items():
+            body = rendered[implementation]
+            result[implementation] = {
+                "renders_per_second": round(
+                    measure(lambda: renderer.render(data), args.repeat), 1
+                ),
+                "parses_per_second": round(
+                    measure(lambda: parser.parse(BytesIO(body)), args.repeat), 1
+                ),
+            }
+        result["render_speedup"] = round(
+            result["fast"]["renders_per_second"]
+            / result["stdlib"]["renders_per_second"],
+            2,
+        )
+        result["parse_speedup"] = round(
+            result["fast"]["parses_per_second"] / result["stdlib"]["parses_per_second"],
+            2,
+        )
+        results[name] = result
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Closed loop HTTP load generator on asyncio streams
+
+Each simulated client keeps one HTTP/1.1 keep-alive connection open and
+sends its next request as soon as the previous response arrived, cycling
+through the paths it was given. Slow clients dribble every request out in
+two halves with a pause in between, like a phone on a bad network, which
+ties up whatever the server assigned to their connection.
+
+Only the standard library is used so the benchmarks run anywhere the
+project does.
+"""
+
+import asyncio
+import itertools
+import json
+import math
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+PERCENTILES = (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99))
+
+
+def percentile(ordered, fraction):
+    """Nearest rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Result:
+    """Latencies and failures of one run"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self.elapsed = 0.0
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        summary = {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "statuses": {str(code): n for code, n in sorted(self.statuses.items())},
+            "throughput": round(len(ordered) / self.elapsed, 2) if self.elapsed else 0,
+        }
+        for name, fraction in PERCENTILES:
+            value = percentile(ordered, fraction)
+            summary[name] = None if value is None else round(value * 1000, 2)
+        return summary
+
+
+class Connection:
+    """One keep-alive connection to the server"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, request, slow_delay=0.0):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        if slow_delay:
+            half = len(request) // 2
+            self.writer.write(request[:half])
+            await self.writer.drain()
+            await asyncio.sleep(slow_delay)
+            request = request[half:]
+        self.writer.write(request)
+        await self.writer.drain()
+        return await self.read_response()
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def login(base_url, username, password):
+    """Access token of a user"""
+    request = urllib.request.Request(
+        f"{base_url.rstrip('/')}/api/v1/auth/login/",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)["access"]
+
+
+def build_request(host, path, headers):
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin1")
+
+
+async def _client(connection, requests, deadline, result, slow_delay):
+    for request in requests:
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        try:
+            status = await connection.request(request, slow_delay)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            result.errors += 1
+            connection.close()
+            continue
+        result.latencies.append(time.perf_counter() - start)
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+    connection.close()
+
+
+async def run(
+    base_url,
+    paths,
+    headers=None,
+    clients=50,
+    duration=10.0,
+    slow_clients=0,
+    slow_delay=0.0,
+):
+    """Runs ``clients`` fast and ``slow_clients`` slow clients against the
+    ``paths`` of ``base_url`` for ``duration`` seconds
+
+    Only the requests of the fast clients are counted, the slow ones are
+    there to hold connections open.
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    prefix = url.path.rstrip("/")
+    requests = [
+        build_request(url.netloc, f"{prefix}/{path.lstrip('/')}", headers or {})
+        for path in paths
+    ]
+    result = Result()
+    ignored = Result()
+    start = time.perf_counter()
+    deadline = start + duration
+    tasks = [
+        _client(
+            Connection(host, port),
+            itertools.islice(itertools.cycle(requests), number, None),
+            deadline,
+            result,
+            0.0,
+        )
+        for number in range(clients)
+    ]
+    tasks += [
+        _client(
+            Connection(host, port),
+            itertools.cycle(requests),
+            deadline,
+            ignored,
+            slow_delay,
+        )
+        for _ in range(slow_clients)
+    ]
+    await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,24 @@
+from django.urls import path
+
+from .async_views import (
+    GetFriendContentView,
+    ListCommentView,
+    ListRatingsView,
+)
+
+app_name = "content_async"
+
+urlpatterns = [
+    path("content/get/<owner>", GetFriendContentView.as_view(), name="get_friend"),
+    path(
+        "content/comment/<content>/",
+        ListCommentView.as_view(),
+        name="content_comment",
+    ),
+    path(
+        "content/comment/<content>/<parent_comment>/",
+        ListCommentView.as_view(),
+        name="content_comment_comment",
+    ),
+    path("content/rating/<content>/", ListRatingsView.as_view(), name="ratings"),
+]
@@ -0,0 +1,131 @@
+"""Async versions of the content listings, see facepad.asyncviews"""
+
+from functools import partial
+
+from content.models import Comment, Content, Rating
+from content.serializers import (
+    CommentSerializer,
+    CommentTreeSerializer,
+    CommentValuesSerializer,
+    ContentSerializer,
+    ContentValuesSerializer,
+    RatingSerializer,
+    RatingValuesSerializer,
+)
+from django.contrib.auth import get_user_model
+from facepad import responsecache
+from facepad.asyncviews import AsyncListAPIView
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+
+
+class GetFriendContentView(AsyncListAPIView):
+    """Content of a user, for themselves, their friends and admins"""
+
+    serializer_class = ContentSerializer
+    values_serializer_class = ContentValuesSerializer
+
+    async def get(self, request, *args, **kwargs):
+        self.owner_id = (
+            await get_user_model()
+            .objects.filter(username=self.kwargs["owner"])
+            .values_list("id", flat=True)
+            .afirst()
+        )
+        visibility = None
+        if self.owner_id is not None:
+            visibility = await responsecache.avisibility(request.user, self.owner_id)
+        if visibility is None:
+            return self.render(
+                {"message": "user content not found"}, status.HTTP_404_NOT_FOUND
+            )
+        resources = [
+            responsecache.USER.format(self.owner_id),
+            responsecache.USER_CONTENT.format(self.owner_id),
+        ]
+        data = await responsecache.acached(
+            request, resources, visibility, partial(self.get_data, request)
+        )
+        return self.render(data)
+
+    async def get_queryset(self):
+        return Content.objects.filter(owner_id=self.owner_id).prefetch_related(
+            "derivatives"
+        )
+
+
+class ResolvedContentMixin:
+    """Async counterpart of content.views.ResolvedContentMixin, responses
+    are cached until the content or one of ``cached_resources`` changes"""
+
+    content_url_kwarg = "content"
+    cached_resources = ()
+
+    async def get_content(self):
+        if getattr(self, "_content", None) is None:
+            try:
+                self._content = await Content.objects.select_related("owner").aget(
+                    title=self.kwargs.get(self.content_url_kwarg)
+                )
+            except Content.DoesNotExist:
+                raise NotFound()
+        return self._content
+
+    async def get(self, request, *args, **kwargs):
+        content = await self.get_content()
+        visibility = await responsecache.avisibility(request.user, content.owner_id)
+        if visibility is None:
+            return self.render(None, status.HTTP_401_UNAUTHORIZED)
+        resources = [responsecache.CONTENT.format(content.pk)] + [
+            resource.format(content.pk) for resource in self.cached_resources
+        ]
+        data = await responsecache.acached(
+            request, resources, visibility, partial(self.get_data, request)
+        )
+        return self.render(data)
+
+
+class ListCommentView(ResolvedContentMixin, AsyncListAPIView):
+    """Comments of a piece of content, or a thread with ``parent_comment``"""
+
+    serializer_class = CommentSerializer
+    values_serializer_class = CommentValuesSerializer
+    cached_resources = (responsecache.COMMENTS,)
+
+    async def get_data(self, request):
+        if self.kwargs.get("parent_comment"):
+            return await self.thread(request, await self.get_content())
+        return await super().get_data(request)
+
+    async def get_queryset(self):
+        return Comment.objects.filter(content=await self.get_content())
+
+    async def thread(self, request, content):
+        """Comment with its replies nested, ``depth`` limits how many levels"""
+        try:
+            max_depth = request.query_params.get("depth")
+            max_depth = None if max_depth is None else max(int(max_depth), 0)
+        except ValueError:
+            raise ValidationError({"depth": "A valid integer is required."})
+        try:
+            parent_comment = await Comment.objects.aget(
+                id=int(self.kwargs["parent_comment"]), content=content
+            )
+        except (Comment.DoesNotExist, ValueError):
+            raise NotFound()
+        comments = [comment async for comment in parent_comment.subtree(max_depth)]
+        serializer = CommentTreeSerializer(
+            comments, context=self.get_serializer_context()
+        )
+        return serializer.data
+
+
+class ListRatingsView(ResolvedContentMixin, AsyncListAPIView):
+    """Ratings of a piece of content"""
+
+    serializer_class = RatingSerializer
+    values_serializer_class = RatingValuesSerializer
+    cached_resources = (responsecache.RATINGS,)
+
+    async def get_queryset(self):
+        return Rating.objects.filter(content=await self.get_content())
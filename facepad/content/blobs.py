@@ -0,0 +1,66 @@
+"""Reference counting of the media blobs used by Content"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import Content, MediaBlob
+
+
+def retain(name):
+    """Counts one more Content row using the media ``name``"""
+    if not name:
+        return
+    MediaBlob.objects.bulk_create([MediaBlob(name=name)], ignore_conflicts=True)
+    MediaBlob.objects.filter(name=name).update(
+        ref_count=F("ref_count") + 1, released_date=None
+    )
+
+
+def release(name):
+    """Counts one less Content row using the media ``name``"""
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name).update(
+        ref_count=F("ref_count") - 1,
+        released_date=Case(
+            When(ref_count__lte=1, then=timezone.now()), default=F("released_date")
+        ),
+    )
+
+
+def reuse(name):
+    """Restarts the grace period of ``name`` for an upload that found it stored
+
+    Must be called before checking that the file exists: once it returns the
+    blob is either kept for another grace period or already collected.
+    """
+    MediaBlob.objects.filter(name=name, ref_count__lte=0).update(
+        released_date=timezone.now()
+    )
+
+
+def collect(grace=timedelta(hours=1)):
+    """Deletes blobs that no Content has used for longer than ``grace``
+
+    The grace period covers uploads that found the blob already stored but
+    have not saved their Content row yet, see reuse. Returns the deleted names.
+    """
+    storage = Content._meta.get_field("media").storage
+    cutoff = timezone.now() - grace
+    deleted = []
+    orphans = MediaBlob.objects.filter(ref_count__lte=0, released_date__lt=cutoff)
+    for blob in orphans.iterator():
+        with transaction.atomic():
+            # only delete the file when the row was still orphaned and not
+            # reused when deleted, the file goes before the row lock is let go
+            # so an upload waiting on it finds the blob missing and writes it
+            rows, _ = MediaBlob.objects.filter(
+                pk=blob.pk, ref_count__lte=0, released_date__lt=cutoff
+            ).delete()
+            if rows:
+                storage.delete(blob.name)
+                deleted.append(blob.name)
+    return deleted
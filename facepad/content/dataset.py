@@ -0,0 +1,321 @@
+"""Synthetic social graph for benchmarks
+
+Generates users with a power-law friend graph, grown by preferential
+attachment (Barabási–Albert) so a few users have many friends and most have
+a few, content with small media, comment threads and ratings by the owner's
+friends. Comment, reply and rating counts are heavy tailed too. Rows are
+written with ``bulk_create`` in batches, so the signals that normally keep
+feeds, search documents, media reference counts, rating aggregates and
+friend suggestions up to date do not run, and ``generate`` fills them in
+itself. Derivatives are not generated.
+
+The same seed always gives the same graph, so benchmark runs on different
+commits can use identical data.
+"""
+
+import random
+from collections import Counter
+from datetime import date, timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+from PIL import Image
+from users import friendships, suggestions
+
+from . import search
+from .models import (
+    RATING_VALUES,
+    Comment,
+    Content,
+    Feed,
+    FeedItem,
+    MediaBlob,
+    Rating,
+    SearchDocument,
+)
+
+MEDIA_COLORS = ["red", "green", "blue", "yellow", "purple", "orange", "white", "black"]
+WORDS = (
+    "holiday beach mountain city night party friends family dinner concert "
+    "sunset garden winter summer road trip coffee dog cat birthday"
+).split()
+MAX_REPLY_DEPTH = 3
+
+
+class DatasetError(Exception):
+    pass
+
+
+def heavy_tailed(rng, mean, limit):
+    """Pareto distributed count with the given mean, at most ``limit``"""
+    return min(int(mean * (rng.paretovariate(2.0) - 1)), limit)
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def power_law_edges(user_ids, friends_per_user, rng):
+    """Friend pairs grown by preferential attachment
+
+    Every user after the first ``friends_per_user + 1``, who are all friends,
+    befriends ``friends_per_user`` earlier users picked in proportion to how
+    many friends they already have.
+    """
+    seed = user_ids[: friends_per_user + 1]
+    edges = [(a, b) for index, a in enumerate(seed) for b in seed[index + 1 :]]
+    # every user appears once per friend, so choosing from it is by degree
+    endpoints = [user_id for edge in edges for user_id in edge]
+    for user_id in user_ids[len(seed) :]:
+        targets = set()
+        while len(targets) < friends_per_user:
+            targets.add(rng.choice(endpoints))
+        for target in targets:
+            edges.append((user_id, target))
+            endpoints += (user_id, target)
+    return edges
+
+
+def media_names():
+    """Names of small stored images the content shares"""
+    storage = Content._meta.get_field("media").storage
+    names = []
+    for color in MEDIA_COLORS:
+        image = BytesIO()
+        Image.new("RGB", (64, 64), color).save(image, "PNG")
+        names.append(storage.save(f"{color}.png", ContentFile(image.getvalue())))
+    return names
+
+
+def create_users(count, prefix, password, batch_size):
+    User = get_user_model()
+    if User.objects.filter(username__startswith=prefix).exists():
+        raise DatasetError(f"users named {prefix}* exist already, pick another prefix")
+    password = make_password(password)
+    User.objects.bulk_create(
+        [
+            User(
+                username=f"{prefix}{number}",
+                email=f"{prefix}{number}@example.com",
+                first_name=f"First{number}",
+                last_name=f"Last{number}",
+                password=password,
+                date_of_birth=date(1970, 1, 1) + timedelta(days=number % 15000),
+            )
+            for number in range(count)
+        ],
+        batch_size=batch_size,
+    )
+    return list(
+        User.objects.filter(username__startswith=prefix)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def create_friendships(user_ids, friends_per_user, rng, batch_size):
+    """Friend ids of every user"""
+    Through = get_user_model().friends.through
+    friends = {user_id: [] for user_id in user_ids}
+    rows = []
+    for a, b in power_law_edges(user_ids, friends_per_user, rng):
+        friends[a].append(b)
+        friends[b].append(a)
+        rows.append(Through(from_user_id=a, to_user_id=b))
+        rows.append(Through(from_user_id=b, to_user_id=a))
+    Through.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return friends
+
+
+def build_content(user_ids, prefix, per_user, rng):
+    names = media_names()
+    today = date.today()
+    return [
+        Content(
+            media=rng.choice(names),
+            title=f"{prefix}-{user_id}-{number}",
+            description=sentence(rng, 12),
+            owner_id=user_id,
+            created_date=today - timedelta(days=rng.randrange(365)),
+        )
+        for user_id in user_ids
+        for number in range(heavy_tailed(rng, per_user, 50 * per_user))
+    ]
+
+
+def build_ratings(content, friends, per_content, rng):
+    """Ratings of ``content`` by friends of the owners, counted in the
+    aggregates of the content as ``ratings.add_rating`` would"""
+    rows = []
+    for item in content:
+        raters = friends[item.owner_id]
+        for owner_id in rng.sample(raters, heavy_tailed(rng, per_content, len(raters))):
+            value = rng.choices(RATING_VALUES, weights=(1, 1, 3, 5, 4))[0]
+            rows.append(
+                Rating(
+                    owner_id=owner_id,
+                    content=item,
+                    value=value,
+                    created_date=item.created_date + timedelta(days=rng.randrange(30)),
+                )
+            )
+            item.rating_count += 1
+            item.rating_sum += value
+            setattr(item, f"rating_{value}", getattr(item, f"rating_{value}") + 1)
+    return rows
+
+
+def create_content(content, rating_rows, batch_size):
+    """Saves ``content`` with its ratings, media references and search
+    documents"""
+    Content.objects.bulk_create(content, batch_size=batch_size)
+    Rating.objects.bulk_create(rating_rows, batch_size=batch_size)
+    for name, used in Counter(item.media.name for item in content).items():
+        MediaBlob.objects.bulk_create([MediaBlob(name=name)], ignore_conflicts=True)
+        MediaBlob.objects.filter(name=name).update(ref_count=F("ref_count") + used)
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(
+                content=item, owner_id=item.owner_id, body=search.content_body(item)
+            )
+            for item in content
+        ],
+        batch_size=batch_size,
+    )
+
+
+def create_comments(content, friends, per_content, replies, rng, batch_size):
+    """Comment threads of ``content`` by its owner and their friends"""
+    parents = [(item, None) for item in content]
+    total = 0
+    for depth in range(MAX_REPLY_DEPTH + 1):
+        mean = per_content if depth == 0 else replies
+        comments = []
+        for item, parent in parents:
+            authors = [item.owner_id, *friends[item.owner_id]]
+            for _ in range(heavy_tailed(rng, mean, 50 * max(mean, 1))):
+                comments.append(
+                    Comment(
+                        owner_id=rng.choice(authors),
+                        content=item,
+                        text=sentence(rng, 8),
+                        created_date=item.created_date
+                        + timedelta(days=rng.randrange(30)),
+                        parent=parent,
+                        depth=depth,
+                    )
+                )
+        if not comments:
+            break
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        build_paths(depth)
+        SearchDocument.objects.bulk_create(
+            [
+                SearchDocument(
+                    content_id=comment.content_id,
+                    comment=comment,
+                    owner_id=comment.content.owner_id,
+                    body=comment.text,
+                )
+                for comment in comments
+            ],
+            batch_size=batch_size,
+        )
+        total += len(comments)
+        parents = [(comment.content, comment) for comment in comments]
+    return total
+
+
+def build_paths(depth):
+    """Sets the paths of the comments of ``depth`` that were inserted without
+    one, in a single UPDATE, like Comment.build_path"""
+    own = Concat(
+        LPad(Cast("pk", CharField()), 10, Value("0")),
+        Value("/"),
+        output_field=CharField(),
+    )
+    comments = Comment.objects.filter(path="", depth=depth)
+    if depth:
+        parent_path = Comment.objects.filter(pk=OuterRef("parent_id")).values("path")
+        own = Concat(Subquery(parent_path), own, output_field=CharField())
+    comments.update(path=own)
+
+
+def create_feeds(content, friends, batch_size):
+    """Fans the content out like ``feed.fan_out`` would have, oldest first"""
+    feeds = {user_id: [] for user_id in friends}
+    fanned_out = []
+    for item in content:
+        if len(friends[item.owner_id]) > settings.FEED_FANOUT_LIMIT:
+            continue
+        for user_id in (item.owner_id, *friends[item.owner_id]):
+            feeds[user_id].append(item.pk)
+        fanned_out.append(item.pk)
+    Feed.objects.bulk_create(
+        [Feed(owner_id=user_id, head=len(ids)) for user_id, ids in feeds.items()],
+        batch_size=batch_size,
+    )
+    items = []
+    for user_id, ids in feeds.items():
+        first = max(len(ids) - settings.FEED_MAX_LENGTH, 0)
+        items += [
+            FeedItem(
+                owner_id=user_id,
+                slot=head % settings.FEED_MAX_LENGTH,
+                content_id=ids[head - 1],
+            )
+            for head in range(first + 1, len(ids) + 1)
+        ]
+    FeedItem.objects.bulk_create(items, batch_size=batch_size)
+    Content.objects.filter(pk__in=fanned_out).update(fanned_out=True)
+
+
+def generate(
+    users=1000,
+    friends_per_user=5,
+    content_per_user=3,
+    comments_per_content=4,
+    replies_per_comment=0.5,
+    ratings_per_content=3,
+    prefix="bench",
+    password="benchmark",
+    seed=0,
+    batch_size=1000,
+):
+    """Generates the dataset and returns how many rows of each kind it wrote
+
+    Usernames are ``<prefix><number>`` and all users get ``password``.
+    """
+    if users <= friends_per_user:
+        raise DatasetError("users must be more than friends_per_user")
+    rng = random.Random(seed)
+    with transaction.atomic():
+        user_ids = create_users(users, prefix, password, batch_size)
+        friends = create_friendships(user_ids, friends_per_user, rng, batch_size)
+        content = build_content(user_ids, prefix, content_per_user, rng)
+        rating_rows = build_ratings(content, friends, ratings_per_content, rng)
+        create_content(content, rating_rows, batch_size)
+        comments = create_comments(
+            content,
+            friends,
+            comments_per_content,
+            replies_per_comment,
+            rng,
+            batch_size,
+        )
+        create_feeds(content, friends, batch_size)
+    friendships.invalidate(*user_ids)
+    suggestions.rebuild()
+    return {
+        "users": len(user_ids),
+        "friendships": sum(map(len, friends.values())) // 2,
+        "content": len(content),
+        "comments": comments,
+        "ratings": len(rating_rows),
+    }
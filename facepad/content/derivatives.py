@@ -0,0 +1,118 @@
+"""Thumbnails and recompressed variants of uploaded images
+
+Decoding and resizing images is slow, so it is kept out of the request:
+``schedule`` hands the work to a local pool of MEDIA_DERIVATIVE_WORKERS
+threads once the content is committed, and the derivatives show up on the
+content as each of them is stored.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Content, MediaDerivative
+
+logger = logging.getLogger(__name__)
+
+# label: (longest side or None to keep the size, format, save options)
+DERIVATIVES = {
+    "large": (1080, "JPEG", {"quality": 85, "optimize": True}),
+    "medium": (480, "JPEG", {"quality": 85, "optimize": True}),
+    "small": (160, "JPEG", {"quality": 85, "optimize": True}),
+    "webp": (None, "WEBP", {"quality": 80, "method": 4}),
+}
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MEDIA_DERIVATIVE_WORKERS,
+                thread_name_prefix="media-derivatives",
+            )
+        return _executor
+
+
+def schedule(content):
+    """Generate the derivatives of ``content`` after the transaction commits"""
+    transaction.on_commit(lambda: submit(content.pk))
+
+
+def submit(content_id):
+    if settings.MEDIA_DERIVATIVE_WORKERS:
+        _get_executor().submit(_run, content_id)
+    else:
+        generate(content_id)
+
+
+def _run(content_id):
+    try:
+        generate(content_id)
+    except Exception:
+        logger.exception("Generating derivatives of content %s failed", content_id)
+    finally:
+        close_old_connections()
+
+
+def _encode(image, image_format, options):
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def generate(content_id):
+    """Stores every derivative of the media of a piece of content
+
+    Returns the labels that were stored, media that is not an image is
+    skipped.
+    """
+    content = Content.objects.filter(pk=content_id).first()
+    if content is None or not content.media:
+        return []
+    try:
+        with content.media.open("rb") as media:
+            image = Image.open(media)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (UnidentifiedImageError, OSError):
+        return []
+    stored = []
+    # shrink from the previous (larger) thumbnail, resampling a smaller
+    # image is much cheaper than starting from the original every time
+    source = image
+    for label, (size, image_format, options) in sorted(
+        DERIVATIVES.items(), key=lambda item: -(item[1][0] or float("inf"))
+    ):
+        if size is None:
+            derivative = image
+        else:
+            derivative = source.copy()
+            derivative.thumbnail((size, size), Image.Resampling.LANCZOS)
+            source = derivative
+        data = _encode(derivative, image_format, options)
+        name = f"{content.pk}-{label}.{EXTENSIONS[image_format]}"
+        MediaDerivative.objects.filter(content=content, label=label).delete()
+        instance = MediaDerivative(
+            content=content,
+            label=label,
+            width=derivative.width,
+            height=derivative.height,
+        )
+        instance.file.save(name, ContentFile(data), save=False)
+        instance.save()
+        stored.append(label)
+    return stored
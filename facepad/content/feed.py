@@ -0,0 +1,102 @@
+"""Home feed of friends' content
+
+Fan-out on write: when content is created its id is pushed into the bounded
+feed of the owner and of every friend of the owner, so reading a page of a
+feed is a single index range scan no matter how many friends a user has.
+
+Owners with more than FEED_FANOUT_LIMIT friends are not fanned out, their
+content keeps ``fanned_out=False`` and is merged into the feeds of their
+friends at read time instead (fan-out on read). Content created before feeds
+existed was fanned out by migration 0014. When a friendship ends the pushed
+content of each friend is taken out of the other's feed (see ``unfriended``).
+"""
+
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from users import friendships
+
+from .models import Content, Feed, FeedItem
+
+
+def fan_out(content):
+    """Push ``content`` into the feeds of its owner and the owner's friends
+
+    Returns False when the owner has too many friends to fan out to.
+    """
+    friend_ids = friendships.get_friend_ids(content.owner_id)
+    if len(friend_ids) > settings.FEED_FANOUT_LIMIT:
+        return False
+    recipients = [content.owner_id, *friend_ids]
+    with transaction.atomic():
+        Feed.objects.bulk_create(
+            [Feed(owner_id=owner_id) for owner_id in recipients],
+            ignore_conflicts=True,
+        )
+        # moving the heads locks the feed rows, so concurrent fan-outs to the
+        # same feed never get handed the same slot
+        feeds = Feed.objects.filter(owner_id__in=recipients)
+        feeds.update(head=F("head") + 1)
+        FeedItem.objects.bulk_create(
+            [
+                FeedItem(
+                    owner_id=owner_id,
+                    slot=head % settings.FEED_MAX_LENGTH,
+                    content_id=content.id,
+                )
+                for owner_id, head in feeds.values_list("owner_id", "head")
+            ],
+            update_conflicts=True,
+            unique_fields=["owner", "slot"],
+            update_fields=["content"],
+        )
+        Content.objects.filter(pk=content.pk).update(fanned_out=True)
+    content.fanned_out = True
+    return True
+
+
+def unfriended(user, other_ids):
+    """Takes the content of ``user`` and of each of ``other_ids`` out of each
+    other's feeds once they are no longer friends"""
+    user_id = getattr(user, "pk", user)
+    other_ids = list(other_ids)
+    if not other_ids:
+        return
+    FeedItem.objects.filter(
+        Q(owner_id=user_id, content__owner_id__in=other_ids)
+        | Q(owner_id__in=other_ids, content__owner_id=user_id)
+    ).delete()
+
+
+def read(user, limit, before=None):
+    """Returns up to ``limit`` content of the feed of ``user``, newest first
+
+    ``before`` is the id of the last content of the previous page.
+    """
+    pushed = FeedItem.objects.filter(owner=user)
+    friend_ids = (
+        get_user_model()
+        .friends.through.objects.filter(from_user=user)
+        .values("to_user")
+    )
+    pulled = Content.objects.filter(fanned_out=False).filter(
+        Q(owner=user) | Q(owner__in=friend_ids)
+    )
+    if before is not None:
+        pushed = pushed.filter(content_id__lt=before)
+        pulled = pulled.filter(id__lt=before)
+    pushed_ids = pushed.order_by("-content_id").values_list("content_id", flat=True)
+    pulled_ids = pulled.order_by("-id").values_list("id", flat=True)
+    content_ids = []
+    for content_id in heapq.merge(
+        pushed_ids[:limit], pulled_ids[:limit], key=lambda pk: -pk
+    ):
+        if not content_ids or content_ids[-1] != content_id:
+            content_ids.append(content_id)
+        if len(content_ids) == limit:
+            break
+    content = Content.objects.prefetch_related("derivatives").in_bulk(content_ids)
+    return [content[pk] for pk in content_ids if pk in content]
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from content import uploads
+from content.models import UploadSession
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were abandoned before completion"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-hours",
+            type=int,
+            default=24,
+            help="Delete uploads started longer ago than this",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than_hours"])
+        sessions = UploadSession.objects.filter(created_date__lt=cutoff)
+        count = 0
+        for session in sessions.iterator():
+            uploads.discard(session)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} upload sessions"))
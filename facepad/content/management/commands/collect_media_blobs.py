@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from content import blobs
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete stored media blobs that no content references anymore"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=60,
+            help="Only delete blobs that have been unreferenced for this long",
+        )
+
+    def handle(self, *args, **options):
+        deleted = blobs.collect(grace=timedelta(minutes=options["grace_minutes"]))
+        for name in deleted:
+            self.stdout.write(f"Deleted {name}")
+        self.stdout.write(self.style.SUCCESS(f"Deleted {len(deleted)} media blobs"))
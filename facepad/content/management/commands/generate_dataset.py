@@ -0,0 +1,52 @@
+from content import dataset
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic social graph with content, comments and ratings "
+        "for benchmarks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--friends-per-user",
+            type=int,
+            default=5,
+            help="Friends each new user makes, half the average number of friends",
+        )
+        parser.add_argument("--content-per-user", type=float, default=3)
+        parser.add_argument("--comments-per-content", type=float, default=4)
+        parser.add_argument("--replies-per-comment", type=float, default=0.5)
+        parser.add_argument("--ratings-per-content", type=float, default=3)
+        parser.add_argument(
+            "--prefix", default="bench", help="Usernames are <prefix><number>"
+        )
+        parser.add_argument("--password", default="benchmark")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows per INSERT",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = dataset.generate(
+                users=options["users"],
+                friends_per_user=options["friends_per_user"],
+                content_per_user=options["content_per_user"],
+                comments_per_content=options["comments_per_content"],
+                replies_per_comment=options["replies_per_comment"],
+                ratings_per_content=options["ratings_per_content"],
+                prefix=options["prefix"],
+                password=options["password"],
+                seed=options["seed"],
+                batch_size=options["batch_size"],
+            )
+        except dataset.DatasetError as error:
+            raise CommandError(str(error))
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}"))
@@ -0,0 +1,18 @@
+from content import ratings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuild the rating aggregates of all content from the Rating table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of content to rebuild per transaction",
+        )
+
+    def handle(self, *args, **options):
+        updated = ratings.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings of {updated} content"))
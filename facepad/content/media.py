@@ -0,0 +1,131 @@
+"""Serving stored media with conditional GET and byte range support
+
+In production MEDIA_ACCEL_REDIRECT_PREFIX is set: the file is not touched at
+all and nginx serves it, ranges included, through X-Accel-Redirect (see the
+nginx service of docker-compose.yaml). That is the only zero copy path, the
+app runs under ASGI (uvicorn workers, see gunicorn.conf.py) where there is
+no ``wsgi.file_wrapper`` and FileResponse streams the file through Python a
+block at a time. Without the prefix whole files go out through FileResponse
+and ranges from a file positioned at the start of the range with the exact
+Content-Length, which a WSGI server would also sendfile.
+"""
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .storage import BLOB_DIRECTORY
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """Read only view of ``length`` bytes of a file from ``start`` on"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def tell(self):
+        return self.file.tell()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def get_etag(name, storage):
+    """Blobs are named by their digest, anything else by its size and age"""
+    basename = os.path.basename(name)
+    if name.startswith(f"{BLOB_DIRECTORY}/"):
+        return quote_etag(os.path.splitext(basename)[0])
+    modified = get_last_modified(name, storage)
+    return quote_etag(f"{storage.size(name):x}-{int(modified or 0):x}")
+
+
+def get_last_modified(name, storage):
+    try:
+        return storage.get_modified_time(name).timestamp()
+    except (NotImplementedError, OSError):
+        return None
+
+
+def parse_range(header, size):
+    """(start, length) of a single satisfiable byte range, None to send the
+    whole file and False when the range cannot be satisfied"""
+    match = RANGE_RE.match(header or "")
+    if match is None:
+        # no header, multiple ranges or another unit, the whole file is fine
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end - start + 1
+
+
+def serve(request, name, storage):
+    """Response with the stored file ``name`` for ``request``"""
+    etag = get_etag(name, storage)
+    last_modified = get_last_modified(name, storage)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, name, storage, etag)
+    response.headers.setdefault("ETag", etag)
+    if last_modified is not None:
+        response.headers.setdefault("Last-Modified", http_date(last_modified))
+    patch_cache_control(response, private=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def _file_response(request, name, storage, etag):
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + name
+        return response
+    size = storage.size(name)
+    byte_range = None
+    # a range only applies to the version of the file the client has
+    if request.headers.get("If-Range", etag) == etag:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range is False:
+        response = HttpResponse(
+            status=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    elif byte_range is None:
+        response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+    else:
+        start, length = byte_range
+        response = FileResponse(
+            RangeFile(storage.open(name, "rb"), start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
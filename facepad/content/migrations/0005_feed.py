@@ -0,0 +1,90 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("users", "0004_alter_user_date_of_birth"),
+        ("content", "0004_rating"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Feed",
+            fields=[
+                (
+                    "owner",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="feed",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("head", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="FeedItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slot", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="content",
+            name="fanned_out",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="content",
+            index=models.Index(
+                condition=models.Q(("fanned_out", False)),
+                fields=["-id"],
+                name="content_not_fanned_out_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="feeditem",
+            name="content",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="content.content",
+            ),
+        ),
+        migrations.AddField(
+            model_name="feeditem",
+            name="owner",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="feed_items",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feeditem",
+            index=models.Index(
+                fields=["owner", "-content"], name="feeditem_owner_content_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="feeditem",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "slot"), name="feeditem_owner_slot_unique"
+            ),
+        ),
+    ]
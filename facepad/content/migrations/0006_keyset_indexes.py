@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0005_feed"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["content", "-created_date", "-id"],
+                name="comment_content_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="content",
+            index=models.Index(
+                fields=["owner", "-created_date", "-id"],
+                name="content_owner_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rating",
+            index=models.Index(
+                fields=["content", "-created_date", "-id"],
+                name="rating_content_created_idx",
+            ),
+        ),
+    ]
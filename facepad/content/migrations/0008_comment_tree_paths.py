@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Comment.MAX_DEPTH, the path column only has room for this many ancestors
+MAX_DEPTH = 20
+
+
+def build_paths(apps, schema_editor):
+    """Turn the symmetrical parent_comment relation into parent and path
+
+    The relation was stored both ways, the parent of a comment is the related
+    comment that was created before it. Replies deeper than MAX_DEPTH, which
+    the api no longer accepts and whose paths would not fit, are moved up to
+    reply to the parent of their parent, at the deepest level allowed.
+    """
+    Comment = apps.get_model("content", "Comment")
+    through = Comment.parent_comment.through
+    parents = {}
+    for from_id, to_id in through.objects.values_list(
+        "from_comment_id", "to_comment_id"
+    ):
+        if to_id < from_id:
+            parents[from_id] = max(parents.get(from_id, 0), to_id)
+    paths = {}
+    batch = []
+    for comment in Comment.objects.order_by("id").only("id").iterator():
+        parent_id = parents.get(comment.id)
+        if parent_id not in paths:
+            parent_id = None
+        parent_path, parent_depth, grandparent_id = paths.get(parent_id, ("", -1, None))
+        if parent_depth >= MAX_DEPTH:
+            parent_id = grandparent_id
+            parent_path, parent_depth, _ = paths[parent_id]
+        comment.parent_id = parent_id
+        comment.path = f"{parent_path}{comment.id:010d}/"
+        comment.depth = parent_depth + 1
+        paths[comment.id] = (comment.path, comment.depth, parent_id)
+        batch.append(comment)
+        if len(batch) == 1000:
+            Comment.objects.bulk_update(batch, ["parent", "path", "depth"])
+            batch = []
+    Comment.objects.bulk_update(batch, ["parent", "path", "depth"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0008_comment_tree"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0008_comment_tree_paths"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="comment",
+            name="parent_comment",
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Content = apps.get_model("content", "Content")
+    MediaBlob = apps.get_model("content", "MediaBlob")
+    references = (
+        Content.objects.exclude(media="")
+        .values("media")
+        .annotate(ref_count=models.Count("id"))
+        .order_by()
+    )
+    MediaBlob.objects.bulk_create(
+        (
+            MediaBlob(name=row["media"], ref_count=row["ref_count"])
+            for row in references.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0008_remove_comment_parent_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("released_date", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="mediablob",
+            index=models.Index(
+                condition=models.Q(("ref_count__lte", 0)),
+                fields=["released_date"],
+                name="mediablob_orphan_idx",
+            ),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0009_media_blobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaDerivative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("label", models.CharField(max_length=20)),
+                ("file", models.FileField(upload_to="derivatives/%Y/%m/%d/")),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                (
+                    "content",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="derivatives",
+                        to="content.content",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="mediaderivative",
+            constraint=models.UniqueConstraint(
+                fields=("content", "label"), name="mediaderivative_content_label"
+            ),
+        ),
+    ]
@@ -0,0 +1,157 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The inverted index is not part of the model. On SQLite, migrations that make
+# Django rebuild content_searchdocument drop the triggers and have to add them
+# back.
+POSTGRES_INDEX = [
+    "ALTER TABLE content_searchdocument ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', body)) STORED",
+    "CREATE INDEX searchdocument_vector_idx ON content_searchdocument "
+    "USING GIN (search_vector)",
+]
+POSTGRES_DROP_INDEX = [
+    "DROP INDEX IF EXISTS searchdocument_vector_idx",
+    "ALTER TABLE content_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE content_searchdocument_fts USING fts5(body, "
+    "content='content_searchdocument', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    """CREATE TRIGGER content_searchdocument_ai AFTER INSERT ON content_searchdocument
+    BEGIN
+        INSERT INTO content_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER content_searchdocument_ad AFTER DELETE ON content_searchdocument
+    BEGIN
+        INSERT INTO content_searchdocument_fts(content_searchdocument_fts, rowid, body)
+        VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER content_searchdocument_au AFTER UPDATE ON content_searchdocument
+    BEGIN
+        INSERT INTO content_searchdocument_fts(content_searchdocument_fts, rowid, body)
+        VALUES ('delete', old.id, old.body);
+        INSERT INTO content_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS content_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS content_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS content_searchdocument_au",
+    "DROP TABLE IF EXISTS content_searchdocument_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {"postgresql": postgres, "sqlite": sqlite}
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+def index_existing(apps, schema_editor):
+    Content = apps.get_model("content", "Content")
+    Comment = apps.get_model("content", "Comment")
+    SearchDocument = apps.get_model("content", "SearchDocument")
+    SearchDocument.objects.bulk_create(
+        (
+            SearchDocument(
+                content_id=row["id"],
+                owner_id=row["owner_id"],
+                body=f"{row['title']}\n{row['description']}",
+            )
+            for row in Content.objects.values(
+                "id", "owner_id", "title", "description"
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+    SearchDocument.objects.bulk_create(
+        (
+            SearchDocument(
+                content_id=row["content_id"],
+                comment_id=row["id"],
+                owner_id=row["content__owner_id"],
+                body=row["text"],
+            )
+            for row in Comment.objects.values(
+                "id", "content_id", "content__owner_id", "text"
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("content", "0011_upload_session"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("body", models.TextField()),
+                (
+                    "comment",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="content.comment",
+                    ),
+                ),
+                (
+                    "content",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="content.content",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="searchdocument",
+            index=models.Index(
+                fields=["owner", "-id"], name="searchdocument_owner_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="searchdocument",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("comment__isnull", True)),
+                fields=("content",),
+                name="searchdocument_content_unique",
+            ),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_INDEX, SQLITE_INDEX),
+            run_for_vendor(POSTGRES_DROP_INDEX, SQLITE_DROP_INDEX),
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
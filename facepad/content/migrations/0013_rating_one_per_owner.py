@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+RATING_VALUES = range(1, 6)
+
+
+def drop_duplicate_ratings(apps, schema_editor):
+    """Keeps only the newest rating of every owner, content pair and
+    recomputes the aggregates of the content that had duplicates"""
+    Content = apps.get_model("content", "Content")
+    Rating = apps.get_model("content", "Rating")
+    newest = (
+        Rating.objects.values("owner", "content")
+        .annotate(newest_id=models.Max("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    content_ids = set()
+    for pair in newest.iterator():
+        Rating.objects.filter(
+            owner=pair["owner"], content=pair["content"], id__lt=pair["newest_id"]
+        ).delete()
+        content_ids.add(pair["content"])
+    for content_id in content_ids:
+        ratings = Rating.objects.filter(content=content_id)
+        Content.objects.filter(pk=content_id).update(
+            rating_count=ratings.count(),
+            rating_sum=ratings.aggregate(sum=models.Sum("value"))["sum"] or 0,
+            **{
+                f"rating_{value}": ratings.filter(value=value).count()
+                for value in RATING_VALUES
+            },
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0012_search_documents"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="rating",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "content"), name="rating_one_per_owner"
+            ),
+        ),
+    ]
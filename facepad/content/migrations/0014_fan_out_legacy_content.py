@@ -0,0 +1,77 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fan_out_legacy_content(apps, schema_editor):
+    """Push the content created before feeds existed into the feeds of its
+    owners and their friends, like content.feed.fan_out would have
+
+    Feeds are ring buffers, every feed keeps the newest FEED_MAX_LENGTH of the
+    content already pushed into it and the legacy content it should have had.
+    Content of owners with more than FEED_FANOUT_LIMIT friends is left to be
+    merged into feeds at read time.
+    """
+    Content = apps.get_model("content", "Content")
+    Feed = apps.get_model("content", "Feed")
+    FeedItem = apps.get_model("content", "FeedItem")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Friendship = User.friends.through
+    crowded = (
+        Friendship.objects.values("from_user")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=settings.FEED_FANOUT_LIMIT)
+        .values("from_user")
+    )
+    legacy = Content.objects.filter(fanned_out=False).exclude(owner__in=crowded)
+    owner_ids = set(legacy.values_list("owner", flat=True).distinct())
+    recipients = owner_ids | set(
+        Friendship.objects.filter(from_user__in=owner_ids).values_list(
+            "to_user", flat=True
+        )
+    )
+    for user_id in sorted(recipients):
+        friend_ids = Friendship.objects.filter(from_user=user_id).values("to_user")
+        pulled = (
+            legacy.filter(models.Q(owner=user_id) | models.Q(owner__in=friend_ids))
+            .order_by("-id")
+            .values_list("id", flat=True)[: settings.FEED_MAX_LENGTH]
+        )
+        pushed = FeedItem.objects.filter(owner=user_id)
+        content_ids = sorted({*pulled, *pushed.values_list("content", flat=True)})
+        content_ids = content_ids[-settings.FEED_MAX_LENGTH :]
+        pushed.delete()
+        # oldest first from slot 0 so the head points at the newest item and
+        # the next fan-out overwrites the oldest one
+        FeedItem.objects.bulk_create(
+            FeedItem(owner_id=user_id, slot=slot, content_id=content_id)
+            for slot, content_id in enumerate(content_ids)
+        )
+        Feed.objects.update_or_create(
+            owner_id=user_id, defaults={"head": len(content_ids) - 1}
+        )
+    legacy.update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("content", "0013_rating_one_per_owner"),
+    ]
+
+    operations = [
+        migrations.RunPython(fan_out_legacy_content, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="content",
+            name="content_not_fanned_out_idx",
+        ),
+        migrations.AddIndex(
+            model_name="content",
+            index=models.Index(
+                condition=models.Q(("fanned_out", False)),
+                fields=["owner", "-id"],
+                name="content_owner_not_fanned_idx",
+            ),
+        ),
+    ]
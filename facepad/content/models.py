@@ -1,11 +1,14 @@
 """Datebase Models for the Content application of this system
 """
 
+import uuid
 from datetime import date
 
 from django.conf import settings
 from django.db import models
 
+RATING_VALUES = range(1, 6)
+
 
 class Content(models.Model):
     """Model for the content that will be uploaded to tha application"""
@@ -17,9 +20,61 @@ class Content(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="content"
     )
     created_date = models.DateField(default=date.today)
+    fanned_out = models.BooleanField(default=False)
+    # rating aggregates, kept up to date as ratings come in
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_date", "-id"],
+                name="content_owner_created_idx",
+            ),
+            # content of owners that were too big to fan out is merged into
+            # feeds at read time, this keeps that lookup to the friends' rows
+            models.Index(
+                fields=["owner", "-id"],
+                condition=models.Q(fanned_out=False),
+                name="content_owner_not_fanned_idx",
+            ),
+        ]
+
+    @staticmethod
+    def average(rating_sum, rating_count):
+        if not rating_count:
+            return None
+        return round(rating_sum / rating_count, 2)
+
+    @staticmethod
+    def histogram(counts):
+        """Ratings per value from their counts in RATING_VALUES order"""
+        return {str(value): count for value, count in zip(RATING_VALUES, counts)}
+
+    @property
+    def rating_average(self):
+        return self.average(self.rating_sum, self.rating_count)
+
+    @property
+    def rating_histogram(self):
+        return self.histogram(
+            getattr(self, f"rating_{value}") for value in RATING_VALUES
+        )
 
 
 class Comment(models.Model):
+    """Comment on a piece of content, replies form a tree stored as a
+    materialized path: the zero padded ids of all ancestors and of the comment
+    itself, so a whole thread sorts together and is one index range scan"""
+
+    PATH_STEP = 11  # ten digits and a separator
+    MAX_DEPTH = 20
+
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="comments"
     )
@@ -28,7 +83,51 @@ class Comment(models.Model):
     )
     text = models.CharField(max_length=150)
     created_date = models.DateField(default=date.today)
-    parent_comment = models.ManyToManyField("self", blank=True)
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="replies",
+    )
+    path = models.CharField(
+        max_length=PATH_STEP * (MAX_DEPTH + 1), db_index=True, editable=False
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["content", "-created_date", "-id"],
+                name="comment_content_created_idx",
+            ),
+        ]
+
+    @classmethod
+    def build_path(cls, parent_path, pk):
+        return f"{parent_path}{pk:010d}/"
+
+    def subtree(self, max_depth=None):
+        """This comment and all of its replies, ordered as a thread
+
+        Paths of the subtree all start with the path of this comment so they
+        sort between it and the same path with the last "/" bumped to "0".
+        """
+        comments = Comment.objects.filter(
+            path__gte=self.path, path__lt=self.path[:-1] + "0"
+        )
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=self.depth + max_depth)
+        return comments.order_by("path")
+
+    def save(self, *args, **kwargs):
+        if self.parent is not None:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent is not None else ""
+            self.path = self.build_path(parent_path, self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Rating(models.Model):
@@ -40,3 +139,132 @@ class Rating(models.Model):
     )
     value = models.IntegerField()
     created_date = models.DateField(default=date.today)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["content", "-created_date", "-id"],
+                name="rating_content_created_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "content"], name="rating_one_per_owner"
+            ),
+        ]
+
+
+class Feed(models.Model):
+    """Head of the bounded home feed of a user, the FeedItem slots of a feed
+    are reused as a ring buffer so a feed never grows past FEED_MAX_LENGTH"""
+
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="feed",
+    )
+    head = models.PositiveIntegerField(default=0)
+
+
+class FeedItem(models.Model):
+    """Content pushed into the home feed of a user"""
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed_items"
+    )
+    slot = models.PositiveIntegerField()
+    content = models.ForeignKey(Content, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "slot"], name="feeditem_owner_slot_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-content"], name="feeditem_owner_content_idx"
+            ),
+        ]
+
+
+class MediaBlob(models.Model):
+    """Stored media file with the number of Content rows that reference it,
+    blobs nothing references anymore are removed by collect_media_blobs"""
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    released_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["released_date"],
+                condition=models.Q(ref_count__lte=0),
+                name="mediablob_orphan_idx",
+            ),
+        ]
+
+
+class MediaDerivative(models.Model):
+    """Resized or recompressed copy of the media of a piece of content"""
+
+    content = models.ForeignKey(
+        Content, on_delete=models.CASCADE, related_name="derivatives"
+    )
+    label = models.CharField(max_length=20)
+    file = models.FileField(upload_to="derivatives/%Y/%m/%d/")
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content", "label"], name="mediaderivative_content_label"
+            ),
+        ]
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a large media file sent in chunks"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+
+class SearchDocument(models.Model):
+    """Searchable text of a piece of content or of one of its comments
+
+    The inverted index over ``body`` lives outside of the model: a generated
+    tsvector column with a GIN index on PostgreSQL and an FTS5 table kept in
+    sync by triggers on SQLite, see content.search.
+    """
+
+    content = models.ForeignKey(Content, on_delete=models.CASCADE, related_name="+")
+    comment = models.OneToOneField(
+        Comment, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    # owner of the content, results are only shown to them and their friends
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    body = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content"],
+                condition=models.Q(comment__isnull=True),
+                name="searchdocument_content_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "-id"], name="searchdocument_owner_idx"),
+        ]
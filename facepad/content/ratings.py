@@ -0,0 +1,134 @@
+"""Writing ratings and maintaining the rating aggregates stored on Content
+
+A user has at most one rating of a piece of content, rating it again
+replaces the value.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from facepad import responsecache
+
+from .models import RATING_VALUES, Content, Rating
+
+AGGREGATE_FIELDS = ["rating_count", "rating_sum"] + [
+    f"rating_{value}" for value in RATING_VALUES
+]
+
+
+def add_rating(content, value):
+    """Counts a new rating of ``value`` in the aggregates of ``content``"""
+    Content.objects.filter(pk=content.pk).update(
+        rating_count=F("rating_count") + 1,
+        rating_sum=F("rating_sum") + value,
+        **{f"rating_{value}": F(f"rating_{value}") + 1},
+    )
+
+
+def change_rating(content, previous, value):
+    """Moves a rating of ``content`` from ``previous`` to ``value`` in its
+    aggregates"""
+    if previous == value:
+        return
+    Content.objects.filter(pk=content.pk).update(
+        rating_sum=F("rating_sum") + (value - previous),
+        **{
+            f"rating_{previous}": F(f"rating_{previous}") - 1,
+            f"rating_{value}": F(f"rating_{value}") + 1,
+        },
+    )
+
+
+def invalidate_responses(content):
+    """Invalidates the cached responses showing the ratings of ``content``"""
+    responsecache.invalidate(
+        responsecache.RATINGS.format(content.pk),
+        responsecache.CONTENT.format(content.pk),
+        responsecache.USER_CONTENT.format(content.owner_id),
+    )
+
+
+@transaction.atomic
+def rate(owner, content, value):
+    """Rates ``content`` with ``value`` on behalf of ``owner``
+
+    The rating is written with INSERT ... ON CONFLICT DO UPDATE on the owner,
+    content pair. The row of the content is locked while its previous rating
+    by ``owner`` is read, which serializes the ratings of a piece of content
+    as the update of its aggregates would anyway, so the aggregates move by
+    exactly what the upsert changed. Returns the rating and whether it was
+    created.
+    """
+    # bulk_create sends no signals, the cached responses are invalidated here
+    invalidate_responses(content)
+    previous = Rating.objects.filter(owner=owner, content=OuterRef("pk"))
+    previous_id, previous_value = (
+        Content.objects.select_for_update()
+        .filter(pk=content.pk)
+        .annotate(
+            previous_id=Subquery(previous.values("id")[:1]),
+            previous_value=Subquery(previous.values("value")[:1]),
+        )
+        .values_list("previous_id", "previous_value")
+        .get()
+    )
+    rating = Rating(owner=owner, content=content, value=value)
+    Rating.objects.bulk_create(
+        [rating],
+        update_conflicts=True,
+        unique_fields=["owner", "content"],
+        update_fields=["value", "created_date"],
+    )
+    if previous_id is None:
+        add_rating(content, value)
+        # the primary key of an upserted row is not set by bulk_create
+        rating.pk = Rating.objects.values_list("pk", flat=True).get(
+            owner=owner, content=content
+        )
+        return rating, True
+    change_rating(content, previous_value, value)
+    rating.pk = previous_id
+    return rating, False
+
+
+def rebuild(batch_size=1000):
+    """Recomputes the aggregates of all content from the Rating table
+
+    Works through the content in primary key order, a batch at a time, with
+    the batch locked so ratings written meanwhile are not lost. Returns the
+    number of content updated.
+    """
+    updated = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Content.objects.select_for_update()
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", "owner_id", *AGGREGATE_FIELDS)[:batch_size]
+            )
+            if not batch:
+                return updated
+            aggregates = {
+                row.pop("content"): row
+                for row in Rating.objects.filter(content__in=batch)
+                .values("content")
+                .annotate(
+                    rating_count=Count("id"),
+                    rating_sum=Sum("value"),
+                    **{
+                        f"rating_{value}": Count("id", filter=Q(value=value))
+                        for value in RATING_VALUES
+                    },
+                )
+                .order_by()
+            }
+            for content in batch:
+                row = aggregates.get(content.pk, {})
+                for field in AGGREGATE_FIELDS:
+                    setattr(content, field, row.get(field) or 0)
+            Content.objects.bulk_update(batch, AGGREGATE_FIELDS)
+            for content in batch:
+                invalidate_responses(content)
+        updated += len(batch)
+        last_pk = batch[-1].pk
@@ -0,0 +1,98 @@
+"""Full text search over content and comments
+
+Every piece of content and every comment has a SearchDocument that is kept
+up to date as they are saved (see content.signals). The documents are
+indexed by the database: PostgreSQL matches a generated tsvector column
+through its GIN index and SQLite matches an FTS5 table that triggers keep in
+sync, both created by the migration of SearchDocument. Other databases fall
+back to a slow substring match.
+
+Every term of a query has to match, on SQLite a term also matches words
+it is a prefix of.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from users import friendships
+
+from .models import SearchDocument
+
+FTS_TABLE = "content_searchdocument_fts"
+MAX_TERMS = 10
+TERM_RE = re.compile(r"\w+")
+
+
+def content_body(content):
+    return f"{content.title}\n{content.description}"
+
+
+def index_content(content, created=False):
+    """Creates or updates the document of a piece of content"""
+    body = content_body(content)
+    if not created and SearchDocument.objects.filter(
+        content=content, comment__isnull=True
+    ).update(body=body, owner_id=content.owner_id):
+        return
+    SearchDocument.objects.create(content=content, owner_id=content.owner_id, body=body)
+
+
+def index_comment(comment, created=False):
+    """Creates or updates the document of a comment"""
+    if not created and SearchDocument.objects.filter(comment=comment).update(
+        body=comment.text
+    ):
+        return
+    SearchDocument.objects.create(
+        content_id=comment.content_id,
+        comment=comment,
+        owner_id=comment.content.owner_id,
+        body=comment.text,
+    )
+
+
+def get_terms(query):
+    return TERM_RE.findall(query)[:MAX_TERMS]
+
+
+def visible_to(user, queryset=None):
+    """Documents of the content of the user and their friends, admins see all"""
+    if queryset is None:
+        queryset = SearchDocument.objects.all()
+    if user.user_type == "admin":
+        return queryset
+    return queryset.filter(owner_id__in=[user.id, *friendships.get_friend_ids(user)])
+
+
+def matching(queryset, terms):
+    """Documents of ``queryset`` that contain every one of ``terms``"""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return queryset.filter(
+            RawSQL(
+                "content_searchdocument.search_vector @@ "
+                "plainto_tsquery('english', %s)",
+                [" ".join(terms)],
+                output_field=BooleanField(),
+            )
+        )
+    if vendor == "sqlite":
+        # quoted so nothing in a term is read as FTS5 query syntax
+        fts_query = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [fts_query],
+            )
+        )
+    for term in terms:
+        queryset = queryset.filter(body__icontains=term)
+    return queryset
+
+
+def search(user, query):
+    """Documents visible to ``user`` that match ``query``"""
+    return matching(visible_to(user), get_terms(query))
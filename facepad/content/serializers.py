@@ -1,26 +1,89 @@
-from content.models import Comment, Content, Rating
+from operator import attrgetter, itemgetter
+
+from content.models import (
+    RATING_VALUES,
+    Comment,
+    Content,
+    MediaDerivative,
+    Rating,
+    SearchDocument,
+    UploadSession,
+)
+from django.conf import settings
+from facepad.metrics import TimedSerializerMixin
+from facepad.readserializers import ValuesSerializer
 from rest_framework import serializers
 
+RATING_COUNT_FIELDS = [f"rating_{value}" for value in RATING_VALUES]
+
 
-class ContentSerializer(serializers.ModelSerializer):
+class ContentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for handling the Content Model"""
 
+    rating_average = serializers.ReadOnlyField()
+    rating_histogram = serializers.ReadOnlyField()
+    derivatives = serializers.SerializerMethodField()
+
     class Meta:
         model = Content
-        fields = ("media", "title", "description", "owner", "created_date")
-        read_only_fields = ("created_date", "owner")
+        fields = (
+            "media",
+            "title",
+            "description",
+            "owner",
+            "created_date",
+            "rating_count",
+            "rating_average",
+            "rating_histogram",
+            "derivatives",
+        )
+        read_only_fields = ("created_date", "owner", "rating_count")
 
+    def get_derivatives(self, obj):
+        """Urls of the thumbnails and variants that have been generated so far"""
+        request = self.context.get("request")
+        derivatives = {}
+        for derivative in sorted(obj.derivatives.all(), key=attrgetter("label")):
+            url = derivative.file.url
+            derivatives[derivative.label] = (
+                request.build_absolute_uri(url) if request is not None else url
+            )
+        return derivatives
 
-class CommentSerializer(serializers.ModelSerializer):
+
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for handling the Comment Model"""
 
     class Meta:
         model = Comment
-        fields = ("id", "owner", "content", "text", "created_date", "parent_comment")
-        read_only_fields = ("id", "created_date", "owner", "content", "parent_comment")
+        fields = ("id", "owner", "content", "text", "created_date", "parent", "depth")
+        read_only_fields = ("id", "created_date", "owner", "content", "parent", "depth")
+
+
+class CommentTreeSerializer(CommentSerializer):
+    """Serializer for a comment and its nested replies
 
+    Expects a flat list of comments ordered by path, like Comment.subtree,
+    and nests it in memory instead of querying replies level by level.
+    """
 
-class RatingSerializer(serializers.ModelSerializer):
+    def __init__(self, comments, **kwargs):
+        comments = list(comments)
+        replies = {comment.pk: [] for comment in comments}
+        for comment in comments[1:]:
+            replies[comment.parent_id].append(comment)
+        self.replies = replies
+        super().__init__(comments[0], **kwargs)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["replies"] = [
+            self.to_representation(reply) for reply in self.replies[instance.pk]
+        ]
+        return data
+
+
+class RatingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for handling the Rating Model"""
 
     value = serializers.IntegerField(max_value=5, min_value=1)
@@ -29,3 +92,102 @@ class RatingSerializer(serializers.ModelSerializer):
         model = Rating
         fields = ("id", "owner", "content", "value", "created_date")
         read_only_fields = ("owner", "content", "created_date")
+
+
+class ContentValuesSerializer(ValuesSerializer):
+    """ContentSerializer for ``values()`` rows"""
+
+    serializer_class = ContentSerializer
+    method_columns = {
+        "rating_average": ("rating_sum", "rating_count"),
+        "rating_histogram": RATING_COUNT_FIELDS,
+        "derivatives": ("id",),
+    }
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.rating_counts = itemgetter(*RATING_COUNT_FIELDS)
+        self.derivatives = {}
+
+    def map_rating_average(self, row):
+        return Content.average(row["rating_sum"], row["rating_count"])
+
+    def map_rating_histogram(self, row):
+        return Content.histogram(self.rating_counts(row))
+
+    def map_derivatives(self, row):
+        return dict(self.derivatives.get(row["id"], ()))
+
+    def get_derivatives(self, rows):
+        return (
+            MediaDerivative.objects.filter(content_id__in=[row["id"] for row in rows])
+            .order_by("content_id", "label")
+            .values_list("content_id", "label", "file")
+        )
+
+    def prefetch(self, rows):
+        if rows:
+            self.add_derivatives(self.get_derivatives(rows))
+
+    async def aprefetch(self, rows):
+        if rows:
+            self.add_derivatives([row async for row in self.get_derivatives(rows)])
+
+    def add_derivatives(self, derivatives):
+        storage = MediaDerivative._meta.get_field("file").storage
+        for content_id, label, name in derivatives:
+            url = storage.url(name)
+            if self.request is not None:
+                url = self.request.build_absolute_uri(url)
+            self.derivatives.setdefault(content_id, []).append((label, url))
+
+
+class CommentValuesSerializer(ValuesSerializer):
+    """CommentSerializer for ``values()`` rows"""
+
+    serializer_class = CommentSerializer
+
+
+class RatingValuesSerializer(ValuesSerializer):
+    """RatingSerializer for ``values()`` rows"""
+
+    serializer_class = RatingSerializer
+
+
+class RatingSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for the rating aggregates of the Content Model"""
+
+    count = serializers.IntegerField(source="rating_count")
+    sum = serializers.IntegerField(source="rating_sum")
+    average = serializers.ReadOnlyField(source="rating_average")
+    histogram = serializers.ReadOnlyField(source="rating_histogram")
+
+    class Meta:
+        model = Content
+        fields = ("title", "count", "sum", "average", "histogram")
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for handling the UploadSession Model"""
+
+    size = serializers.IntegerField(
+        min_value=1, max_value=settings.CHUNKED_UPLOAD_MAX_SIZE
+    )
+
+    class Meta:
+        model = UploadSession
+        fields = ("id", "filename", "size", "received", "created_date")
+        read_only_fields = ("id", "received", "created_date")
+
+
+class SearchResultSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Content or comment matching a search, ``comment`` is null for content"""
+
+    content = serializers.SlugRelatedField(slug_field="title", read_only=True)
+    text = serializers.CharField(source="body", read_only=True)
+
+    class Meta:
+        model = SearchDocument
+        fields = ("id", "content", "comment", "text")
+        read_only_fields = fields
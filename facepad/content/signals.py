@@ -0,0 +1,106 @@
+"""Signal handlers for the content application"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from facepad import responsecache
+from users import friendships
+
+from . import blobs, feed, search
+from .models import Comment, Content, MediaDerivative, Rating
+
+
+@receiver(pre_save, sender=Content)
+def remember_previous_media(sender, instance, update_fields=None, **kwargs):
+    instance._previous_media = None
+    if instance.pk is not None and (update_fields is None or "media" in update_fields):
+        instance._previous_media = (
+            Content.objects.filter(pk=instance.pk)
+            .values_list("media", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Content)
+def count_media_references(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_media", None)
+    if created:
+        blobs.retain(instance.media.name)
+    elif previous is not None and previous != instance.media.name:
+        blobs.retain(instance.media.name)
+        blobs.release(previous)
+
+
+@receiver(post_delete, sender=Content)
+def release_media(sender, instance, **kwargs):
+    blobs.release(instance.media.name)
+
+
+@receiver(post_save, sender=MediaDerivative)
+def count_derivative_references(sender, instance, created, **kwargs):
+    if created:
+        blobs.retain(instance.file.name)
+
+
+@receiver(post_delete, sender=MediaDerivative)
+def release_derivative(sender, instance, **kwargs):
+    blobs.release(instance.file.name)
+
+
+@receiver(m2m_changed, sender=get_user_model().friends.through)
+def drop_unfriended_feed_items(sender, instance, action, pk_set, **kwargs):
+    """Ex-friends stop seeing the content that was pushed into their feeds"""
+    if action == "pre_clear":
+        feed.unfriended(instance, friendships.get_friend_ids(instance))
+    elif action == "post_remove":
+        feed.unfriended(instance, pk_set or ())
+
+
+@receiver(post_save, sender=Content)
+def index_content(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        search.index_content(instance, created)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or "text" in update_fields:
+        search.index_comment(instance, created)
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def invalidate_content_responses(sender, instance, **kwargs):
+    responsecache.invalidate(
+        responsecache.CONTENT.format(instance.pk),
+        responsecache.USER_CONTENT.format(instance.owner_id),
+    )
+
+
+@receiver(post_save, sender=MediaDerivative)
+@receiver(post_delete, sender=MediaDerivative)
+def invalidate_derivative_responses(sender, instance, **kwargs):
+    # the owner is only needed for the listing of their content
+    owner_id = (
+        Content.objects.filter(pk=instance.content_id)
+        .values_list("owner_id", flat=True)
+        .first()
+    )
+    resources = [responsecache.CONTENT.format(instance.content_id)]
+    if owner_id is not None:
+        resources.append(responsecache.USER_CONTENT.format(owner_id))
+    responsecache.invalidate(*resources)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_responses(sender, instance, **kwargs):
+    responsecache.invalidate(responsecache.COMMENTS.format(instance.content_id))
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_rating_responses(sender, instance, **kwargs):
+    # the aggregates on Content are only changed by content.ratings, which
+    # invalidates the responses showing them itself
+    responsecache.invalidate(responsecache.RATINGS.format(instance.content_id))
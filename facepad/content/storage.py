@@ -0,0 +1,83 @@
+"""Content addressed storage for uploaded media
+
+Every blob is stored once under the sha256 of its bytes, so the same file
+uploaded by many users takes the disk space of one. The digest is worked out
+while the upload streams in (see content.uploadhandlers) and when the blob is
+already stored the upload is not written again at all. Reusing a stored blob
+restarts its grace period (see content.blobs.reuse) so collect_media_blobs
+does not delete it before the Content using it is saved.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+from . import blobs
+
+BLOB_DIRECTORY = "cas"
+
+
+def blob_name(digest, extension=""):
+    """Storage name of the blob with the given sha256 hex digest"""
+    return f"{BLOB_DIRECTORY}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage keeping each distinct blob once, by digest"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = getattr(content, "sha256", None)
+        if digest is not None and self._reuse(blob_name(digest, extension)):
+            return blob_name(digest, extension)
+        # names come from the digest so get_available_name is never needed
+        name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def _reuse(self, name):
+        """Whether the blob ``name`` is stored, keeping it stored if so"""
+        blobs.reuse(name)
+        return self.exists(name)
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        digest = getattr(content, "sha256", None)
+        os.makedirs(self.path(BLOB_DIRECTORY), exist_ok=True)
+        uploaded = digest is not None and hasattr(content, "temporary_file_path")
+        if uploaded:
+            staged = content.temporary_file_path()
+        else:
+            # hash while writing to a staging file so the bytes are only
+            # streamed through once
+            hasher = hashlib.sha256()
+            fd, staged = tempfile.mkstemp(dir=self.path(BLOB_DIRECTORY))
+            with os.fdopen(fd, "wb") as staging:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    hasher.update(chunk)
+                    staging.write(chunk)
+            digest = hasher.hexdigest()
+        name = blob_name(digest, extension)
+        full_path = self.path(name)
+        if self._reuse(name):
+            if not uploaded:
+                os.remove(staged)
+            return name
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # blobs are immutable, if another upload of the same bytes wins the
+        # race the file it leaves behind is identical
+        file_move_safe(staged, full_path, allow_overwrite=True)
+        # staging files are created private, blobs are served like any media
+        os.chmod(full_path, self.file_permissions_mode or 0o644)
+        return name
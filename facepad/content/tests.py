@@ -1,58 +1,124 @@
 """Tests for the content app"""
+import fcntl
+import hashlib
+import importlib
+import os
 import tempfile
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-from content.models import Content
+from asgiref.sync import sync_to_async
+from content import derivatives, ratings, uploads
+from content.models import (
+    Comment,
+    Content,
+    FeedItem,
+    MediaBlob,
+    MediaDerivative,
+    Rating,
+    UploadSession,
+)
+from content.serializers import (
+    CommentSerializer,
+    CommentValuesSerializer,
+    ContentSerializer,
+    ContentValuesSerializer,
+    RatingSerializer,
+    RatingValuesSerializer,
+)
+from content.storage import ContentAddressedStorage
+from content.uploadhandlers import HashingMemoryFileUploadHandler
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
 from django.urls import reverse
+from facepad import fastjson, metrics, responsecache
+from facepad.asyncviews import AsyncListAPIView
+from facepad.db_routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from facepad.readserializers import ValuesSerializer
+from facepad.testing import (
+    APIFixturesMixin,
+    QueryBudgetMixin,
+    QueryPlanMixin,
+    create_content,
+    create_user,
+    create_users,
+    image_upload,
+)
 from PIL import Image
-from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework import parsers, renderers, status
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
 
-REGISTER_USER_URL = reverse("users:register")
 LOGIN_USER_URL = reverse("users:login")
 
 
-class ContentUploadAPITest(TestCase):
+# most queries a request to each endpoint may run, see QueryBudgetMixin
+QUERY_BUDGETS = {
+    "content:content GET": 3,
+    "content:content POST": 15,
+    "content:content_comment GET": 3,
+    "content:content_comment POST": 5,
+    "content:content_comment_comment GET": 4,
+    "content:content_comment_comment POST": 5,
+    "content_async:content_comment": 3,
+    "content_async:content_comment_comment": 4,
+    "content_async:get_friend": 4,
+    "content_async:ratings": 3,
+    "content:feed": 5,
+    "content:get_friend": 4,
+    "content:media": 2,
+    "content:ratings GET": 3,
+    "content:ratings POST": 9,
+    "content:ratings_summary": 2,
+    "content:search": 3,
+    "content:upload": 2,
+    "content:upload_chunk GET": 2,
+    "content:upload_chunk PUT": 3,
+    "content:upload_complete": 16,
+    "users:login": 1,
+    "users:register": 4,
+}
+
+
+class ContentUploadAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Testing the Content Upload API endpoint"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe",)
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
+        super().setUp()
         self.create_content_url = reverse("content:content")
-        self.tmpfile = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile.name)
         self.payload_content = {
-            "media": self.tmpfile,
+            "media": image_upload(),
             "title": "Super Cool Title",
             "description": "this is the best description in the world",
         }
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
 
     def test_create_content(self):
         """Make sure you can create content and it is what you expected"""
         post = self.client.post(
             self.create_content_url, self.payload_content, format="multipart"
         )
-        content = Content.objects.get(id=1)
-        user = get_user_model().objects.get(id=1)
+        content = Content.objects.get(title=self.payload_content["title"])
+        user = self.users["jdoe"]
         self.assertEqual(post.status_code, status.HTTP_201_CREATED)
         self.assertEqual(content.title, self.payload_content["title"])
         self.assertEqual(content.description, self.payload_content["description"])
@@ -68,74 +134,44 @@ class ContentUploadAPITest(TestCase):
         self.assertEqual(post.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class ContentGetAPITest(TestCase):
+class ContentGetAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Testing to Get method for the Content endpoint"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2")
+    payload_content = {
+        "title": "Super Cool Title",
+        "description": "This is the best description in the world!",
+    }
+    payload_content_other = {
+        "title": "Super Cool Second Title",
+        "description": "This is the best description in the world gwow!",
+    }
+
+    @classmethod
+    def setUpFixtures(cls):
+        for username, payload in (
+            ("jdoe", cls.payload_content),
+            ("jdoe2", cls.payload_content_other),
+        ):
+            create_content(
+                cls.users[username],
+                payload["title"],
+                description=payload["description"],
+            )
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_other = APIClient()
+        super().setUp()
+        self.client_other = self.clients["jdoe2"]
         self.create_content_url = reverse("content:content")
-        self.tmpfile = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile.name)
-        self.tmpfile2 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile2.name)
-        self.payload_content = {
-            "media": self.tmpfile,
-            "title": "Super Cool Title",
-            "description": "This is the best description in the world!",
-        }
-        self.payload_content_other = {
-            "media": self.tmpfile2,
-            "title": "Super Cool Second Title",
-            "description": "This is the best description in the world gwow!",
-        }
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_user_other = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-01-21",
-        }
-        self.payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.payload_login_other = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_other.post(REGISTER_USER_URL, self.payload_user_other)
-        login = self.client_other.post(LOGIN_USER_URL, self.payload_login_other)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_other.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client.post(
-            self.create_content_url, self.payload_content, format="multipart"
-        )
-        self.client_other.post(
-            self.create_content_url, self.payload_content_other, format="multipart"
-        )
 
     def test_user_can_get_their_content(self):
         """Test to make sure that user can get their own content"""
         get = self.client.get(self.create_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            get.data[0]["title"], self.payload_content["title"]  # type: ignore
+            get.data["results"][0]["title"],  # type: ignore
+            self.payload_content["title"],
         )
 
     def test_user_cant_get_other_content(self):
@@ -143,113 +179,59 @@ class ContentGetAPITest(TestCase):
         get = self.client_other.get(self.create_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)  # type: ignore
         self.assertNotEqual(
-            get.data[0]["title"], self.payload_content["title"]  # type: ignore
+            get.data["results"][0]["title"],  # type: ignore
+            self.payload_content["title"],
         )
 
 
-class ContentGetFriendAPITest(TestCase):
+class ContentGetFriendAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Testing to Get method for the Friend Content endpoint"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+    payload_content = {
+        "title": "Super Cool Title",
+        "description": "This is the best description in the world!",
+    }
+    payload_content_friend = {
+        "title": "Super Cool Second Title",
+        "description": "This is the best description in the world dang!",
+    }
+    payload_content_other = {
+        "title": "Super Cool Third Title",
+        "description": "This is the best description in the world gwow!",
+    }
+
+    @classmethod
+    def setUpFixtures(cls):
+        for username, payload in (
+            ("jdoe", cls.payload_content),
+            ("bfriend", cls.payload_content_friend),
+            ("jdoe2", cls.payload_content_other),
+        ):
+            create_content(
+                cls.users[username],
+                payload["title"],
+                description=payload["description"],
+            )
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
-        self.client_other = APIClient()
+        super().setUp()
+        self.client_friend = self.clients["bfriend"]
+        self.client_other = self.clients["jdoe2"]
         self.create_content_url = reverse("content:content")
-        self.tmpfile = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile.name)
-        self.tmpfile2 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile2.name)
-        self.tmpfile3 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile3.name)
-        self.payload_content = {
-            "media": self.tmpfile,
-            "title": "Super Cool Title",
-            "description": "This is the best description in the world!",
-        }
-        self.payload_content_friend = {
-            "media": self.tmpfile2,
-            "title": "Super Cool Second Title",
-            "description": "This is the best description in the world dang!",
-        }
-        self.payload_content_other = {
-            "media": self.tmpfile3,
-            "title": "Super Cool Third Title",
-            "description": "This is the best description in the world gwow!",
-        }
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Best",
-            "last_name": "Friend",
-            "username": "bfriend",
-            "email": "best.friend@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-07-14",
-        }
-        self.payload_user_other = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-01-21",
-        }
-        self.payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.payload_login_friend = {
-            "username": "bfriend",
-            "password": "secret",
-        }
-        self.payload_login_other = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_friend.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login_friend)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_friend.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_other.post(REGISTER_USER_URL, self.payload_user_other)
-        login = self.client_other.post(LOGIN_USER_URL, self.payload_login_other)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_other.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client.post(
-            self.create_content_url, self.payload_content, format="multipart"
-        )
-        self.client_friend.post(
-            self.create_content_url, self.payload_content_friend, format="multipart"
-        )
-        self.client_other.post(
-            self.create_content_url, self.payload_content_other, format="multipart"
-        )
-        user = get_user_model().objects.get(username="jdoe")
-        friend = get_user_model().objects.get(username="bfriend")
-        friend.friends.add(user)  # type: ignore
 
     def test_user_can_get_friends_content(self):
         """Test to make sure you can get friend's content"""
         get_friend_content_url = reverse(
             "content:get_friend",
-            kwargs={"owner": self.payload_friend["username"]},
+            kwargs={"owner": "bfriend"},
         )
         get = self.client.get(get_friend_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            get.data[0]["title"],  # type: ignore
+            get.data["results"][0]["title"],  # type: ignore
             self.payload_content_friend["title"],
         )
 
@@ -258,7 +240,7 @@ class ContentGetFriendAPITest(TestCase):
         self.client.credentials()  # type: ignore
         get_friend_content_url = reverse(
             "content:get_friend",
-            kwargs={"owner": self.payload_friend["username"]},
+            kwargs={"owner": "bfriend"},
         )
         get = self.client.get(get_friend_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -267,7 +249,7 @@ class ContentGetFriendAPITest(TestCase):
         """Test to make sure user cannot get non friend data"""
         get_friend_content_url = reverse(
             "content:get_friend",
-            kwargs={"owner": self.payload_user_other["username"]},
+            kwargs={"owner": "jdoe2"},
         )
         get = self.client.get(get_friend_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
@@ -276,115 +258,59 @@ class ContentGetFriendAPITest(TestCase):
         """Test to make sure you can get self content"""
         get_friend_content_url = reverse(
             "content:get_friend",
-            kwargs={"owner": self.payload_user["username"]},
+            kwargs={"owner": "jdoe"},
         )
         get = self.client.get(get_friend_content_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            get.data[0]["title"],  # type: ignore
+            get.data["results"][0]["title"],  # type: ignore
             self.payload_content["title"],
         )
 
 
-class CommentAPITest(TestCase):
+class CommentAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Test Case to test the Create New Comment Endpoint"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+    payload_content = {
+        "title": "Super Cool Title",
+        "description": "This is the best description in the world!",
+    }
+    payload_content_friend = {
+        "title": "Super Cool Second Title",
+        "description": "This is the best description in the world dang!",
+    }
+    payload_content_other = {
+        "title": "Super Cool Third Title",
+        "description": "This is the best description in the world gwow!",
+    }
+
+    @classmethod
+    def setUpFixtures(cls):
+        for username, payload in (
+            ("jdoe", cls.payload_content),
+            ("bfriend", cls.payload_content_friend),
+            ("jdoe2", cls.payload_content_other),
+        ):
+            create_content(
+                cls.users[username],
+                payload["title"],
+                description=payload["description"],
+            )
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
-        self.client_other = APIClient()
+        super().setUp()
+        self.client_friend = self.clients["bfriend"]
+        self.client_other = self.clients["jdoe2"]
         self.create_content_url = reverse("content:content")
-        self.tmpfile = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile.name)
-        self.tmpfile2 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile2.name)
-        self.tmpfile3 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile3.name)
-        self.payload_content = {
-            "media": self.tmpfile,
-            "title": "Super Cool Title",
-            "description": "This is the best description in the world!",
-        }
-        self.payload_content_friend = {
-            "media": self.tmpfile2,
-            "title": "Super Cool Second Title",
-            "description": "This is the best description in the world dang!",
-        }
-        self.payload_content_other = {
-            "media": self.tmpfile3,
-            "title": "Super Cool Third Title",
-            "description": "This is the best description in the world gwow!",
-        }
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Best",
-            "last_name": "Friend",
-            "username": "bfriend",
-            "email": "best.friend@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-07-14",
-        }
-        self.payload_user_other = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-01-21",
-        }
-        self.payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.payload_login_friend = {
-            "username": "bfriend",
-            "password": "secret",
-        }
-        self.payload_login_other = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
         self.payload_comment = {
             "text": "that was amazing content!",
         }
         self.payload_comment_comment = {
             "text": "what an amazing comment!",
         }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_friend.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login_friend)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_friend.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_other.post(REGISTER_USER_URL, self.payload_user_other)
-        login = self.client_other.post(LOGIN_USER_URL, self.payload_login_other)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_other.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client.post(
-            self.create_content_url, self.payload_content, format="multipart"
-        )
-        self.client_friend.post(
-            self.create_content_url, self.payload_content_friend, format="multipart"
-        )
-        self.client_other.post(
-            self.create_content_url, self.payload_content_other, format="multipart"
-        )
-        user = get_user_model().objects.get(username="jdoe")
-        friend = get_user_model().objects.get(username="bfriend")
-        friend.friends.add(user)  # type: ignore
-        friend.save()
 
     def test_create_comment_successfully(self):
         """Make sure that a user can create a successful comment on a piece
@@ -407,6 +333,14 @@ class CommentAPITest(TestCase):
         self.assertEqual(post.status_code, status.HTTP_201_CREATED)
         self.assertEqual(post.data["text"], self.payload_comment["text"])  # type: ignore
 
+    def test_create_comment_missing_content(self):
+        """Make sure commenting on content that does not exist is a 404"""
+        create_comment_url = reverse(
+            "content:content_comment", kwargs={"content": "Not A Title"}
+        )
+        post = self.client.post(create_comment_url, self.payload_comment, format="json")
+        self.assertEqual(post.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_comment_authed(self):
         """Make sure user is authed when making comment"""
         self.client.credentials()  # type: ignore
@@ -436,7 +370,8 @@ class CommentAPITest(TestCase):
         self.assertEqual(
             post2.data["text"], self.payload_comment_comment["text"]  # type: ignore
         )
-        self.assertEqual(post2.data["parent_comment"][0], post.data["id"])  # type: ignore
+        self.assertEqual(post2.data["parent"], post.data["id"])  # type: ignore
+        self.assertEqual(post2.data["depth"], 1)  # type: ignore
 
     def test_create_comment_on_notselforfriend_fail(self):
         """Make sure you can't post a comment on someone who is not your friend"""
@@ -459,7 +394,10 @@ class CommentAPITest(TestCase):
         )
         get = self.client.get(get_comment_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
-        self.assertEqual(get.data[0]["text"], self.payload_comment["text"])  # type: ignore
+        self.assertEqual(
+            get.data["results"][0]["text"],  # type: ignore
+            self.payload_comment["text"],
+        )
 
     def test_get_comments_friendcontent_works_successfully(self):
         """Test to make sure you can successfully get friend's content comments"""
@@ -474,7 +412,10 @@ class CommentAPITest(TestCase):
         )
         get = self.client.get(get_comment_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
-        self.assertEqual(get.data[0]["text"], self.payload_comment["text"])  # type: ignore
+        self.assertEqual(
+            get.data["results"][0]["text"],  # type: ignore
+            self.payload_comment["text"],
+        )
 
     def test_get_comments_friendcontent_auth_fails(self):
         """Test to make sure you can't get comments if you are not authed"""
@@ -506,75 +447,90 @@ class CommentAPITest(TestCase):
         get = self.client.get(get_comment_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_get_comment_thread_nested(self):
+        """Make sure a comment thread comes back nested and can be depth limited"""
+        content_title = self.payload_content["title"]
+        user = self.users["jdoe"]
+        content = Content.objects.get(title=content_title)
+        root = Comment.objects.create(owner=user, content=content, text="root")
+        reply = Comment.objects.create(
+            owner=user, content=content, text="reply", parent=root
+        )
+        Comment.objects.create(owner=user, content=content, text="deep", parent=reply)
+        Comment.objects.create(owner=user, content=content, text="second", parent=root)
+        Comment.objects.create(owner=user, content=content, text="other root")
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [comment.text for comment in root.subtree()],
+                ["root", "reply", "deep", "second"],
+            )
+        thread_url = reverse(
+            "content:content_comment_comment",
+            kwargs={"content": content_title, "parent_comment": str(root.id)},
+        )
+        get = self.client.get(thread_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(get.data["text"], "root")  # type: ignore
+        self.assertEqual(
+            [reply["text"] for reply in get.data["replies"]],  # type: ignore
+            ["reply", "second"],
+        )
+        self.assertEqual(
+            get.data["replies"][0]["replies"][0]["text"], "deep"  # type: ignore
+        )
+        get = self.client.get(thread_url, {"depth": 1}, format="json")
+        self.assertEqual(get.data["replies"][0]["replies"], [])  # type: ignore
+
+    def test_get_comment_thread_othercontent_fails(self):
+        """Make sure you can't get a thread of content whose owner is not a friend"""
+        other = self.users["jdoe2"]
+        content = Content.objects.get(title=self.payload_content_other["title"])
+        root = Comment.objects.create(owner=other, content=content, text="root")
+        thread_url = reverse(
+            "content:content_comment_comment",
+            kwargs={"content": content.title, "parent_comment": str(root.id)},
+        )
+        get = self.client.get(thread_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
 
-class RatingAPITests(TestCase):
+class RatingAPITests(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Test Cases for Ratings API"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+    payload_content = {
+        "title": "Super Cool Title",
+        "description": "This is the best description in the world!",
+    }
+    payload_content_friend = {
+        "title": "Super Cool Second Title",
+        "description": "This is the best description in the world dang!",
+    }
+    payload_content_other = {
+        "title": "Super Cool Third Title",
+        "description": "This is the best description in the world gwow!",
+    }
+
+    @classmethod
+    def setUpFixtures(cls):
+        for username, payload in (
+            ("jdoe", cls.payload_content),
+            ("bfriend", cls.payload_content_friend),
+            ("jdoe2", cls.payload_content_other),
+        ):
+            create_content(
+                cls.users[username],
+                payload["title"],
+                description=payload["description"],
+            )
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
-        self.client_other = APIClient()
+        super().setUp()
+        self.client_friend = self.clients["bfriend"]
+        self.client_other = self.clients["jdoe2"]
         self.create_content_url = reverse("content:content")
-        self.tmpfile = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile.name)
-        self.tmpfile2 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile2.name)
-        self.tmpfile3 = tempfile.NamedTemporaryFile(suffix=".jpg")
-        image = Image.new("RGB", (100, 100))
-        image.save(self.tmpfile3.name)
-        self.payload_content = {
-            "media": self.tmpfile,
-            "title": "Super Cool Title",
-            "description": "This is the best description in the world!",
-        }
-        self.payload_content_friend = {
-            "media": self.tmpfile2,
-            "title": "Super Cool Second Title",
-            "description": "This is the best description in the world dang!",
-        }
-        self.payload_content_other = {
-            "media": self.tmpfile3,
-            "title": "Super Cool Third Title",
-            "description": "This is the best description in the world gwow!",
-        }
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Best",
-            "last_name": "Friend",
-            "username": "bfriend",
-            "email": "best.friend@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-07-14",
-        }
-        self.payload_user_other = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-01-21",
-        }
-        self.payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.payload_login_friend = {
-            "username": "bfriend",
-            "password": "secret",
-        }
-        self.payload_login_other = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
         self.payload_rating = {
             "value": "5",
         }
@@ -584,31 +540,6 @@ class RatingAPITests(TestCase):
         self.payload_rating_low = {
             "rating": "0",
         }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_friend.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, self.payload_login_friend)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_friend.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client_other.post(REGISTER_USER_URL, self.payload_user_other)
-        login = self.client_other.post(LOGIN_USER_URL, self.payload_login_other)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_other.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.client.post(
-            self.create_content_url, self.payload_content, format="multipart"
-        )
-        self.client_friend.post(
-            self.create_content_url, self.payload_content_friend, format="multipart"
-        )
-        self.client_other.post(
-            self.create_content_url, self.payload_content_other, format="multipart"
-        )
-        user = get_user_model().objects.get(username="jdoe")
-        friend = get_user_model().objects.get(username="bfriend")
-        friend.friends.add(user)  # type: ignore
-        friend.save()
 
     def test_create_friend_content_rating_successfully(self):
         """Make sure a user can create a content rating of friend's content successfuly"""
@@ -668,7 +599,8 @@ class RatingAPITests(TestCase):
         get = self.client.get(get_rating_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            get.data[0]["value"], int(self.payload_rating["value"])  # type: ignore
+            get.data["results"][0]["value"],  # type: ignore
+            int(self.payload_rating["value"]),
         )
 
     def test_get_rating_friend_content_successfull(self):
@@ -680,7 +612,8 @@ class RatingAPITests(TestCase):
         get = self.client.get(get_rating_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            get.data[0]["value"], int(self.payload_rating["value"])  # type: ignore
+            get.data["results"][0]["value"],  # type: ignore
+            int(self.payload_rating["value"]),
         )
 
     def test_get_rating_nonselforfriend_content_fails(self):
@@ -691,3 +624,1224 @@ class RatingAPITests(TestCase):
         self.client.post(get_rating_url, self.payload_rating, format="json")
         get = self.client.get(get_rating_url, format="json")
         self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rating_updates_aggregates(self):
+        """Make sure ratings are counted in the content aggregates and summary"""
+        create_rating_url = reverse(
+            "content:ratings", kwargs={"content": self.payload_content_friend["title"]}
+        )
+        self.client.post(create_rating_url, self.payload_rating, format="json")
+        self.client_friend.post(create_rating_url, {"value": "2"}, format="json")
+        summary_url = reverse(
+            "content:ratings_summary",
+            kwargs={"content": self.payload_content_friend["title"]},
+        )
+        get = self.client.get(summary_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(get.data["count"], 2)  # type: ignore
+        self.assertEqual(get.data["sum"], 7)  # type: ignore
+        self.assertEqual(get.data["average"], 3.5)  # type: ignore
+        self.assertEqual(
+            get.data["histogram"],  # type: ignore
+            {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1},
+        )
+        get_friend_content_url = reverse(
+            "content:get_friend", kwargs={"owner": "bfriend"}
+        )
+        get = self.client.get(get_friend_content_url, format="json")
+        self.assertEqual(get.data["results"][0]["rating_count"], 2)  # type: ignore
+        self.assertEqual(get.data["results"][0]["rating_average"], 3.5)  # type: ignore
+
+    def test_rerating_updates_rating(self):
+        """Make sure rating the same content again replaces the rating"""
+        create_rating_url = reverse(
+            "content:ratings", kwargs={"content": self.payload_content_friend["title"]}
+        )
+        post = self.client.post(create_rating_url, self.payload_rating, format="json")
+        self.assertEqual(post.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(post.data["created"])  # type: ignore
+        again = self.client.post(create_rating_url, {"value": "2"}, format="json")
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertFalse(again.data["created"])  # type: ignore
+        self.assertEqual(again.data["id"], post.data["id"])  # type: ignore
+        self.assertEqual(again.data["value"], 2)  # type: ignore
+        content = Content.objects.get(title=self.payload_content_friend["title"])
+        self.assertEqual(content.ratings.count(), 1)
+        self.assertEqual(content.ratings.get().value, 2)
+        self.assertEqual(content.rating_count, 1)
+        self.assertEqual(content.rating_sum, 2)
+        self.assertEqual(
+            content.rating_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 0}
+        )
+
+    def test_rerating_same_value_keeps_aggregates(self):
+        """Make sure rating again with the same value changes no aggregate"""
+        create_rating_url = reverse(
+            "content:ratings", kwargs={"content": self.payload_content_friend["title"]}
+        )
+        self.client.post(create_rating_url, self.payload_rating, format="json")
+        again = self.client.post(create_rating_url, self.payload_rating, format="json")
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        content = Content.objects.get(title=self.payload_content_friend["title"])
+        self.assertEqual(content.rating_count, 1)
+        self.assertEqual(content.rating_sum, 5)
+        self.assertEqual(content.rating_histogram["5"], 1)
+
+    def test_one_rating_per_owner_enforced(self):
+        """Make sure the database refuses a second rating of a user"""
+        content = Content.objects.get(title=self.payload_content_friend["title"])
+        user = self.users["jdoe"]
+        Rating.objects.create(owner=user, content=content, value=3)
+        with self.assertRaises(IntegrityError):
+            Rating.objects.create(owner=user, content=content, value=4)
+
+    def test_rating_summary_nonselforfriend_content_fails(self):
+        """Make sure you cannot get the rating summary of non friends content"""
+        summary_url = reverse(
+            "content:ratings_summary",
+            kwargs={"content": self.payload_content_other["title"]},
+        )
+        get = self.client.get(summary_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rebuild_rating_aggregates(self):
+        """Make sure the rebuild command repairs drifted aggregates"""
+        create_rating_url = reverse(
+            "content:ratings", kwargs={"content": self.payload_content["title"]}
+        )
+        self.client.post(create_rating_url, self.payload_rating, format="json")
+        Content.objects.update(rating_count=10, rating_sum=3, rating_1=4)
+        call_command("rebuild_rating_aggregates", batch_size=1, stdout=StringIO())
+        content = Content.objects.get(title=self.payload_content["title"])
+        self.assertEqual(content.rating_count, 1)
+        self.assertEqual(content.rating_sum, 5)
+        self.assertEqual(content.rating_histogram["1"], 0)
+        self.assertEqual(content.rating_histogram["5"], 1)
+        other = Content.objects.get(title=self.payload_content_other["title"])
+        self.assertEqual(other.rating_count, 0)
+        self.assertIsNone(other.rating_average)
+
+
+class FeedAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for the home feed API"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+
+    def setUp(self):
+        super().setUp()
+        self.client_friend = self.clients["bfriend"]
+        self.create_content_url = reverse("content:content")
+        self.feed_url = reverse("content:feed")
+        self.user = self.users["jdoe"]
+        self.friend = self.users["bfriend"]
+        self.other = self.users["jdoe2"]
+
+    def create_content(self, client, title):
+        payload = {
+            "media": image_upload(),
+            "title": title,
+            "description": "description",
+        }
+        return client.post(self.create_content_url, payload, format="multipart")
+
+    def test_feed_has_self_and_friend_content(self):
+        """Make sure the feed has your and your friends content, newest first"""
+        self.create_content(self.client, "Super Cool Title")
+        self.create_content(self.client_friend, "Super Cool Second Title")
+        Content.objects.create(
+            media="other.jpg", title="Other Title", description="d", owner=self.other
+        )
+        get = self.client.get(self.feed_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Super Cool Second Title", "Super Cool Title"],
+        )
+        self.assertEqual(FeedItem.objects.filter(owner=self.user).count(), 2)
+
+    def test_feed_authed(self):
+        """Make sure the feed needs authentication"""
+        self.client.credentials()  # type: ignore
+        get = self.client.get(self.feed_url, format="json")
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(FEED_MAX_LENGTH=3)
+    def test_feed_is_bounded_and_paginated(self):
+        """Make sure feeds are trimmed to their max length and paged by cursor"""
+        for number in range(5):
+            self.create_content(self.client_friend, f"Title {number}")
+        self.assertEqual(FeedItem.objects.filter(owner=self.user).count(), 3)
+        get = self.client.get(self.feed_url, {"page_size": 2}, format="json")
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Title 4", "Title 3"],
+        )
+        get = self.client.get(get.data["next"], format="json")  # type: ignore
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Title 2"],
+        )
+        self.assertIsNone(get.data["next"])  # type: ignore
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_feed_merges_content_of_big_owners_on_read(self):
+        """Make sure content that was not fanned out still shows up in the feed"""
+        self.create_content(self.client_friend, "Super Cool Second Title")
+        self.assertFalse(FeedItem.objects.filter(owner=self.user).exists())
+        get = self.client.get(self.feed_url, format="json")
+        self.assertEqual(
+            get.data["results"][0]["title"],  # type: ignore
+            "Super Cool Second Title",
+        )
+
+    def test_feed_drops_content_of_ex_friends(self):
+        """Make sure unfriending takes each other's content out of the feeds"""
+        self.create_content(self.client, "Super Cool Title")
+        self.create_content(self.client_friend, "Super Cool Second Title")
+        self.user.friends.remove(self.friend)  # type: ignore
+        get = self.client.get(self.feed_url, format="json")
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Super Cool Title"],
+        )
+        get = self.client_friend.get(self.feed_url, format="json")
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Super Cool Second Title"],
+        )
+
+    def test_legacy_content_is_fanned_out(self):
+        """Make sure content from before feeds existed is pushed into feeds"""
+        self.create_content(self.client, "Super Cool Title")
+        legacy = Content.objects.create(
+            media="legacy.jpg", title="Legacy Title", description="d", owner=self.friend
+        )
+        migration = importlib.import_module(
+            "content.migrations.0014_fan_out_legacy_content"
+        )
+        migration.fan_out_legacy_content(apps, None)
+        legacy.refresh_from_db()
+        self.assertTrue(legacy.fanned_out)
+        for user in (self.user, self.friend):
+            self.assertTrue(
+                FeedItem.objects.filter(owner=user, content=legacy).exists()
+            )
+        self.assertFalse(FeedItem.objects.filter(owner=self.other).exists())
+        get = self.client.get(self.feed_url, format="json")
+        self.assertEqual(
+            [content["title"] for content in get.data["results"]],  # type: ignore
+            ["Legacy Title", "Super Cool Title"],
+        )
+        self.create_content(self.client, "Super Cool Second Title")
+        self.assertEqual(FeedItem.objects.filter(owner=self.user).count(), 3)
+
+    def test_feed_invalid_cursor(self):
+        """Make sure a bad cursor is a 404"""
+        get = self.client.get(self.feed_url, {"cursor": "!!"}, format="json")
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PaginationAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for the keyset pagination of the list endpoints"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe",)
+
+    @classmethod
+    def setUpFixtures(cls):
+        Content.objects.bulk_create(
+            Content(
+                media=f"content/{number}.jpg",
+                title=f"Title {number}",
+                description="description",
+                owner=cls.users["jdoe"],
+                created_date=date(2023, 2, 1 + number // 2),
+            )
+            for number in range(7)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.create_content_url = reverse("content:content")
+
+    def test_pages_follow_created_date_and_id(self):
+        """Make sure pages walk (created_date, id) newest first without overlap"""
+        titles = []
+        url = self.create_content_url + "?page_size=3"
+        while url:
+            get = self.client.get(url, format="json")
+            self.assertEqual(get.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(get.data["results"]), 3)  # type: ignore
+            results = get.data["results"]  # type: ignore
+            titles += [content["title"] for content in results]
+            url = get.data["next"]  # type: ignore
+        self.assertEqual(titles, [f"Title {number}" for number in range(6, -1, -1)])
+
+    def test_page_size_has_hard_maximum(self):
+        """Make sure the page size cannot go over MAX_PAGE_SIZE"""
+        with self.settings(MAX_PAGE_SIZE=2):
+            get = self.client.get(
+                self.create_content_url, {"page_size": 1000}, format="json"
+            )
+        self.assertEqual(len(get.data["results"]), 2)  # type: ignore
+        self.assertIsNotNone(get.data["next"])  # type: ignore
+
+    def test_invalid_cursor(self):
+        """Make sure tampered cursors are a 404"""
+        for cursor in ("!!", "WzFd", "WyJub3QtYS1kYXRlIiwgMV0="):
+            get = self.client.get(
+                self.create_content_url, {"cursor": cursor}, format="json"
+            )
+            self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SearchAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for the full text search endpoint"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("jdoe", "bfriend"),)
+
+    @classmethod
+    def setUpFixtures(cls):
+        cls.content = Content.objects.create(
+            media="content/sunset.jpg",
+            title="Sunset",
+            description="Orange sky over the harbour",
+            owner=cls.users["jdoe"],
+        )
+        cls.friend_content = Content.objects.create(
+            media="content/hike.jpg",
+            title="Hike",
+            description="Mountain trail",
+            owner=cls.users["bfriend"],
+        )
+        cls.other_content = Content.objects.create(
+            media="content/harbour.jpg",
+            title="Harbour",
+            description="Boats in the harbour",
+            owner=cls.users["jdoe2"],
+        )
+        cls.comment = Comment.objects.create(
+            owner=cls.users["jdoe"],
+            content=cls.friend_content,
+            text="Amazing harbour view",
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.search_url = reverse("content:search")
+
+    def search(self, query, **params):
+        return self.client.get(self.search_url, {"q": query, **params}, format="json")
+
+    def test_search_content_and_comments(self):
+        """Make sure titles, descriptions and comments are found"""
+        get = self.search("harbour")
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        results = get.data["results"]  # type: ignore
+        self.assertEqual(
+            [(result["content"], result["comment"]) for result in results],
+            [("Hike", self.comment.id), ("Sunset", None)],
+        )
+
+    def test_search_respects_visibility(self):
+        """Make sure content of users that are not friends is not found"""
+        get = self.search("boats")
+        self.assertEqual(get.data["results"], [])  # type: ignore
+
+    def test_search_needs_every_term(self):
+        """Make sure every term has to match, as a word or a prefix of one"""
+        results = self.search("orange harb").data["results"]  # type: ignore
+        self.assertEqual([result["content"] for result in results], ["Sunset"])
+        results = self.search("orange trail").data["results"]  # type: ignore
+        self.assertEqual(results, [])
+
+    def test_index_follows_changes(self):
+        """Make sure edits and deletes are reflected straight away"""
+        self.content.description = "Purple sky"
+        self.content.save()
+        self.assertEqual(self.search("orange").data["results"], [])  # type: ignore
+        self.assertEqual(len(self.search("purple").data["results"]), 1)  # type: ignore
+        self.friend_content.delete()
+        self.assertEqual(self.search("amazing").data["results"], [])  # type: ignore
+
+    def test_search_paginates(self):
+        """Make sure results come in keyset pages"""
+        get = self.search("harbour", page_size=1)
+        self.assertEqual(len(get.data["results"]), 1)  # type: ignore
+        get = self.client.get(get.data["next"], format="json")  # type: ignore
+        self.assertEqual(get.data["results"][0]["content"], "Sunset")  # type: ignore
+        self.assertIsNone(get.data["next"])  # type: ignore
+
+    def test_search_needs_query(self):
+        """Make sure a search without terms is a 400"""
+        get = self.search(" *")
+        self.assertEqual(get.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MediaStorageTest(QueryBudgetMixin, TestCase):
+    """Test Cases for the content addressed media storage"""
+
+    query_budgets = QUERY_BUDGETS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("jdoe")
+
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.location.name)
+        self.data = b"the same viral image"
+
+    def tearDown(self):
+        self.location.cleanup()
+
+    def test_identical_uploads_are_stored_once(self):
+        """Make sure the same bytes end up in one blob named by their digest"""
+        first = self.storage.save("content/a.JPG", ContentFile(self.data))
+        second = self.storage.save("content/b.jpg", ContentFile(self.data))
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(first, f"cas/{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+        self.assertEqual(first, second)
+        with self.storage.open(first) as blob:
+            self.assertEqual(blob.read(), self.data)
+        self.assertEqual(len(self.storage.listdir("cas")[1]), 0)
+
+    def test_hashed_upload_of_stored_blob_is_not_written(self):
+        """Make sure an upload hashed on the way in skips writing stored blobs"""
+        name = self.storage.save("a.jpg", ContentFile(self.data))
+        upload = SimpleUploadedFile("b.jpg", b"")
+        upload.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(self.storage.save("b.jpg", upload), name)
+
+    def test_upload_handler_hashes_chunks(self):
+        """Make sure the upload handlers set the digest of what they received"""
+        handler = HashingMemoryFileUploadHandler()
+        handler.handle_raw_input(None, {}, len(self.data), None)
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("media", "a.jpg", "image/jpeg", len(self.data))
+        handler.receive_data_chunk(self.data[:5], 0)
+        handler.receive_data_chunk(self.data[5:], 5)
+        upload = handler.file_complete(len(self.data))
+        self.assertEqual(upload.sha256, hashlib.sha256(self.data).hexdigest())
+
+    def test_blobs_are_reference_counted_and_collected(self):
+        """Make sure blobs are counted per content and collected once unused"""
+        storage = Content._meta.get_field("media").storage
+        name = storage.save("content/blob.jpg", ContentFile(self.data))
+        first = Content.objects.create(
+            media=name, title="Title", description="d", owner=self.user
+        )
+        second = Content.objects.create(
+            media=name, title="Second Title", description="d", owner=self.user
+        )
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+        first.delete()
+        call_command("collect_media_blobs", grace_minutes=0, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        call_command("collect_media_blobs", grace_minutes=60, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+        call_command("collect_media_blobs", grace_minutes=0, stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_reused_blob_is_not_collected(self):
+        """Make sure uploading a long released blob again keeps it stored"""
+        name = self.storage.save("content/blob.jpg", ContentFile(self.data))
+        released = datetime.now(timezone.utc) - timedelta(hours=2)
+        MediaBlob.objects.create(name=name, released_date=released)
+        again = self.storage.save("content/again.jpg", ContentFile(self.data))
+        self.assertEqual(again, name)
+        call_command("collect_media_blobs", grace_minutes=60, stdout=StringIO())
+        self.assertGreater(MediaBlob.objects.get(name=name).released_date, released)
+
+
+class MediaDerivativeTest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for the thumbnail and variant generation"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe",)
+
+    def setUp(self):
+        super().setUp()
+        self.create_content_url = reverse("content:content")
+        self.payload_content = {
+            "media": image_upload("image.png", size=(2000, 1000), mode="RGBA"),
+            "title": "Super Cool Title",
+            "description": "this is the best description in the world",
+        }
+
+    def test_derivatives_generated_after_create(self):
+        """Make sure thumbnails and a webp variant are made once content is saved"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                self.create_content_url, self.payload_content, format="multipart"
+            )
+        content = Content.objects.get(title=self.payload_content["title"])
+        sizes = {
+            derivative.label: (derivative.width, derivative.height)
+            for derivative in content.derivatives.all()
+        }
+        self.assertEqual(
+            sizes,
+            {
+                "large": (1080, 540),
+                "medium": (480, 240),
+                "small": (160, 80),
+                "webp": (2000, 1000),
+            },
+        )
+        webp = content.derivatives.get(label="webp")
+        with webp.file.open("rb") as file:
+            self.assertEqual(Image.open(file).format, "WEBP")
+        get = self.client.get(self.create_content_url, format="json")
+        derivatives = get.data["results"][0]["derivatives"]  # type: ignore
+        self.assertEqual(set(derivatives), {"large", "medium", "small", "webp"})
+        self.assertTrue(derivatives["small"].startswith("http://testserver/"))
+
+    def test_derivatives_skip_non_images(self):
+        """Make sure media that is not an image gets no derivatives"""
+        user = self.users["jdoe"]
+        storage = Content._meta.get_field("media").storage
+        content = Content.objects.create(
+            media=storage.save("content/clip.mp4", ContentFile(b"not an image")),
+            title="Clip",
+            description="d",
+            owner=user,
+        )
+        self.assertEqual(derivatives.generate(content.id), [])
+        get = self.client.get(self.create_content_url, format="json")
+        self.assertEqual(get.data["results"][0]["derivatives"], {})  # type: ignore
+
+
+@override_settings(CHUNKED_UPLOAD_MAX_CHUNK_SIZE=6)
+class ChunkedUploadAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for the resumable chunked upload API"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2")
+
+    def setUp(self):
+        super().setUp()
+        self.upload_url = reverse("content:upload")
+        self.data = b"a big video file"
+        self.staging = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(CHUNKED_UPLOAD_DIR=self.staging.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.staging.cleanup()
+
+    def put_chunk(self, upload_id, first, last):
+        return self.client.put(
+            reverse("content:upload_chunk", kwargs={"pk": upload_id}),
+            data=self.data[first : last + 1],
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {first}-{last}/{len(self.data)}",
+        )
+
+    def test_chunked_upload_creates_content(self):
+        """Make sure an upload sent in chunks becomes content"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        self.assertEqual(post.status_code, status.HTTP_201_CREATED)
+        upload_id = post.data["id"]  # type: ignore
+        self.assertEqual(self.put_chunk(upload_id, 0, 5).data["received"], 6)
+        self.assertEqual(self.put_chunk(upload_id, 6, 11).data["received"], 12)
+        get = self.client.get(
+            reverse("content:upload_chunk", kwargs={"pk": upload_id}), format="json"
+        )
+        self.assertEqual(get.data["received"], 12)  # type: ignore
+        self.assertEqual(self.put_chunk(upload_id, 12, 15).data["received"], 16)
+        complete = self.client.post(
+            reverse("content:upload_complete", kwargs={"pk": upload_id}),
+            {"title": "Super Cool Video", "description": "a video"},
+            format="json",
+        )
+        self.assertEqual(complete.status_code, status.HTTP_201_CREATED)
+        content = Content.objects.get(title="Super Cool Video")
+        with content.media.open("rb") as media:
+            self.assertEqual(media.read(), self.data)
+        self.assertEqual(os.listdir(self.staging.name), [])
+
+    def test_chunk_at_wrong_offset_conflicts(self):
+        """Make sure a chunk must continue where the upload left off"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        upload_id = post.data["id"]  # type: ignore
+        put = self.put_chunk(upload_id, 6, 11)
+        self.assertEqual(put.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(put.data["received"], 0)  # type: ignore
+
+    def test_chunk_for_moved_offset_is_not_written(self):
+        """Make sure a request that lost the race for an offset does not
+        overwrite the chunk of the one that won"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        session = UploadSession.objects.get(pk=post.data["id"])  # type: ignore
+        self.assertEqual(self.put_chunk(session.pk, 0, 5).status_code, 200)
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.write_chunk(session, 0, 6, BytesIO(b"xxxxxx"))
+        self.assertEqual(session.received, 6)
+        with open(uploads.staging_path(session), "rb") as staging:
+            self.assertEqual(staging.read(), self.data[:6])
+
+    def test_chunk_for_offset_being_written_fails(self):
+        """Make sure a chunk is refused while another one is written and the
+        offset only moves from where the chunk started"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        session = UploadSession.objects.get(pk=post.data["id"])  # type: ignore
+        with open(uploads.staging_path(session), "rb") as staging:
+            fcntl.flock(staging, fcntl.LOCK_EX)
+            put = self.put_chunk(session.pk, 0, 5)
+        self.assertEqual(put.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(put.data["received"], 0)  # type: ignore
+        stream = BytesIO(self.data[:6])
+        read = stream.read
+
+        def read_while_offset_moves(size):
+            UploadSession.objects.filter(pk=session.pk).update(received=3)
+            return read(size)
+
+        stream.read = read_while_offset_moves
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.write_chunk(session, 0, 6, stream)
+        self.assertEqual(session.received, 3)
+
+    def test_chunk_too_big_and_incomplete_upload_fail(self):
+        """Make sure oversized chunks and early completes are rejected"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        upload_id = post.data["id"]  # type: ignore
+        put = self.put_chunk(upload_id, 0, 9)
+        self.assertEqual(put.status_code, status.HTTP_400_BAD_REQUEST)
+        complete = self.client.post(
+            reverse("content:upload_complete", kwargs={"pk": upload_id}),
+            {"title": "Super Cool Video", "description": "a video"},
+            format="json",
+        )
+        self.assertEqual(complete.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_of_other_user_not_found(self):
+        """Make sure uploads are private to the user who started them"""
+        post = self.client.post(
+            self.upload_url,
+            {"filename": "video.mp4", "size": len(self.data)},
+            format="json",
+        )
+        upload_id = post.data["id"]  # type: ignore
+        get = self.clients["jdoe2"].get(
+            reverse("content:upload_chunk", kwargs={"pk": upload_id}), format="json"
+        )
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MediaServingAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Test Cases for serving media with ranges and conditional GETs"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+    data = bytes(range(256)) * 4
+
+    @classmethod
+    def setUpFixtures(cls):
+        storage = Content._meta.get_field("media").storage
+        cls.content = create_content(
+            cls.users["bfriend"],
+            "Super Cool Title",
+            description="d",
+            media=storage.save("content/clip.mp4", ContentFile(cls.data)),
+        )[0]
+        cls.users["admin"] = create_user("admin", user_type="admin")
+
+    def setUp(self):
+        super().setUp()
+        self.media_url = reverse(
+            "content:media", kwargs={"content": "Super Cool Title"}
+        )
+
+    def test_get_media_of_friend(self):
+        """Make sure friends get the whole file with validators"""
+        get = self.client.get(self.media_url)
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(get.streaming_content), self.data)  # type: ignore
+        self.assertEqual(get["Content-Type"], "video/mp4")
+        self.assertEqual(get["Accept-Ranges"], "bytes")
+        self.assertTrue(get.has_header("ETag"))
+
+    def test_get_media_range(self):
+        """Make sure byte ranges come back as partial content"""
+        get = self.client.get(self.media_url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(get.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(
+            b"".join(get.streaming_content), self.data[10:20]  # type: ignore
+        )
+        self.assertEqual(get["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        self.assertEqual(get["Content-Length"], "10")
+        get = self.client.get(self.media_url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(
+            b"".join(get.streaming_content), self.data[-5:]  # type: ignore
+        )
+        get = self.client.get(self.media_url, HTTP_RANGE="bytes=5000-")
+        self.assertEqual(get.status_code, 416)
+
+    def test_get_media_not_modified(self):
+        """Make sure a matching If-None-Match is answered with a 304"""
+        etag = self.client.get(self.media_url)["ETag"]
+        get = self.client.get(self.media_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(get.status_code, status.HTTP_304_NOT_MODIFIED)
+        get = self.client.get(
+            self.media_url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+
+    def test_get_media_nonfriend_fails(self):
+        """Make sure media is hidden from users who are not friends"""
+        get = self.clients["jdoe2"].get(self.media_url)
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_visibility_matches_across_endpoints(self):
+        """Make sure media, rating summaries and friend lists show what the
+        owner has to admins and friends only"""
+        urls = [
+            self.media_url,
+            reverse("content:ratings_summary", kwargs={"content": "Super Cool Title"}),
+            reverse("users:friends", kwargs={"username": "bfriend"}),
+        ]
+        for username, visible in (("admin", True), ("jdoe", True), ("jdoe2", False)):
+            for url in urls:
+                with self.subTest(username=username, url=url):
+                    get = self.clients[username].get(url)
+                    self.assertEqual(get.status_code < 400, visible)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX="/protected/")
+    def test_get_media_accel_redirect(self):
+        """Make sure nginx is handed the file when accel redirect is set"""
+        get = self.client.get(self.media_url)
+        self.assertEqual(
+            get["X-Accel-Redirect"], "/protected/" + self.content.media.name
+        )
+        self.assertEqual(get.content, b"")
+
+    def test_api_responses_revalidate(self):
+        """Make sure api responses get an ETag and revalidate with a 304"""
+        url = reverse("content:get_friend", kwargs={"owner": "bfriend"})
+        etag = self.client.get(url, format="json")["ETag"]
+        get = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(get.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class MetricsAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the request metrics and the metrics endpoint"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe",)
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+
+    def test_request_is_measured(self):
+        """Make sure the response carries what the request cost"""
+        get = self.client.get(reverse("content:feed"))
+        self.assertEqual(get.metrics.view_name, "content:feed")  # type: ignore
+        self.assertGreater(get.metrics.queries, 0)  # type: ignore
+        self.assertEqual(get.metrics.response_size, len(get.content))  # type: ignore
+        self.assertWithinQueryBudget(get)
+
+    def test_metrics_endpoint(self):
+        """Make sure the totals are exposed in the Prometheus format"""
+        self.client.get(reverse("content:feed"))
+        self.client.get(reverse("content:feed"))
+        get = self.client.get(reverse("metrics"))
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'facepad_requests_total{endpoint="content:feed",method="GET"} 2',
+            get.content.decode(),
+        )
+        self.assertIn(f"facepad_worker_pid {os.getpid()}", get.content.decode())
+
+    def test_metrics_endpoint_is_local(self):
+        """Make sure other addresses cannot read the metrics"""
+        get = self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_query_budget_is_enforced(self):
+        """Make sure a request over its budget fails the test"""
+        get = self.client.get(reverse("content:feed"))
+        with self.assertRaises(self.failureException):
+            self.assertWithinQueryBudget(get, budget=0)
+
+
+class AsyncContentAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the async views of the content listings"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "jdoe2")
+    fixture_friends = (("bfriend", "jdoe"),)
+
+    @classmethod
+    def setUpFixtures(cls):
+        owner = cls.users["bfriend"]
+        content = create_content(owner, "Title", description="Words")[0]
+        comment = Comment.objects.create(owner=owner, content=content, text="First")
+        cls.comment_id = comment.id
+        Comment.objects.create(
+            owner=owner, content=content, text="Reply", parent=comment
+        )
+        ratings.rate(cls.users["jdoe"], content, 4)
+
+    def assertSameResponse(self, name, kwargs, query=""):
+        sync = self.client.get(reverse(f"content:{name}", kwargs=kwargs) + query)
+        get = self.client.get(reverse(f"content_async:{name}", kwargs=kwargs) + query)
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(get["Content-Type"], sync["Content-Type"])
+        self.assertEqual(get.content, sync.content)
+
+    def test_async_listings_match_sync(self):
+        """Make sure the async views answer exactly what the sync views do"""
+        self.assertSameResponse("get_friend", {"owner": "bfriend"})
+        self.assertSameResponse("content_comment", {"content": "Title"})
+        self.assertSameResponse(
+            "content_comment_comment",
+            {"content": "Title", "parent_comment": self.comment_id},
+            "?depth=1",
+        )
+        self.assertSameResponse("ratings", {"content": "Title"}, "?page_size=1")
+
+    async def test_async_listings_under_asgi(self):
+        """Make sure the async views are measured when served through ASGI"""
+        get = await AsyncClient().get(
+            reverse("content_async:ratings", args=["Title"]),
+            AUTHORIZATION="Bearer " + self.tokens["jdoe"],
+        )
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(get.json()["results"][0]["value"], 4)
+        self.assertEqual(get.metrics.view_name, "content_async:ratings")
+        self.assertGreater(get.metrics.queries, 0)
+        self.assertWithinQueryBudget(get)
+
+    def test_async_listings_nonfriend_fails(self):
+        """Make sure the async views hide content from non friends"""
+        client = self.clients["jdoe2"]
+        get = client.get(reverse("content_async:get_friend", args=["bfriend"]))
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+        for name in ("content_comment", "ratings"):
+            get = client.get(reverse(f"content_async:{name}", args=["Title"]))
+            self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_listings_unknown_fails(self):
+        """Make sure the async views answer 404 for unknown users and content"""
+        get = self.client.get(reverse("content_async:get_friend", args=["nobody"]))
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+        get = self.client.get(reverse("content_async:ratings", args=["Nothing"]))
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_listings_unauthenticated_fails(self):
+        """Make sure the async views require a valid access token"""
+        url = reverse("content_async:ratings", args=["Title"])
+        get = APIClient().get(url)
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", get)
+        get = APIClient().get(url, HTTP_AUTHORIZATION="Bearer nonsense")
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_listings_only_read(self):
+        """Make sure the async views do not accept writes"""
+        url = reverse("content_async:ratings", args=["Title"])
+        post = self.client.post(url, {"value": 1}, format="json")
+        self.assertEqual(post.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_async_list_queryset(self):
+        """Make sure async list views read ``queryset`` afresh or say it is
+        missing"""
+
+        class ContentList(AsyncListAPIView):
+            queryset = Content.objects.all()
+
+        queryset = await ContentList().get_queryset()
+        self.assertIsNot(queryset, ContentList.queryset)
+        self.assertEqual(await queryset.acount(), 1)
+        with self.assertRaisesMessage(AssertionError, "'AsyncListAPIView'"):
+            await AsyncListAPIView().get_queryset()
+
+
+class ResponseCacheTest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the cached responses of the content listings"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend")
+    fixture_friends = (("bfriend", "jdoe"),)
+
+    @classmethod
+    def setUpFixtures(cls):
+        content = create_content(cls.users["bfriend"], "Title", description="Words")[0]
+        ratings.rate(cls.users["jdoe"], content, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.owner = self.clients["bfriend"]
+        self.friend = self.users["jdoe"]
+
+    def test_repeated_reads_are_cached(self):
+        """Make sure a repeated read is answered from the cache"""
+        for name in ("content:ratings", "content_async:ratings"):
+            url = reverse(name, args=["Title"])
+            first = self.client.get(url)
+            second = self.client.get(url)
+            self.assertEqual(second.status_code, status.HTTP_200_OK)
+            self.assertEqual(second.content, first.content)
+            self.assertLess(second.metrics.queries, first.metrics.queries)
+
+    def test_writes_invalidate_cached_responses(self):
+        """Make sure comments, ratings and edits show up on the next read"""
+        comments_url = reverse("content:content_comment", args=["Title"])
+        ratings_url = reverse("content:ratings", args=["Title"])
+        content_url = reverse("content:get_friend", args=["bfriend"])
+        for url in (comments_url, ratings_url, content_url):
+            self.client.get(url)
+
+        self.owner.post(comments_url, {"text": "First"}, format="json")
+        get = self.client.get(comments_url)
+        self.assertEqual(get.data["results"][0]["text"], "First")  # type: ignore
+
+        for value in (4, 2):
+            self.client.post(ratings_url, {"value": value}, format="json")
+            get = self.client.get(ratings_url)
+            self.assertEqual(get.data["results"][0]["value"], value)  # type: ignore
+            get = self.client.get(content_url)
+            self.assertEqual(
+                get.data["results"][0]["rating_average"], value  # type: ignore
+            )
+
+        Content.objects.filter(title="Title").get().delete()
+        get = self.client.get(content_url)
+        self.assertEqual(get.data["results"], [])  # type: ignore
+
+    def test_visibility_is_checked_on_cached_responses(self):
+        """Make sure a cached response is not served to who may not see it"""
+        urls = [
+            reverse(f"{namespace}:{name}", args=["Title"])
+            for namespace in ("content", "content_async")
+            for name in ("content_comment", "ratings")
+        ]
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.users["bfriend"].friends.remove(self.friend)  # type: ignore
+        for url in urls:
+            get = self.client.get(url)
+            self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+        get = self.client.get(reverse("content:get_friend", args=["bfriend"]))
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTest(SimpleTestCase):
+    """Testing where the database router sends reads"""
+
+    databases = {"default"}
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def read_in_request(self, method, write=False, atomic=False, cached=False):
+        read = {}
+
+        def respond():
+            read["db"] = self.router.db_for_read(Content)
+            return Response({})
+
+        def get_response(request):
+            if write:
+                self.router.db_for_write(Content)
+            if cached:
+                responsecache.cached(request, ["content:1"], "self", respond)
+            elif atomic:
+                with transaction.atomic():
+                    read["db"] = self.router.db_for_read(Content)
+            else:
+                read["db"] = self.router.db_for_read(Content)
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(RequestFactory().generic(method, "/"))
+        return read["db"]
+
+    def test_safe_requests_read_from_replicas(self):
+        """Make sure GET requests read from a replica"""
+        self.assertEqual(self.read_in_request("GET"), "replica_0")
+
+    def test_unsafe_requests_read_from_primary(self):
+        """Make sure requests that write read from the primary"""
+        self.assertEqual(self.read_in_request("POST"), "default")
+
+    def test_reads_after_write_are_pinned(self):
+        """Make sure a request reads from the primary once it wrote"""
+        self.assertEqual(self.read_in_request("GET", write=True), "default")
+
+    def test_reads_in_transaction_use_primary(self):
+        """Make sure reads inside a transaction see the primary"""
+        self.assertEqual(self.read_in_request("GET", atomic=True), "default")
+
+    def test_cached_responses_are_built_from_primary(self):
+        """Make sure a response that gets cached is not built from a replica
+        that may be behind the generation it is cached under"""
+        self.assertEqual(self.read_in_request("GET", cached=True), "default")
+
+    def test_reads_outside_requests_use_primary(self):
+        """Make sure commands and other code outside requests use the primary"""
+        self.assertEqual(self.router.db_for_read(Content), "default")
+        self.read_in_request("GET")
+        self.assertEqual(self.router.db_for_read(Content), "default")
+
+    def test_replicas_are_not_migrated(self):
+        """Make sure migrations only run on the primary"""
+        self.assertFalse(self.router.allow_migrate("replica_0", "content"))
+        self.assertTrue(self.router.allow_migrate("default", "content"))
+
+
+class FastJSONTest(SimpleTestCase):
+    """Testing the orjson renderer and parser against DRF's"""
+
+    data = {
+        "results": [
+            {
+                "text": "Caf\u00e9 \U0001f389 line\u2028break\u2029",
+                "created_date": datetime(2023, 1, 2, 3, 4, 5, 678901, timezone.utc),
+                "day": date(2023, 1, 2),
+                "sum": Decimal("1.50"),
+                "average": 3.25,
+                "histogram": {1: 0, "2": 3},
+                "parent": None,
+            }
+        ],
+    }
+
+    def test_renders_what_drf_renders(self):
+        """Make sure the output is byte for byte the one of DRF's renderer"""
+        expected = renderers.JSONRenderer().render(self.data)
+        self.assertEqual(fastjson.JSONRenderer().render(self.data), expected)
+        self.assertEqual(fastjson.JSONRenderer().render(None), b"")
+        # too wide for orjson
+        self.assertEqual(
+            fastjson.JSONRenderer().render({"big": 2**70}), b'{"big":%d}' % 2**70
+        )
+        indented = "application/json; indent=2"
+        self.assertEqual(
+            fastjson.JSONRenderer().render(self.data, indented),
+            renderers.JSONRenderer().render(self.data, indented),
+        )
+
+    def test_parses_what_drf_parses(self):
+        """Make sure bodies parse like with DRF's parser and errors are 400s"""
+        body = renderers.JSONRenderer().render(self.data)
+        self.assertEqual(
+            fastjson.JSONParser().parse(BytesIO(body)),
+            parsers.JSONParser().parse(BytesIO(body)),
+        )
+        with self.assertRaises(ParseError):
+            fastjson.JSONParser().parse(BytesIO(b'{"text": '))
+
+
+class ValuesSerializerTest(TestCase):
+    """Testing that the values() serializers give what the model ones do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = create_users("jdoe", "bfriend")
+        cls.contents = [
+            Content.objects.create(
+                media="content/a.jpg",
+                title="Title",
+                description="Caf\u00e9 \U0001f389",
+                owner=users[0],
+                rating_count=2,
+                rating_sum=7,
+                rating_3=1,
+                rating_4=1,
+            ),
+            Content.objects.create(
+                media="", title="Empty", description="", owner=users[1]
+            ),
+        ]
+        for label in ("webp", "large", "small"):
+            MediaDerivative.objects.create(
+                content=cls.contents[0],
+                label=label,
+                file=f"derivatives/a-{label}.jpg",
+                width=1,
+                height=1,
+            )
+        comment = Comment.objects.create(
+            owner=users[1], content=cls.contents[0], text="First \u2028"
+        )
+        Comment.objects.create(
+            owner=users[0], content=cls.contents[0], text="Reply", parent=comment
+        )
+        for user, value in zip(users, (3, 4)):
+            Rating.objects.create(owner=user, content=cls.contents[0], value=value)
+
+    def setUp(self):
+        self.context = {"request": Request(APIRequestFactory().get("/"))}
+
+    def assertSameData(self, serializer_class, values_serializer_class, queryset):
+        queryset = queryset.order_by("-id")
+        expected = serializer_class(queryset, many=True, context=self.context).data
+        reader = values_serializer_class(self.context)
+        data = reader.serialize(list(reader.values(queryset, "id")))
+        render = fastjson.JSONRenderer().render
+        self.assertEqual(render(data), render(expected))
+        self.assertEqual(data, expected)
+
+    def test_content_matches_model_serializer(self):
+        """Make sure content rows serialize like ContentSerializer"""
+        self.assertSameData(
+            ContentSerializer,
+            ContentValuesSerializer,
+            Content.objects.prefetch_related("derivatives"),
+        )
+
+    def test_comments_and_ratings_match_model_serializers(self):
+        """Make sure comment and rating rows serialize like their serializers"""
+        self.assertSameData(CommentSerializer, CommentValuesSerializer, Comment.objects)
+        self.assertSameData(RatingSerializer, RatingValuesSerializer, Rating.objects)
+
+    async def test_async_serialization_matches(self):
+        """Make sure rows serialize the same in async views"""
+        queryset = Content.objects.prefetch_related("derivatives").order_by("-id")
+        expected = await sync_to_async(
+            lambda: ContentSerializer(queryset, many=True, context=self.context).data
+        )()
+        reader = ContentValuesSerializer(self.context)
+        rows = [row async for row in reader.values(queryset)]
+        self.assertEqual(await reader.aserialize(rows), expected)
+
+    def test_fields_without_column_need_mapper(self):
+        """Make sure a field that is not a column must be mapped explicitly"""
+
+        class Serializer(ValuesSerializer):
+            serializer_class = ContentSerializer
+
+        with self.assertRaises(ImproperlyConfigured):
+            Serializer()
+
+
+class GenerateDatasetTest(TestCase):
+    """Testing the synthetic dataset for benchmarks"""
+
+    def test_generated_data_is_consistent(self):
+        """Make sure the bulk inserted rows look like the api had made them"""
+        out = StringIO()
+        call_command("generate_dataset", users=40, friends_per_user=3, stdout=out)
+        self.assertIn("Generated 40 users", out.getvalue())
+        users = get_user_model().objects.filter(username__startswith="bench")
+        degrees = sorted(user.friends.count() for user in users)
+        self.assertGreaterEqual(degrees[0], 3)
+        self.assertGreater(degrees[-1], 2 * degrees[len(degrees) // 2])
+        for comment in Comment.objects.select_related("parent"):
+            parent_path = comment.parent.path if comment.parent else ""
+            self.assertEqual(comment.path, Comment.build_path(parent_path, comment.pk))
+        aggregates = list(Content.objects.values_list("rating_count", "rating_sum"))
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+        self.assertEqual(
+            list(Content.objects.values_list("rating_count", "rating_sum")),
+            aggregates,
+        )
+        self.assertEqual(
+            sum(MediaBlob.objects.values_list("ref_count", flat=True)),
+            Content.objects.count(),
+        )
+        client = APIClient()
+        login = client.post(
+            LOGIN_USER_URL, {"username": "bench0", "password": "benchmark"}
+        )
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + login.data["access"]  # type: ignore
+        )
+        feed = client.get(reverse("content:feed"))
+        self.assertTrue(feed.data["results"])  # type: ignore
+        search = client.get(reverse("content:search"), {"q": "holiday"})
+        self.assertTrue(search.data["results"])  # type: ignore
+
+    def test_generating_twice_needs_new_prefix(self):
+        """Make sure a second dataset does not clash with the first"""
+        call_command("generate_dataset", users=10, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", users=10, stdout=StringIO())
+        call_command("generate_dataset", users=10, prefix="other", stdout=StringIO())
+
+
+class ContentIndexTest(QueryPlanMixin, TestCase):
+    """Testing that the hot content queries are index scans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("jdoe")
+        cls.content = Content.objects.create(
+            media="content/a.jpg", title="Title", description="d", owner=cls.user
+        )
+
+    def test_comment_pages_use_index(self):
+        """Make sure the comments of content are read in index order"""
+        self.assertUsesIndex(
+            Comment.objects.filter(content=self.content).order_by(
+                "-created_date", "-id"
+            ),
+            "comment_content_created_idx",
+        )
+
+    def test_rating_pages_use_index(self):
+        """Make sure the ratings of content are read in index order"""
+        self.assertUsesIndex(
+            Rating.objects.filter(content=self.content).order_by(
+                "-created_date", "-id"
+            ),
+            "rating_content_created_idx",
+        )
+
+    def test_owner_content_pages_use_index(self):
+        """Make sure content of an owner looked up by username is read in
+        index order"""
+        self.assertUsesIndex(
+            Content.objects.filter(owner__username="jdoe").order_by(
+                "-created_date", "-id"
+            ),
+            "content_owner_created_idx",
+        )
+
+    def test_pulled_feed_content_uses_index(self):
+        """Make sure content merged into feeds at read time is read by owner in
+        index order"""
+        self.assertUsesIndex(
+            Content.objects.filter(owner=self.user, fanned_out=False).order_by("-id"),
+            "content_owner_not_fanned_idx",
+        )
+
+    def test_feed_pages_use_index(self):
+        """Make sure a feed is read in index order"""
+        self.assertUsesIndex(
+            FeedItem.objects.filter(owner=self.user).order_by("-content"),
+            "feeditem_owner_content_idx",
+        )
@@ -0,0 +1,113 @@
+"""Resumable chunked uploads of large media files
+
+A client starts an UploadSession with the name and size of the file, PUTs
+the bytes in chunks at the offset the session has received so far and then
+finishes it. Chunks are copied from the request stream into a staging
+file in small blocks, so memory use does not depend on the size of the file,
+and a dropped connection only loses the chunk that was in flight. Under
+WSGI the stream is the socket. Under ASGI Django has already spooled the
+whole request body into a temporary file, in memory up to
+FILE_UPLOAD_MAX_MEMORY_SIZE, before the view runs, so every chunk is
+written twice and should stay small.
+
+No transaction is held while a chunk is read from the client. The staging
+file is locked while the chunk is written, so two requests sending a chunk
+for the same offset never write it at the same time, and the new offset is
+saved with a compare and set on the offset the chunk started at.
+"""
+
+import fcntl
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import UploadSession
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the upload left off"""
+
+
+class AssembledUpload(File):
+    """A finished upload, it can be moved into storage instead of copied"""
+
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, "rb"), name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def staging_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{session.pk}.part")
+
+
+def start(owner, filename, size):
+    session = UploadSession.objects.create(owner=owner, filename=filename, size=size)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(staging_path(session), "wb").close()
+    return session
+
+
+def write_chunk(session, offset, length, stream):
+    """Copies ``length`` bytes of ``stream`` into the upload at ``offset``"""
+    if offset + length > session.size:
+        raise UploadError("Chunk goes past the end of the upload")
+    with open(staging_path(session), "r+b") as staging:
+        try:
+            fcntl.flock(staging, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise OffsetMismatch("Another chunk of the upload is being written")
+        session.refresh_from_db(fields=["received"])
+        if offset != session.received:
+            raise OffsetMismatch(f"Upload continues at offset {session.received}")
+        written = 0
+        staging.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            staging.write(data)
+            written += len(data)
+        staging.flush()
+        moved = UploadSession.objects.filter(pk=session.pk, received=offset).update(
+            received=offset + written
+        )
+        if not moved:
+            session.refresh_from_db(fields=["received"])
+            raise OffsetMismatch(f"Upload continues at offset {session.received}")
+        session.received = offset + written
+    if written != length:
+        raise UploadError("Chunk ended early, resume from the current offset")
+    return session
+
+
+def assemble(session):
+    """The complete file of a finished upload, hashed in one sequential read"""
+    if session.received != session.size:
+        raise UploadError(f"Upload has {session.received} of {session.size} bytes")
+    path = staging_path(session)
+    hasher = hashlib.sha256()
+    with open(path, "rb") as staging:
+        for data in iter(lambda: staging.read(COPY_BUFFER_SIZE), b""):
+            hasher.update(data)
+    return AssembledUpload(path, session.filename, hasher.hexdigest())
+
+
+def discard(session):
+    """Deletes the session and whatever is left of its staging file"""
+    try:
+        os.remove(staging_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
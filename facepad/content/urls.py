@@ -1,17 +1,34 @@
 from django.urls import path
 
 from .views import (
+    CompleteUploadView,
     CreateContentView,
     CreateListCommentView,
     CreateListRatingsAPIView,
+    FeedView,
+    MediaView,
     GetFriendContentView,
+    RatingSummaryView,
+    SearchView,
+    StartUploadView,
+    UploadChunkView,
 )
 
 app_name = "content"
 
 urlpatterns = [
     path("content/create/", CreateContentView.as_view(), name="content"),
+    path("content/upload/", StartUploadView.as_view(), name="upload"),
+    path("content/upload/<uuid:pk>/", UploadChunkView.as_view(), name="upload_chunk"),
+    path(
+        "content/upload/<uuid:pk>/complete/",
+        CompleteUploadView.as_view(),
+        name="upload_complete",
+    ),
     path("content/get/<owner>", GetFriendContentView.as_view(), name="get_friend"),
+    path("content/feed/", FeedView.as_view(), name="feed"),
+    path("content/search/", SearchView.as_view(), name="search"),
+    path("content/media/<content>/", MediaView.as_view(), name="media"),
     path(
         "content/comment/<content>/",
         CreateListCommentView.as_view(),
@@ -27,4 +44,9 @@ urlpatterns = [
         CreateListRatingsAPIView.as_view(),
         name="ratings",
     ),
+    path(
+        "content/rating/<content>/summary/",
+        RatingSummaryView.as_view(),
+        name="ratings_summary",
+    ),
 ]
@@ -1,28 +1,148 @@
-from content.models import Comment, Content, Rating
-from content.serializers import CommentSerializer, ContentSerializer, RatingSerializer
+from functools import partial
+
+from content import derivatives, feed, media, ratings, search, uploads
+from content.models import Comment, Content, Rating, UploadSession
+from content.serializers import (
+    CommentSerializer,
+    CommentTreeSerializer,
+    CommentValuesSerializer,
+    ContentSerializer,
+    ContentValuesSerializer,
+    RatingSerializer,
+    RatingSummarySerializer,
+    RatingValuesSerializer,
+    SearchResultSerializer,
+    UploadSessionSerializer,
+)
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
+from facepad import responsecache
+from facepad.fastjson import JSONParser
+from facepad.readserializers import ValuesListMixin
 from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from users import friendships
 
 
 # Create your views here.
-class CreateContentView(generics.ListCreateAPIView):
+class CreateContentView(ValuesListMixin, generics.ListCreateAPIView):
     queryset = Content.objects.all()
     serializer_class = ContentSerializer
+    values_serializer_class = ContentValuesSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         self.queryset = Content.objects.filter(owner=self.request.user)
-        return super().get_queryset()
+        return super().get_queryset().prefetch_related("derivatives")
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        content = serializer.save(owner=self.request.user)
+        feed.fan_out(content)
+        derivatives.schedule(content)
+
+
+class StartUploadView(generics.CreateAPIView):
+    """Starts a resumable chunked upload of a large media file"""
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.instance = uploads.start(
+            self.request.user,
+            serializer.validated_data["filename"],
+            serializer.validated_data["size"],
+        )
+
+
+class UploadChunkView(generics.RetrieveDestroyAPIView):
+    """Shows how far an upload got, takes its chunks and cancels it
+
+    Chunks are PUT as the raw request body with a
+    ``Content-Range: bytes <first>-<last>/<size>`` header and must start at
+    the ``received`` offset of the upload.
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    # the body of a chunk is streamed to disk, never parsed
+    parser_classes = []
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def parse_content_range(self, session):
+        header = self.request.headers.get("Content-Range", "")
+        try:
+            unit, _, spec = header.partition(" ")
+            first_last, _, total = spec.partition("/")
+            first, _, last = first_last.partition("-")
+            first, last = int(first), int(last)
+        except ValueError:
+            raise ParseError("Content-Range: bytes <first>-<last>/<size> is required")
+        if unit != "bytes" or last < first or total not in ("*", str(session.size)):
+            raise ParseError("Content-Range does not match the upload")
+        length = last - first + 1
+        if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+            raise ParseError(
+                f"Chunks can be {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes at most"
+            )
+        return first, length
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        offset, length = self.parse_content_range(session)
+        try:
+            uploads.write_chunk(session, offset, length, request.stream)
+        except uploads.OffsetMismatch as error:
+            # write_chunk read the offset the upload is at
+            return Response(
+                status=status.HTTP_409_CONFLICT,
+                data={"message": str(error), "received": session.received},
+            )
+        except uploads.UploadError as error:
+            raise ValidationError(str(error))
+        return Response(self.get_serializer(session).data)
 
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
 
-class GetFriendContentView(generics.ListAPIView):
+
+class CompleteUploadView(CreateContentView):
+    """Turns a fully received upload into content"""
+
+    parser_classes = [JSONParser]
+    http_method_names = ["post", "options"]
+
+    def create(self, request, *args, **kwargs):
+        session = get_object_or_404(
+            UploadSession, pk=self.kwargs["pk"], owner=request.user
+        )
+        try:
+            media = uploads.assemble(session)
+        except uploads.UploadError as error:
+            raise ValidationError(str(error))
+        with media:
+            serializer = self.get_serializer(
+                data={
+                    "title": request.data.get("title"),
+                    "description": request.data.get("description"),
+                    "media": media,
+                }
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        uploads.discard(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class GetFriendContentView(ValuesListMixin, generics.ListAPIView):
     queryset = Content.objects.all()
     serializer_class = ContentSerializer
+    values_serializer_class = ContentValuesSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = "owner"
     lookup_url_kwarg = "owner"
@@ -31,48 +151,157 @@ class GetFriendContentView(generics.ListAPIView):
         self.queryset = Content.objects.filter(
             owner__username=self.kwargs[self.lookup_url_kwarg]
         )
-        return super().get_queryset()
+        return super().get_queryset().prefetch_related("derivatives")
 
     def get(self, request, *args, **kwargs):
         desired_user = get_user_model().objects.get(
             username=self.kwargs[self.lookup_url_kwarg]
         )
-        if request.user.user_type == "admin":
-            return super().get(request, *args, **kwargs)
-        elif desired_user == self.request.user:
-            return super().get(request, *args, **kwargs)
-
-        elif desired_user in self.request.user.friends.all():  # type: ignore
-            return super().get(request, *args, **kwargs)
-
-        else:
+        visibility = responsecache.visibility(request.user, desired_user.pk)
+        if visibility is None:
             return Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={"message", "user content not found"},
             )
+        resources = [
+            responsecache.USER.format(desired_user.pk),
+            responsecache.USER_CONTENT.format(desired_user.pk),
+        ]
+        return responsecache.cached(
+            request,
+            resources,
+            visibility,
+            partial(super().get, request, *args, **kwargs),
+        )
+
+
+class FeedView(generics.ListAPIView):
+    """Home feed with the content of the user and their friends, newest first"""
+
+    serializer_class = ContentSerializer
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ("-id",)
+
+    def list(self, request, *args, **kwargs):
+        position = self.paginator.decode_cursor(request)
+        if position is not None and not (
+            len(position) == 1 and isinstance(position[0], int)
+        ):
+            raise NotFound(self.paginator.invalid_cursor_message)
+        rows = feed.read(
+            request.user,
+            before=position[0] if position else None,
+            limit=self.paginator.get_page_size(request) + 1,
+        )
+        page = self.paginator.paginate_rows(rows, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SearchView(generics.ListAPIView):
+    """Content and comments matching ``?q=`` that the user can see, newest
+    first"""
+
+    serializer_class = SearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ("-id",)
+
+    def get_queryset(self):
+        terms = search.get_terms(self.request.query_params.get("q", ""))
+        if not terms:
+            raise ValidationError({"q": "A search query is required."})
+        documents = search.visible_to(self.request.user)
+        return search.matching(documents, terms).select_related("content")
+
+
+class MediaView(generics.GenericAPIView):
+    """Serves the media of a piece of content, or one of its derivatives with
+    ``?variant=<label>``, to the owner, their friends and admins"""
+
+    queryset = Content.objects.all()
+    permission_classes = [IsAuthenticated]
+    lookup_field = "title"
+    lookup_url_kwarg = "content"
+
+    def get(self, request, *args, **kwargs):
+        content = self.get_object()
+        if responsecache.visibility(request.user, content.owner_id) is None:
+            raise NotFound("media not found")
+        variant = request.query_params.get("variant")
+        if variant is None:
+            file = content.media
+        else:
+            file = get_object_or_404(content.derivatives, label=variant).file
+        if not file:
+            raise NotFound("media not found")
+        return media.serve(request, file.name, file.storage)
+
+
+class ResolvedContentMixin:
+    """Looks up the content named in the url once per request
+
+    The content comes with its owner joined and is shared by the permission
+    checks, the queryset and ``perform_create``.
+    """
+
+    content_url_kwarg = "content"
+
+    def get_content(self):
+        if getattr(self, "_content", None) is None:
+            self._content = get_object_or_404(
+                Content.objects.select_related("owner"),
+                title=self.kwargs.get(self.content_url_kwarg),
+            )
+        return self._content
 
+    def can_access_content(self, content):
+        """Owners and their friends can use content"""
+        user = self.request.user
+        return content.owner_id == user.id or friendships.are_friends(
+            user, content.owner_id
+        )
 
-class CreateListCommentView(generics.ListCreateAPIView):
+    def cached_list(self, request, resource, respond):
+        """Response of ``respond`` for the owner, their friends and admins,
+        cached until the content or its ``resource`` changes"""
+        content = self.get_content()
+        visibility = responsecache.visibility(request.user, content.owner_id)
+        if visibility is None:
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        resources = [
+            responsecache.CONTENT.format(content.pk),
+            resource.format(content.pk),
+        ]
+        return responsecache.cached(request, resources, visibility, respond)
+
+
+class CreateListCommentView(
+    ResolvedContentMixin, ValuesListMixin, generics.ListCreateAPIView
+):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    values_serializer_class = CommentValuesSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        self.queryset = Comment.objects.filter(
-            content__title=self.kwargs.get("content")
-        )
+        self.queryset = Comment.objects.filter(content=self.get_content())
         return super().get_queryset()
 
+    def get_parent_comment(self, content):
+        return get_object_or_404(
+            Comment, id=int(self.kwargs.get("parent_comment")), content=content
+        )
+
     def perform_create(self, serializer):
-        content = Content.objects.get(title=self.kwargs.get("content"))
+        content = self.get_content()
         if self.kwargs.get("parent_comment"):
-            parent_comment = Comment.objects.get(
-                id=int(self.kwargs.get("parent_comment"))
-            )
+            parent_comment = self.get_parent_comment(content)
+            if parent_comment.depth >= Comment.MAX_DEPTH:
+                raise ValidationError("Comment thread is too deep")
             serializer.save(
                 owner=self.request.user,
                 content=content,
-                parent_comment=[parent_comment],
+                parent=parent_comment,
             )
         else:
             serializer.save(
@@ -81,60 +310,79 @@ class CreateListCommentView(generics.ListCreateAPIView):
             )
 
     def post(self, request, *args, **kwargs):
-        content = Content.objects.get(title=self.kwargs.get("content"))
-        content_owner = get_user_model().objects.get(id=content.owner.id)
-        not_friend = self.request.user not in content_owner.friends.all()  # type: ignore
-        not_self = self.request.user != content_owner
-        if not_friend and not_self:
+        if not self.can_access_content(self.get_content()):
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         else:
             return super().post(request, *args, **kwargs)
 
     def list(self, request, *args, **kwargs):
-        content = Content.objects.get(title=self.kwargs.get("content"))
-        content_owner = get_user_model().objects.get(id=content.owner.id)
-        not_friend = self.request.user not in content_owner.friends.all()  # type: ignore
-        not_admin = request.user.user_type != "admin"
-        not_self = self.request.user != content_owner
-        if not_friend and not_self and not_admin:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        if self.kwargs.get("parent_comment"):
+            respond = partial(self.thread, request, self.get_content())
         else:
-            return super().list(request, *args, **kwargs)
+            respond = partial(super().list, request, *args, **kwargs)
+        return self.cached_list(request, responsecache.COMMENTS, respond)
+
+    def thread(self, request, content):
+        """Comment with its replies nested, ``depth`` limits how many levels"""
+        try:
+            max_depth = request.query_params.get("depth")
+            max_depth = None if max_depth is None else max(int(max_depth), 0)
+        except ValueError:
+            raise ValidationError({"depth": "A valid integer is required."})
+        parent_comment = self.get_parent_comment(content)
+        serializer = CommentTreeSerializer(
+            parent_comment.subtree(max_depth), context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
 
 
-class CreateListRatingsAPIView(generics.ListCreateAPIView):
+class CreateListRatingsAPIView(
+    ResolvedContentMixin, ValuesListMixin, generics.ListCreateAPIView
+):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
+    values_serializer_class = RatingValuesSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        self.queryset = Rating.objects.filter(content__title=self.kwargs.get("content"))
+        self.queryset = Rating.objects.filter(content=self.get_content())
         return super().get_queryset()
 
-    def perform_create(self, serializer):
-        content = Content.objects.get(title=self.kwargs.get("content"))
-        serializer.save(
-            owner=self.request.user,
-            content=content,
+    def create(self, request, *args, **kwargs):
+        """Rates the content, a user rating it again replaces their rating,
+        answers 201 when the rating was created and 200 when it was updated"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rating, created = ratings.rate(
+            request.user, self.get_content(), serializer.validated_data["value"]
+        )
+        return Response(
+            {**self.get_serializer(rating).data, "created": created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
         )
 
     def post(self, request, *args, **kwargs):
-        content = Content.objects.get(title=self.kwargs.get("content"))
-        content_owner = get_user_model().objects.get(id=content.owner.id)
-        not_friend = self.request.user not in content_owner.friends.all()  # type: ignore
-        not_self = self.request.user != content_owner
-        if not_friend and not_self:
+        if not self.can_access_content(self.get_content()):
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         else:
             return super().post(request, *args, **kwargs)
 
     def list(self, request, *args, **kwargs):
-        content = Content.objects.get(title=self.kwargs.get("content"))
-        content_owner = get_user_model().objects.get(id=content.owner.id)
-        not_friend = self.request.user not in content_owner.friends.all()  # type: ignore
-        not_admin = request.user.user_type != "admin"
-        not_self = self.request.user != content_owner
-        if not_friend and not_self and not_admin:
+        respond = partial(super().list, request, *args, **kwargs)
+        return self.cached_list(request, responsecache.RATINGS, respond)
+
+
+class RatingSummaryView(generics.RetrieveAPIView):
+    """Rating count, sum, average and histogram of a piece of content"""
+
+    queryset = Content.objects.all()
+    serializer_class = RatingSummarySerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = "title"
+    lookup_url_kwarg = "content"
+
+    def retrieve(self, request, *args, **kwargs):
+        content = self.get_object()
+        if responsecache.visibility(request.user, content.owner_id) is None:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
-        else:
-            return super().list(request, *args, **kwargs)
+        return Response(self.get_serializer(content).data)
@@ -0,0 +1,119 @@
+"""Async views for the read heavy endpoints
+
+DRF views are synchronous, under ASGI every request to them holds a thread
+until its response is written. The views of the async api are plain Django
+async views that borrow the pieces of DRF that do no I/O: the request
+wrapper, the serializers, the paginator, the exception handler and the
+renderer. Authentication and database reads go through the async APIs of
+the cache and the ORM.
+
+Responses have the same bodies as the synchronous views they mirror.
+"""
+
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+from users.authentication import CachedJWTAuthentication
+
+
+class AsyncAPIView(View):
+    """Async view that only answers authenticated users"""
+
+    authentication_class = CachedJWTAuthentication
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = request = Request(request)
+        self.authenticator = self.authentication_class()
+        try:
+            await self.authenticate(request)
+            handler = self.http_method_not_allowed
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), handler)
+            return await handler(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        result = await self.authenticator.aauthenticate(request)
+        if result is None:
+            raise NotAuthenticated()
+        request.user, request.auth = result
+
+    def handle_exception(self, exc):
+        """Answers API exceptions the way DRF's exception handler does"""
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            exc.auth_header = self.authenticator.authenticate_header(self.request)
+        response = exception_handler(exc, {"view": self, "request": self.request})
+        if response is None:
+            raise exc
+        rendered = self.render(response.data, response.status_code)
+        for header in ("WWW-Authenticate", "Retry-After"):
+            if response.has_header(header):
+                rendered[header] = response[header]
+        return rendered
+
+    def render(self, data, status=200):
+        renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        return HttpResponse(
+            renderer.render(data), status=status, content_type=content_type
+        )
+
+
+class AsyncListAPIView(AsyncAPIView):
+    """Keyset paginated list of ``queryset`` or ``get_queryset`` serialized
+    with ``serializer_class``, or as ``values()`` rows with
+    ``values_serializer_class`` when it is set"""
+
+    queryset = None
+    serializer_class = None
+    values_serializer_class = None
+
+    async def get_queryset(self):
+        """Like GenericAPIView.get_queryset, ``queryset`` evaluated afresh"""
+        assert self.queryset is not None, (
+            f"'{self.__class__.__name__}' should either include a `queryset` "
+            "attribute, or override the `get_queryset()` method."
+        )
+        queryset = self.queryset
+        if isinstance(queryset, QuerySet):
+            queryset = queryset.all()
+        return queryset
+
+    def get_serializer_context(self):
+        return {"request": self.request, "format": None, "view": self}
+
+    def get_serializer(self, *args, **kwargs):
+        assert self.serializer_class is not None, (
+            f"'{self.__class__.__name__}' should include a `serializer_class` "
+            "attribute."
+        )
+        kwargs["context"] = self.get_serializer_context()
+        return self.serializer_class(*args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+    async def list(self, request, *args, **kwargs):
+        return self.render(await self.get_data(request))
+
+    async def get_data(self, request):
+        """The data of the response, a page of the serialized queryset"""
+        queryset = await self.get_queryset()
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        if self.values_serializer_class is None:
+            page = await paginator.apaginate_queryset(queryset, request, self)
+            data = self.get_serializer(page, many=True).data
+        else:
+            reader = self.values_serializer_class(self.get_serializer_context())
+            ordering = [field.lstrip("-") for field in paginator.get_ordering(self)]
+            queryset = reader.values(queryset, *ordering)
+            page = await paginator.apaginate_queryset(queryset, request, self)
+            data = await reader.aserialize(page)
+        return paginator.get_paginated_response(data).data
@@ -0,0 +1,79 @@
+"""Sending the reads of safe requests to read replicas
+
+The replicas are listed in DATABASE_REPLICAS, see settings. Reads go to
+the primary unless ReplicaRoutingMiddleware allowed replicas for the
+current request, which it does for GET, HEAD and OPTIONS requests. The
+first write of a request pins all of its following reads to the primary so
+a request always sees what it wrote, and so do reads inside a transaction.
+Management commands and other code outside requests only use the primary.
+"""
+
+import asyncio
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def pin_to_primary():
+    """Sends the rest of the reads of the current request to the primary"""
+    _replica_reads.set(False)
+
+
+class PrimaryReplicaRouter:
+    """Reads from a random replica when allowed, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or not _replica_reads.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Allows replica reads for the duration of safe requests"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _replica_reads.set(request.method in SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+    async def __acall__(self, request):
+        token = _replica_reads.set(request.method in SAFE_METHODS)
+        try:
+            return await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
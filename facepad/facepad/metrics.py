@@ -0,0 +1,231 @@
+"""Per endpoint request metrics
+
+MetricsMiddleware measures every request that resolves to a named url: the
+number of SQL queries and the time spent running them, the time spent in
+serializers, the size of the response and the total time. Totals are kept
+per ``namespace:url_name`` and method in this process and are exposed in
+the Prometheus text format by ``metrics_view``, which only answers the
+addresses in METRICS_ALLOWED_IPS. With several worker processes each one
+reports its own totals, along with its pid as ``facepad_worker_pid`` so
+scrapes of different workers can be told apart.
+
+The measurements of a request are also attached to its response as
+``response.metrics``, which is what the query budgets of the tests use.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+from django.http import Http404, HttpResponse
+
+# sent with the view name and RequestMetrics of every measured request
+request_measured = Signal()
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What a single request cost"""
+
+    def __init__(self, view_name, method):
+        self.view_name = view_name
+        self.method = method
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.response_size = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper counting and timing the queries of the request"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def serializing():
+    """Adds the time spent in the block to the serializer time of the
+    request, unless an outer block is already counting it"""
+    metrics = _current.get()
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.serializer_depth -= 1
+
+
+class TimedSerializerMixin:
+    """Adds the time spent turning instances into data to the request metrics
+
+    Nested serializers and list items are only counted once, by the
+    outermost serializer that is running.
+    """
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+
+class Registry:
+    """Totals of the measured requests per endpoint and method"""
+
+    FIELDS = (
+        ("requests_total", "counter", "Requests handled"),
+        ("db_queries_total", "counter", "SQL queries run"),
+        ("db_queries_max", "gauge", "Most SQL queries run by one request"),
+        ("db_seconds_total", "counter", "Time spent running SQL queries"),
+        ("serializer_seconds_total", "counter", "Time spent in serializers"),
+        ("response_bytes_total", "counter", "Bytes of response bodies"),
+        ("request_seconds_total", "counter", "Time spent handling requests"),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, metrics):
+        key = (metrics.view_name, metrics.method)
+        with self.lock:
+            totals = self.endpoints.setdefault(
+                key, dict.fromkeys((name for name, _, _ in self.FIELDS), 0)
+            )
+            totals["requests_total"] += 1
+            totals["db_queries_total"] += metrics.queries
+            totals["db_queries_max"] = max(totals["db_queries_max"], metrics.queries)
+            totals["db_seconds_total"] += metrics.db_time
+            totals["serializer_seconds_total"] += metrics.serializer_time
+            totals["response_bytes_total"] += metrics.response_size
+            totals["request_seconds_total"] += metrics.duration
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def render(self):
+        """The totals in the Prometheus text exposition format"""
+        with self.lock:
+            endpoints = sorted(
+                (key, dict(totals)) for key, totals in self.endpoints.items()
+            )
+        lines = [
+            "# HELP facepad_worker_pid Process id of the worker that was scraped",
+            "# TYPE facepad_worker_pid gauge",
+            f"facepad_worker_pid {os.getpid()}",
+        ]
+        for name, kind, help_text in self.FIELDS:
+            lines.append(f"# HELP facepad_{name} {help_text}")
+            lines.append(f"# TYPE facepad_{name} {kind}")
+            for (view_name, method), totals in endpoints:
+                lines.append(
+                    f'facepad_{name}{{endpoint="{view_name}",method="{method}"}} '
+                    f"{totals[name]}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response.get("Content-Length") or 0)
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Measures every request that is routed to a named url
+
+    Works in both the sync and the async request paths. Async views run
+    their queries through ``sync_to_async`` in the thread shared by the sync
+    code of the request, which is where the query counter is installed.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics(None, request.method)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with _execute_wrappers(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(None, request.method)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        wrappers = _execute_wrappers(metrics)
+        await sync_to_async(wrappers.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.__exit__)(None, None, None)
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        metrics.duration = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        if match is None or not match.url_name:
+            return response
+        metrics.view_name = match.view_name
+        metrics.response_size = _response_size(response)
+        response.metrics = metrics
+        registry.record(metrics)
+        request_measured.send(sender=self.__class__, metrics=metrics)
+        return response
+
+
+class _execute_wrappers:
+    """Installs ``wrapper`` on every database connection of this thread"""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+        self.connections = []
+
+    def __enter__(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self.wrapper)
+            self.connections.append(connection)
+
+    def __exit__(self, *exc_info):
+        for connection in self.connections:
+            connection.execute_wrappers.remove(self.wrapper)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, hidden from anything but the allowed ips"""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,141 @@
+"""Keyset (cursor) pagination for the list endpoints
+
+DRF's CursorPagination only keys on the first ordering field and falls back
+to an offset for ties, ``created_date`` is a date so ties are the norm. This
+paginator keys on every ordering field, by default ``(created_date, id)``,
+so every page is an index range scan no matter how deep it is.
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginates on a unique ordering, views can set ``keyset_ordering``"""
+
+    ordering = ("-created_date", "-id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = getattr(settings, "MAX_PAGE_SIZE", 100)
+        self.next_position = None
+        self.request = None
+
+    def get_ordering(self, view):
+        return getattr(view, "keyset_ordering", self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Returns the position encoded in the cursor of the request or None"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def get_position(self, row, ordering):
+        fields = [field.lstrip("-") for field in ordering]
+        if isinstance(row, dict):
+            values = [row[field] for field in fields]
+        else:
+            values = [getattr(row, field) for field in fields]
+        return [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in values
+        ]
+
+    def keyset_filter(self, queryset, ordering, position):
+        """Rows strictly after ``position`` in ``ordering``
+
+        Builds (a < x) OR (a = x AND b < y) ... for every ordering field.
+        """
+        if len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        model = queryset.model
+        condition = Q()
+        equal = {}
+        try:
+            for field, value in zip(ordering, position):
+                name = field.lstrip("-")
+                value = model._meta.get_field(name).to_python(value)
+                lookup = "lt" if field.startswith("-") else "gt"
+                condition |= Q(**equal, **{f"{name}__{lookup}": value})
+                equal[name] = value
+        except (FieldDoesNotExist, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return queryset.filter(condition)
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The rows of the requested page plus one row of lookahead"""
+        ordering = self.get_ordering(view)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.keyset_filter(queryset, ordering, position)
+        return queryset.order_by(*ordering)[: self.get_page_size(request) + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        rows = self.get_page_queryset(queryset, request, view)
+        return self.paginate_rows(list(rows), request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views"""
+        rows = self.get_page_queryset(queryset, request, view)
+        return self.paginate_rows([row async for row in rows], request, view)
+
+    def paginate_rows(self, rows, request, view=None):
+        """Trims rows fetched with one row of lookahead to a page"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_position = self.get_position(rows[-1], self.get_ordering(view))
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
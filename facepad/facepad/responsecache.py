@@ -0,0 +1,153 @@
+"""Versioned cache of the responses of read endpoints
+
+A response is cached under its url, the visibility class of the viewer
+(``self``, ``friend`` or ``admin``) and the current generation of every
+resource it was built from, like ``user:3`` or ``comments:12``. Changing a
+resource bumps its generation (see the signal handlers of the apps), so
+every response built from the old state is missed from then on and
+expires from the cache on its own. Nothing is ever deleted by key or
+pattern.
+
+Generations start at the current time in nanoseconds, a counter that was
+evicted comes back larger than any value it had before. Resources are
+bumped when they change and again once the transaction that changed them
+commits, so a response cached while the change was not visible yet is not
+served after it.
+
+Whether the viewer may see a resource at all is checked on every request,
+only the work of building the response is cached.
+
+Responses that are going to be cached are built from the primary. A
+replica that is behind would build one from rows older than the
+generation it is cached under, and it would be served until it expires.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from rest_framework.response import Response
+from users import friendships
+
+from .db_routers import pin_to_primary
+
+# resources responses are built from
+USER = "user:{}"
+USER_CONTENT = "user-content:{}"
+CONTENT = "content:{}"
+COMMENTS = "comments:{}"
+RATINGS = "ratings:{}"
+
+GENERATION_KEY = "gen:{}"
+RESPONSE_KEY = "response:{}"
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _generation_keys(resources):
+    return [GENERATION_KEY.format(resource) for resource in resources]
+
+
+def get_generations(resources):
+    """Current generation of each of ``resources``"""
+    cache = _cache()
+    keys = _generation_keys(resources)
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+async def aget_generations(resources):
+    cache = _cache()
+    keys = _generation_keys(resources)
+    generations = await cache.aget_many(keys)
+    for key in keys:
+        if key not in generations:
+            await cache.aadd(key, time.time_ns(), None)
+            generations[key] = await cache.aget(key)
+    return [generations[key] for key in keys]
+
+
+def _bump(keys):
+    cache = _cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # not cached, it starts over above every value it had
+            pass
+
+
+def invalidate(*resources):
+    """Bumps the generation of ``resources``, again once the current
+    transaction commits"""
+    keys = _generation_keys(resources)
+    _bump(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def visibility(user, owner_id):
+    """Visibility class of ``user`` for what ``owner_id`` owns, None when
+    they may not see it
+
+    This is the owner, admin and friend rule of every read endpoint, cached
+    or not, so the endpoints cannot drift apart.
+    """
+    if owner_id == user.id:
+        return "self"
+    if user.user_type == "admin":
+        return "admin"
+    if friendships.are_friends(user, owner_id):
+        return "friend"
+    return None
+
+
+async def avisibility(user, owner_id):
+    if owner_id == user.id:
+        return "self"
+    if user.user_type == "admin":
+        return "admin"
+    if await friendships.aare_friends(user, owner_id):
+        return "friend"
+    return None
+
+
+def make_key(request, visibility, generations):
+    digest = hashlib.sha1(
+        repr((request.build_absolute_uri(), visibility, generations)).encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(digest)
+
+
+def cached(request, resources, visibility, respond):
+    """The data of the response ``respond()`` builds, cached until one of
+    ``resources`` changes"""
+    key = make_key(request, visibility, get_generations(resources))
+    data = _cache().get(key)
+    if data is not None:
+        return Response(data)
+    pin_to_primary()
+    response = respond()
+    if response.status_code == 200:
+        _cache().set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+    return response
+
+
+async def acached(request, resources, visibility, respond):
+    """``cached`` for async views, ``respond`` is awaited and returns the
+    data of the response"""
+    key = make_key(request, visibility, await aget_generations(resources))
+    data = await _cache().aget(key)
+    if data is None:
+        pin_to_primary()
+        data = await respond()
+        await _cache().aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return data
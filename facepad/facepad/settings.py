@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
 import sys
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -47,7 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "facepad.metrics.MetricsMiddleware",
+    "facepad.db_routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -88,9 +92,34 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # seconds a connection is reused for, keep it at 0 under the ASGI
+        # server where every request runs its queries in a thread of its own
+        # and pool with PgBouncer instead (see docker-compose.yaml)
+        "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", 1))),
+        # required behind PgBouncer in transaction pooling mode
+        "DISABLE_SERVER_SIDE_CURSORS": bool(
+            int(os.environ.get("SQL_DISABLE_SERVER_SIDE_CURSORS", 0))
+        ),
     }
 }
 
+# Read replicas, comma separated host[:port] with the settings of the primary
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.environ.get("SQL_REPLICA_HOSTS", "").split(","))
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["facepad.db_routers.PrimaryReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -130,6 +159,37 @@ STATIC_URL = "static/"
 
 MEDIA_URL = "media/"
 
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
+# Media is stored content addressed, the upload handlers hash uploads while
+# they stream in so duplicates are never written twice
+DEFAULT_FILE_STORAGE = "content.storage.ContentAddressedStorage"
+
+FILE_UPLOAD_HANDLERS = [
+    "content.uploadhandlers.HashingMemoryFileUploadHandler",
+    "content.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
+# Media is served by the api so visibility is checked, with a prefix set it
+# is handed to nginx through X-Accel-Redirect (an internal location that maps
+# the prefix to MEDIA_ROOT) instead of being streamed by django. Set it in
+# production, under ASGI django streams files through Python chunk by chunk,
+# docker-compose.yaml runs nginx with /protected/
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", 0))
+
+# Resumable chunked uploads are staged here until they are complete
+CHUNKED_UPLOAD_DIR = os.environ.get(
+    "CHUNKED_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "facepad-uploads")
+)
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get("CHUNKED_UPLOAD_MAX_SIZE", 2 * 1024**3))
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = int(
+    os.environ.get("CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 8 * 1024**2)
+)
+
+# Threads generating thumbnails in the background, 0 generates them inline
+MEDIA_DERIVATIVE_WORKERS = int(os.environ.get("MEDIA_DERIVATIVE_WORKERS", 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -138,15 +198,70 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.CachedJWTAuthentication",),
+    "DEFAULT_PAGINATION_CLASS": "facepad.pagination.KeysetPagination",
+    "DEFAULT_PARSER_CLASSES": (
+        "facepad.fastjson.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "facepad.fastjson.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "PAGE_SIZE": int(os.environ.get("PAGE_SIZE", 20)),
 }
 
+# Hard limit for the page_size query parameter of the list endpoints
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+
+# Addresses allowed to scrape the Prometheus metrics at /metrics/
+METRICS_ALLOWED_IPS = os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.FacepadTokenObtainPairSerializer",
+}
+
+# Authenticated requests build the user from these cached fields instead of
+# loading it from the database
+AUTH_USER_CACHE_ALIAS = os.environ.get("AUTH_USER_CACHE_ALIAS", "default")
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get("AUTH_USER_CACHE_TIMEOUT", 60))
+
+# Friendship checks keep friend ids in a per process LRU cache, set
+# FRIENDS_CACHE_ALIAS to the name of a configured cache to share them too.
+# Other processes only see a change once their entries expire, after
+# FRIENDS_LOCAL_CACHE_TTL seconds
+FRIENDS_LOCAL_CACHE_SIZE = int(os.environ.get("FRIENDS_LOCAL_CACHE_SIZE", 1024))
+FRIENDS_LOCAL_CACHE_TTL = float(os.environ.get("FRIENDS_LOCAL_CACHE_TTL", 5))
+FRIENDS_CACHE_ALIAS = os.environ.get("FRIENDS_CACHE_ALIAS")
+FRIENDS_CACHE_TIMEOUT = int(os.environ.get("FRIENDS_CACHE_TIMEOUT", 300))
+
+# Responses of the read endpoints are cached in RESPONSE_CACHE_ALIAS for at
+# most RESPONSE_CACHE_TIMEOUT seconds, see facepad.responsecache. Share the
+# cache between processes with for example
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://redis:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+        "KEY_PREFIX": "facepad",
+    }
 }
+RESPONSE_CACHE_ALIAS = os.environ.get("RESPONSE_CACHE_ALIAS", "default")
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Most usernames or request ids one bulk friend request call takes
+FRIEND_REQUEST_BULK_LIMIT = int(os.environ.get("FRIEND_REQUEST_BULK_LIMIT", 500))
+
+# Home feeds are fanned out on write into ring buffers of FEED_MAX_LENGTH
+# items, owners with more friends than FEED_FANOUT_LIMIT are fanned out on read
+FEED_MAX_LENGTH = int(os.environ.get("FEED_MAX_LENGTH", 500))
+FEED_FANOUT_LIMIT = int(os.environ.get("FEED_FANOUT_LIMIT", 5000))
 
 
 if "test" in sys.argv:
@@ -154,3 +269,7 @@ if "test" in sys.argv:
     DEFAULT_FILE_STORAGE = "inmemorystorage.InMemoryStorage"
     # much faster password hashing, default one is super slow (on purpose)
     PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    # the test database is not shared with background threads
+    MEDIA_DERIVATIVE_WORKERS = 0
+    # every test process gets its own cache
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
@@ -0,0 +1,274 @@
+"""Helpers shared by the test suites of the apps
+
+Besides the query budget and plan assertions this has the fixtures of the
+api tests. Registering and logging in over HTTP for every test costs more
+than most tests themselves, so the factories here insert users, friendships
+and content directly with ``bulk_create``, access tokens are minted the way
+the login endpoint mints them and uploads are made from images encoded once
+per process. ``APIFixturesMixin`` builds them once per test class in
+``setUpTestData``.
+"""
+
+from functools import lru_cache
+from io import BytesIO
+
+from content import dataset, feed
+from content.models import Content
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from PIL import Image
+from rest_framework.test import APIClient
+from users import authentication, friendrequests, friendships
+from users.serializers import FacepadTokenObtainPairSerializer
+
+from . import responsecache
+from .metrics import request_measured
+
+# what a plan says when rows are sorted after they were found
+SORT_MARKERS = {"sqlite": "USE TEMP B-TREE", "postgresql": "Sort Key"}
+
+
+class QueryBudgetMixin:
+    """Fails a test when a request runs more queries than its endpoint may
+
+    ``query_budgets`` maps url names (``"content:feed"``) or url names with
+    a method (``"content:feed GET"``) to the most queries a request to it is
+    allowed to run. Every request made through the test client is checked as
+    it finishes, so the request that went over the budget is the one that
+    raises.
+    """
+
+    query_budgets = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        request_measured.connect(cls._check_measured_request)
+
+    @classmethod
+    def tearDownClass(cls):
+        request_measured.disconnect(cls._check_measured_request)
+        super().tearDownClass()
+
+    @classmethod
+    def _check_measured_request(cls, sender, metrics, **kwargs):
+        cls._check_query_budget(metrics)
+
+    @classmethod
+    def get_query_budget(cls, metrics):
+        budget = cls.query_budgets.get(f"{metrics.view_name} {metrics.method}")
+        if budget is None:
+            budget = cls.query_budgets.get(metrics.view_name)
+        return budget
+
+    @classmethod
+    def _check_query_budget(cls, metrics, budget=None):
+        if budget is None:
+            budget = cls.get_query_budget(metrics)
+        if budget is not None and metrics.queries > budget:
+            raise cls.failureException(
+                f"{metrics.method} {metrics.view_name} ran {metrics.queries} "
+                f"queries, its budget is {budget}"
+            )
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        """The request of ``response`` ran at most ``budget`` queries,
+        by default the budget of its endpoint"""
+        self._check_query_budget(response.metrics, budget)
+
+
+class QueryPlanMixin:
+    """Asserts on the EXPLAIN output of querysets
+
+    Test tables are tiny so PostgreSQL would rather scan them, sequential
+    scans are turned off while explaining to see if an index can be used.
+    """
+
+    def assertUsesIndex(self, queryset, index_name, sorted_by_index=True):
+        connection = connections[queryset.db]
+        if connection.vendor not in SORT_MARKERS:
+            self.skipTest(f"Query plans of {connection.vendor} are not checked")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+            self.addCleanup(self._reset_seqscan, connection)
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} is not used:\n{plan}")
+        if sorted_by_index:
+            self.assertNotIn(
+                SORT_MARKERS[connection.vendor],
+                plan,
+                f"rows are sorted after {index_name}:\n{plan}",
+            )
+
+    @staticmethod
+    def _reset_seqscan(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("RESET enable_seqscan")
+
+
+# password of the users made by create_users
+PASSWORD = "secret"
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+
+
+@lru_cache(maxsize=None)
+def password_hash(password=PASSWORD):
+    """``password`` hashed once, hashing is slow on purpose"""
+    return make_password(password)
+
+
+def create_users(*usernames, **fields):
+    """Users named ``usernames`` with PASSWORD, inserted in one query
+
+    ``fields`` are set on all of them, emails are ``<username>@gmail.com``
+    unless given.
+    """
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        [
+            User(
+                **{
+                    "email": f"{username}@gmail.com",
+                    "password": password_hash(),
+                    **fields,
+                    "username": username,
+                }
+            )
+            for username in usernames
+        ]
+    )
+    # no post_save for a bulk insert, and primary keys are reused after a
+    # rollback, so nothing cached for an earlier user of the same id may stay
+    friendships.invalidate(*users)
+    for user in users:
+        authentication.invalidate(user)
+    responsecache.invalidate(*(responsecache.USER.format(user.pk) for user in users))
+    return users
+
+
+def create_user(username, **fields):
+    return create_users(username, **fields)[0]
+
+
+def befriend(user, *others):
+    """Makes ``user`` friends with ``others`` like an accepted request does"""
+    friendrequests.befriend(user, [other.pk for other in others])
+
+
+@lru_cache(maxsize=None)
+def image_bytes(format="JPEG", size=(100, 100), mode="RGB"):
+    """An encoded blank image, made once per process"""
+    image = BytesIO()
+    Image.new(mode, size).save(image, format)
+    return image.getvalue()
+
+
+def image_upload(name="image.jpg", size=(100, 100), mode="RGB"):
+    """A fresh upload of a blank image, its format follows the extension of
+    ``name``"""
+    extension = name[name.rfind(".") :].lower()
+    format = IMAGE_FORMATS[extension]
+    return SimpleUploadedFile(
+        name, image_bytes(format, size, mode), content_type=f"image/{format.lower()}"
+    )
+
+
+def create_content(owner, *titles, description="description", media=None):
+    """Content of ``owner`` titled ``titles``, inserted in one query and
+    fanned out as an upload would be, without derivatives
+
+    ``media`` is the name of a stored file, by default a blank image is
+    stored for the content to share.
+    """
+    if media is None:
+        storage = Content._meta.get_field("media").storage
+        media = storage.save("content/image.jpg", ContentFile(image_bytes()))
+    content = [
+        Content(media=media, title=title, description=description, owner=owner)
+        for title in titles
+    ]
+    dataset.create_content(content, [], batch_size=None)
+    responsecache.invalidate(responsecache.USER_CONTENT.format(owner.pk))
+    for item in content:
+        feed.fan_out(item)
+    return content
+
+
+def access_token(user):
+    """A signed access token for ``user``, with the claims of a login"""
+    return str(FacepadTokenObtainPairSerializer.get_token(user).access_token)
+
+
+def authenticated_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Bearer " + token)
+    return client
+
+
+def cache_auth_user(user):
+    """Caches ``user`` for CachedJWTAuthentication as a first request would"""
+    caches[settings.AUTH_USER_CACHE_ALIAS].set(
+        authentication.CACHE_KEY.format(user.pk),
+        {field: getattr(user, field) for field in authentication.HYDRATED_FIELDS},
+        settings.AUTH_USER_CACHE_TIMEOUT,
+    )
+
+
+def clear_caches():
+    """Forgets everything cached by earlier tests
+
+    Rolling a test back does not roll the caches back, what a test cached
+    about the class fixtures would outlive the changes it made to them.
+    """
+    for cache in caches.all():
+        cache.clear()
+    friendships.local_cache.clear()
+
+
+class APIFixturesMixin:
+    """Users, friendships and access tokens made once per test class
+
+    ``fixture_users`` are created in ``setUpTestData`` with ``create_users``
+    and ``fixture_friends`` are the pairs of their usernames that are
+    friends. Every test gets them as ``self.users``, their access tokens as
+    ``self.tokens`` and an authenticated APIClient each as ``self.clients``,
+    ``self.client`` being that of the first user. Caches are cleared before
+    each test and the fixture users put back in the authentication cache,
+    as if they had made a request already.
+
+    ``setUpFixtures`` is the place for more class level data, like content.
+    """
+
+    fixture_users = ()
+    fixture_friends = ()
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users = {user.username: user for user in create_users(*cls.fixture_users)}
+        for username, other in cls.fixture_friends:
+            befriend(cls.users[username], cls.users[other])
+        cls.setUpFixtures()
+        cls.tokens = {
+            username: access_token(user) for username, user in cls.users.items()
+        }
+
+    @classmethod
+    def setUpFixtures(cls):
+        pass
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.clients = {}
+        for username, user in self.users.items():
+            cache_auth_user(user)
+            self.clients[username] = authenticated_client(self.tokens[username])
+        if self.clients:
+            self.client = next(iter(self.clients.values()))
@@ -16,8 +16,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from . import metrics
+
 urlpatterns = [
     path("api/v1/", include("users.urls")),
     path("api/v1/", include("content.urls")),
+    # async views of the read heavy endpoints, for ASGI servers
+    path("api/v1/async/", include("users.async_urls")),
+    path("api/v1/async/", include("content.async_urls")),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics.metrics_view, name="metrics"),
 ]
@@ -0,0 +1,37 @@
+"""Gunicorn configuration, serving the ASGI application with uvicorn workers
+
+Every worker is a single event loop, so slow clients and the async api
+views wait on sockets instead of holding a thread each. The synchronous
+views still run, in the thread pool of each worker.
+
+Settings can be changed from the environment:
+
+    GUNICORN_BIND       address to listen on (0.0.0.0:8000)
+    GUNICORN_WORKERS    worker processes (2 per cpu + 1)
+    GUNICORN_TIMEOUT    seconds a silent worker lives before it is restarted
+    GUNICORN_KEEPALIVE  seconds an idle keep-alive connection is kept open
+    GUNICORN_RELOAD     restart the workers when the code changes (DEBUG)
+
+Run with ``gunicorn -c gunicorn.conf.py``.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "facepad.asgi:application"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = timeout
+# mobile clients reuse their connections, keep them around longer than the
+# 2 second default so they do not pay for a new handshake on every request
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 75))
+# recycle workers now and then so a leak cannot grow forever
+max_requests = 10000
+max_requests_jitter = 1000
+reload = os.environ.get("GUNICORN_RELOAD", os.environ.get("DEBUG", "")) not in ("", "0")
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .async_views import GetFriendRequests
+
+app_name = "users_async"
+
+urlpatterns = [
+    path("friends/requests/", GetFriendRequests.as_view(), name="get_friend_requests"),
+]
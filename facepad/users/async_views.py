@@ -0,0 +1,17 @@
+"""Async versions of the users listings, see facepad.asyncviews"""
+
+from facepad.asyncviews import AsyncListAPIView
+from users.models import FriendRequest
+
+from .serializers import FriendRequestSerializer
+
+
+class GetFriendRequests(AsyncListAPIView):
+    """Active friend requests sent to the user"""
+
+    serializer_class = FriendRequestSerializer
+
+    async def get_queryset(self):
+        return FriendRequest.objects.filter(
+            requestee=self.request.user, status="active"
+        ).select_related("requestor", "requestee")
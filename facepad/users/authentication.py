@@ -0,0 +1,105 @@
+"""JWT authentication that does not load the user row on every request
+
+Access tokens only carry the ``auth_version`` of the user they were issued
+to, so a token never holds a stale copy of a field. The few user fields
+requests need are kept in a short lived cache and the user is built from
+them as a model instance with every other field deferred, so an
+authenticated request does not SELECT the user.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+CACHE_KEY = "auth:user:{}"
+
+HYDRATED_FIELDS = (
+    "id",
+    "username",
+    "user_type",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "auth_version",
+)
+
+
+def _cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def invalidate(user):
+    """Drop the cached fields of ``user`` or a user id"""
+    _cache().delete(CACHE_KEY.format(getattr(user, "pk", user)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that hydrates the user from a cache
+
+    ``aauthenticate`` does the same for async views, with the cache and the
+    database read through their async APIs.
+    """
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = CACHE_KEY.format(user_id)
+        fields = _cache().get(key)
+        if fields is None:
+            fields = self.get_user_fields(user_id).first()
+            if fields is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            _cache().set(key, fields, settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.hydrate(fields, validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = CACHE_KEY.format(user_id)
+        fields = await _cache().aget(key)
+        if fields is None:
+            fields = await self.get_user_fields(user_id).afirst()
+            if fields is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            await _cache().aset(key, fields, settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.hydrate(fields, validated_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def get_user_fields(self, user_id):
+        return self.user_model.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values(*HYDRATED_FIELDS)
+
+    def hydrate(self, fields, validated_token):
+        """The user of the cached ``fields``, if the token is still valid"""
+        if not fields["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token.get("auth_version", 0) != fields["auth_version"]:
+            raise AuthenticationFailed(
+                _("Token was issued before the user changed"), code="token_outdated"
+            )
+        # from_db expects the values in the order of the model's fields
+        names = [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname in fields
+        ]
+        return self.user_model.from_db(
+            self.user_model.objects.db, names, [fields[name] for name in names]
+        )
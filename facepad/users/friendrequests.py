@@ -0,0 +1,97 @@
+"""Sending and answering friend requests in bulk
+
+Importing contacts sends hundreds of requests at once, so requests are
+created with one ``bulk_create``, answered with one set based UPDATE and
+accepted friendships are stored with one INSERT into the friends through
+table that covers both directions of every pair.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import friendships, suggestions
+from .models import FriendRequest
+
+
+def befriend(user, other_ids):
+    """Makes ``user`` friends with every user in ``other_ids``"""
+    user_id = getattr(user, "pk", user)
+    Through = get_user_model().friends.through
+    # pairs that already are friends, e.g. after two crossing requests were
+    # both accepted, must not count as new friendships in the suggestions
+    other_ids = set(other_ids) - {user_id}
+    other_ids -= set(
+        Through.objects.filter(
+            from_user_id=user_id, to_user_id__in=other_ids
+        ).values_list("to_user_id", flat=True)
+    )
+    if not other_ids:
+        return
+    # the m2m_changed signals are not sent for a bulk insert, the caches and
+    # suggestions are updated here instead
+    Through.objects.bulk_create(
+        [
+            Through(from_user_id=from_id, to_user_id=to_id)
+            for other_id in other_ids
+            for from_id, to_id in ((user_id, other_id), (other_id, user_id))
+        ],
+        ignore_conflicts=True,
+    )
+    friendships.invalidate(user_id, *other_ids)
+    suggestions.befriended(user_id, other_ids)
+
+
+@transaction.atomic
+def send(requestor, usernames):
+    """Sends a friend request from ``requestor`` to each of ``usernames``
+
+    Returns the created requests and a username: reason dict of the ones
+    that were skipped.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    users = {
+        user.username: user
+        for user in get_user_model()
+        .objects.filter(username__in=usernames)
+        .only("id", "username")
+    }
+    active = set(
+        FriendRequest.objects.filter(
+            requestor=requestor,
+            requestee__in=users.values(),
+            status="active",
+        ).values_list("requestee_id", flat=True)
+    )
+    friend_ids = friendships.get_friend_ids(requestor)
+    skipped = {}
+    requests = []
+    for username in usernames:
+        user = users.get(username)
+        if user is None:
+            skipped[username] = "User does not exist"
+        elif user.pk == requestor.pk:
+            skipped[username] = "Cannot befriend yourself"
+        elif user.pk in friend_ids:
+            skipped[username] = "Already friends"
+        elif user.pk in active:
+            skipped[username] = "Friend request is still active"
+        else:
+            requests.append(FriendRequest(requestor=requestor, requestee=user))
+    return FriendRequest.objects.bulk_create(requests), skipped
+
+
+@transaction.atomic
+def respond(requestee, request_ids, status):
+    """Accepts or rejects the active requests to ``requestee`` in
+    ``request_ids``, returns the ids of the requests that were answered"""
+    answered = dict(
+        FriendRequest.objects.select_for_update()
+        .filter(requestee=requestee, status="active", id__in=request_ids)
+        .values_list("id", "requestor_id")
+    )
+    if not answered:
+        return []
+    FriendRequest.objects.filter(id__in=answered).update(status=status)
+    if status == "accepted":
+        befriend(requestee, answered.values())
+    return sorted(answered)
@@ -0,0 +1,246 @@
+"""Friendship checks and friend lists for the users application
+
+Access control all over the api needs to know if two users are friends.
+Loading ``user.friends.all()`` for that builds a model instance for every
+friend, so this module keeps the friend ids of recently seen users as
+sorted ``array("q")`` adjacency lists, 8 bytes per friend, in a process
+local LRU cache optionally backed by a shared django cache
+(``FRIENDS_CACHE_ALIAS``). Membership is a binary search and mutual friends
+are a merge of two sorted arrays. Users that are not cached are answered
+with an indexed EXISTS query on the friends through table.
+
+Invalidation only reaches the local cache of the process that changed the
+friends, so local entries expire after ``FRIENDS_LOCAL_CACHE_TTL`` seconds
+and other workers catch up within that. Friend ids that get cached are
+read from the primary, a lagging replica would cache friendships that no
+longer hold, and invalidating runs again once the transaction commits, as
+a read in between can cache the friends from before the change.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+CACHE_KEY = "friends:array:{}"
+ARRAY_TYPECODE = "q"
+
+
+class FriendIdCache:
+    """Thread safe LRU cache of user id -> sorted array of friend ids,
+    entries expire ``ttl`` seconds after they were set"""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            expires, friend_ids = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return friend_ids
+
+    def set(self, user_id, friend_ids):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[user_id] = (expires, friend_ids)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = FriendIdCache(
+    getattr(settings, "FRIENDS_LOCAL_CACHE_SIZE", 1024),
+    getattr(settings, "FRIENDS_LOCAL_CACHE_TTL", 5),
+)
+
+
+def _user_id(user):
+    """Accept either a user instance or a primary key"""
+    return getattr(user, "pk", user)
+
+
+def _shared_cache():
+    alias = getattr(settings, "FRIENDS_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def _through():
+    return get_user_model().friends.through
+
+
+def _from_blob(user_id, blob):
+    friend_ids = array(ARRAY_TYPECODE)
+    friend_ids.frombytes(blob)
+    local_cache.set(user_id, friend_ids)
+    return friend_ids
+
+
+def _cached_friend_ids(user_id):
+    friend_ids = local_cache.get(user_id)
+    if friend_ids is not None:
+        return friend_ids
+    shared = _shared_cache()
+    if shared is not None:
+        blob = shared.get(CACHE_KEY.format(user_id))
+        if blob is not None:
+            return _from_blob(user_id, blob)
+    return friend_ids
+
+
+async def _acached_friend_ids(user_id):
+    friend_ids = local_cache.get(user_id)
+    if friend_ids is not None:
+        return friend_ids
+    shared = _shared_cache()
+    if shared is not None:
+        blob = await shared.aget(CACHE_KEY.format(user_id))
+        if blob is not None:
+            return _from_blob(user_id, blob)
+    return friend_ids
+
+
+def get_friend_array(user):
+    """Sorted ``array("q")`` with the ids of all the friends of ``user``
+
+    The array is shared with the cache and must not be changed.
+    """
+    user_id = _user_id(user)
+    friend_ids = _cached_friend_ids(user_id)
+    if friend_ids is None:
+        friend_ids = array(
+            ARRAY_TYPECODE,
+            _through()
+            .objects.using(DEFAULT_DB_ALIAS)
+            .filter(from_user_id=user_id)
+            .order_by("to_user_id")
+            .values_list("to_user_id", flat=True),
+        )
+        local_cache.set(user_id, friend_ids)
+        shared = _shared_cache()
+        if shared is not None:
+            shared.set(
+                CACHE_KEY.format(user_id),
+                friend_ids.tobytes(),
+                getattr(settings, "FRIENDS_CACHE_TIMEOUT", 300),
+            )
+    return friend_ids
+
+
+def get_friend_ids(user):
+    """Returns a frozenset with the ids of all the friends of ``user``"""
+    return frozenset(get_friend_array(user))
+
+
+def _contains(friend_ids, user_id):
+    index = bisect_left(friend_ids, user_id)
+    return index < len(friend_ids) and friend_ids[index] == user_id
+
+
+def are_friends(user, other):
+    """True when ``user`` and ``other`` are friends
+
+    Uses the cached friend ids of either side when present, otherwise asks the
+    database with an EXISTS query on the (from_user, to_user) unique index.
+    """
+    user_id, other_id = _user_id(user), _user_id(other)
+    if user_id is None or other_id is None or user_id == other_id:
+        return False
+    friend_ids = _cached_friend_ids(user_id)
+    if friend_ids is not None:
+        return _contains(friend_ids, other_id)
+    friend_ids = _cached_friend_ids(other_id)
+    if friend_ids is not None:
+        return _contains(friend_ids, user_id)
+    return _through().objects.filter(from_user_id=user_id, to_user_id=other_id).exists()
+
+
+async def aare_friends(user, other):
+    """``are_friends`` for async views"""
+    user_id, other_id = _user_id(user), _user_id(other)
+    if user_id is None or other_id is None or user_id == other_id:
+        return False
+    friend_ids = await _acached_friend_ids(user_id)
+    if friend_ids is not None:
+        return _contains(friend_ids, other_id)
+    friend_ids = await _acached_friend_ids(other_id)
+    if friend_ids is not None:
+        return _contains(friend_ids, user_id)
+    return await (
+        _through().objects.filter(from_user_id=user_id, to_user_id=other_id).aexists()
+    )
+
+
+def intersect(first, second):
+    """Ids in both of two sorted arrays, as a sorted array
+
+    Walks both arrays in step, or binary searches the larger one when the
+    other is so much smaller that skipping ahead is cheaper.
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    common = array(ARRAY_TYPECODE)
+    if len(first) * max(len(second).bit_length(), 1) < len(second):
+        lo = 0
+        for user_id in first:
+            lo = bisect_left(second, user_id, lo)
+            if lo == len(second):
+                break
+            if second[lo] == user_id:
+                common.append(user_id)
+        return common
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if first[i] < second[j]:
+            i += 1
+        elif first[i] > second[j]:
+            j += 1
+        else:
+            common.append(first[i])
+            i += 1
+            j += 1
+    return common
+
+
+def mutual_friend_ids(user, other):
+    """Sorted array of the ids of the friends ``user`` and ``other`` share"""
+    return intersect(get_friend_array(user), get_friend_array(other))
+
+
+def invalidate(*users):
+    """Drop the cached friend ids of the given users or user ids, again once
+    the current transaction commits"""
+    user_ids = [_user_id(user) for user in users]
+    _drop(user_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _drop(user_ids))
+
+
+def _drop(user_ids):
+    for user_id in user_ids:
+        local_cache.discard(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([CACHE_KEY.format(user_id) for user_id in user_ids])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from users import suggestions
+
+
+class Command(BaseCommand):
+    help = "Rebuild the friend suggestions of all users from the friends table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users to rebuild per transaction",
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = suggestions.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt friend suggestions of {rebuilt} users")
+        )
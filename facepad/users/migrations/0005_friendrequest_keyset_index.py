@@ -0,0 +1,19 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0004_alter_user_date_of_birth"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="friendrequest",
+            index=models.Index(
+                fields=["requestee", "status", "-created_date", "-id"],
+                name="friendrequest_requestee_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0006_user_auth_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FriendSuggestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mutual_count", models.PositiveIntegerField(default=0)),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="friend_suggestions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="friendsuggestion",
+            index=models.Index(
+                fields=["user", "-mutual_count", "candidate"],
+                name="friendsuggestion_rank_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="friendsuggestion",
+            constraint=models.UniqueConstraint(
+                fields=("user", "candidate"), name="friendsuggestion_user_candidate"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+def drop_duplicate_active_requests(apps, schema_editor):
+    """Keeps only the newest active request of every requestor, requestee pair"""
+    FriendRequest = apps.get_model("users", "FriendRequest")
+    newest = (
+        FriendRequest.objects.filter(status="active")
+        .values("requestor", "requestee")
+        .annotate(newest_id=models.Max("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for pair in newest.iterator():
+        FriendRequest.objects.filter(
+            requestor=pair["requestor"],
+            requestee=pair["requestee"],
+            status="active",
+            id__lt=pair["newest_id"],
+        ).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0007_friend_suggestions"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_active_requests, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="friendrequest",
+            name="friendrequest_requestee_idx",
+        ),
+        migrations.AddIndex(
+            model_name="friendrequest",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["requestee", "-created_date", "-id"],
+                name="friendrequest_active_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="friendrequest",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "active")),
+                fields=("requestor", "requestee"),
+                name="friendrequest_one_active",
+            ),
+        ),
+    ]
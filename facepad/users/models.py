@@ -17,6 +17,9 @@ class User(AbstractUser):
         choices=USER_TYPE_CHOICES,
         default="regular",
     )
+    # bumped when what a user is allowed to do changes, access tokens carry
+    # the version they were issued for so older ones stop working
+    auth_version = models.PositiveIntegerField(default=0)
 
     def update_user_type(self):
         if self.is_staff():  # type: ignore
@@ -49,3 +52,49 @@ class FriendRequest(models.Model):
     )
     status = models.CharField(max_length=8, choices=STATUS_CHOICES, default="active")
     created_date = models.DateField(default=date.today)
+
+    class Meta:
+        constraints = [
+            # also the index for looking up the active request of a pair
+            models.UniqueConstraint(
+                fields=["requestor", "requestee"],
+                condition=models.Q(status="active"),
+                name="friendrequest_one_active",
+            ),
+        ]
+        indexes = [
+            # only active requests are ever listed or answered
+            models.Index(
+                fields=["requestee", "-created_date", "-id"],
+                condition=models.Q(status="active"),
+                name="friendrequest_active_idx",
+            ),
+        ]
+
+
+class FriendSuggestion(models.Model):
+    """Someone ``user`` may know: a friend of a friend and how many friends
+    they have in common, kept up to date as friend requests are accepted"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="friend_suggestions",
+    )
+    candidate = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    mutual_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "candidate"], name="friendsuggestion_user_candidate"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-mutual_count", "candidate"],
+                name="friendsuggestion_rank_idx",
+            ),
+        ]
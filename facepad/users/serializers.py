@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from facepad.metrics import TimedSerializerMixin
 from rest_framework import serializers
-from users.models import FriendRequest
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from users.models import FriendRequest, FriendSuggestion
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for handling the User Model"""
 
     class Meta:
@@ -38,7 +41,16 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class FriendRequestSerializer(serializers.ModelSerializer):
+class FriendSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Public fields of a user in a friend list"""
+
+    class Meta:
+        model = get_user_model()
+        fields = ("username", "first_name", "last_name")
+        read_only_fields = fields
+
+
+class FriendRequestSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for handling the FriendRequest model"""
 
     requestee = serializers.SlugRelatedField(
@@ -55,10 +67,54 @@ class FriendRequestSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_date"]
 
 
-class FriendRequestResponseSerializer(serializers.ModelSerializer):
+class FriendRequestResponseSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for handling the response to requests"""
 
     class Meta:
         model = FriendRequest
         fields = ["id", "requestor", "requestee", "status"]
         read_only_fields = ["id", "requestor", "requestee"]
+
+
+class BulkFriendRequestSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Usernames to send friend requests to"""
+
+    usernames = serializers.ListField(
+        child=serializers.CharField(max_length=150),
+        min_length=1,
+        max_length=settings.FRIEND_REQUEST_BULK_LIMIT,
+    )
+
+
+class BulkFriendRequestResponseSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Ids of friend requests and the answer to all of them"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=settings.FRIEND_REQUEST_BULK_LIMIT,
+    )
+    status = serializers.ChoiceField(choices=["accepted", "rejected"])
+
+
+class FriendSuggestionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Someone the user may know and how many friends they have in common"""
+
+    username = serializers.CharField(source="candidate.username", read_only=True)
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ["username", "mutual_count"]
+        read_only_fields = fields
+
+
+class FacepadTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Tokens that carry what authentication needs to skip loading the user"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["auth_version"] = user.auth_version
+        return token
@@ -0,0 +1,48 @@
+"""Signal handlers for the users application"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from facepad import responsecache
+
+from . import authentication, friendships
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.friends.through)
+def invalidate_friendships(sender, instance, action, pk_set, **kwargs):
+    """Keep the friendship cache in line with the friends table"""
+    if action == "pre_clear":
+        friendships.invalidate(instance, *friendships.get_friend_ids(instance))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        friendships.invalidate(instance, *(pk_set or ()))
+
+
+@receiver(post_save, sender=User)
+def invalidate_new_user_friendships(sender, instance, created, **kwargs):
+    # primary keys can be reused (e.g. after a rollback) so a new user
+    # must never inherit cached friends
+    if created:
+        friendships.invalidate(instance)
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_deleted_user_friendships(sender, instance, **kwargs):
+    friendships.invalidate(instance, *friendships.get_friend_ids(instance))
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    authentication.invalidate(instance)
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_deleted_auth_user(sender, instance, **kwargs):
+    authentication.invalidate(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(pre_delete, sender=User)
+def invalidate_user_responses(sender, instance, **kwargs):
+    responsecache.invalidate(responsecache.USER.format(instance.pk))
@@ -0,0 +1,138 @@
+"""People you may know
+
+Friends of friends are ranked by how many friends they have in common. The
+counts are kept in the FriendSuggestion table so reading them is an index
+range scan instead of a two hop self join of the friends table: every
+accepted friend request recomputes the counts of the pairs it gives a new
+mutual friend, and ``rebuild`` recomputes them from scratch a chunk of users
+at a time.
+"""
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .models import FriendSuggestion
+
+
+def _through():
+    return get_user_model().friends.through
+
+
+def _apply(user_id, removed_ids, counts):
+    """Deletes the suggestions between ``user_id`` and ``removed_ids`` and sets
+    the mutual count of both directions of each (anchor, candidate): count
+    pair of ``counts``"""
+    FriendSuggestion.objects.filter(
+        Q(user_id=user_id, candidate_id__in=removed_ids)
+        | Q(user_id__in=removed_ids, candidate_id=user_id)
+    ).delete()
+    if not counts:
+        return
+    FriendSuggestion.objects.bulk_create(
+        [
+            FriendSuggestion(
+                user_id=user_id, candidate_id=candidate_id, mutual_count=count
+            )
+            for (anchor_id, other_id), count in counts.items()
+            for user_id, candidate_id in ((anchor_id, other_id), (other_id, anchor_id))
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "candidate"],
+        update_fields=["mutual_count"],
+    )
+
+
+@transaction.atomic
+def befriended(user, others):
+    """Updates the suggestions after ``user`` became friends with ``others``
+
+    Called once the friendships are stored. The new friends stop being
+    suggested to ``user`` and the mutual counts of the pairs that gained one
+    of them as a mutual friend are recomputed from the friends table: the
+    friends of each new friend with ``user`` and the friends of ``user`` with
+    each new friend. Recomputing instead of counting up keeps this right when
+    it is called again for friendships that already existed.
+    """
+    user_id = getattr(user, "pk", user)
+    other_ids = sorted({getattr(other, "pk", other) for other in others})
+    Through = _through()
+    friends = {anchor_id: set() for anchor_id in (user_id, *other_ids)}
+    for from_id, to_id in Through.objects.filter(from_user_id__in=friends).values_list(
+        "from_user_id", "to_user_id"
+    ):
+        friends[from_id].add(to_id)
+    user_friends = friends[user_id]
+    pairs = set()
+    for other_id in other_ids:
+        other_friends = friends[other_id]
+        for candidate_id in other_friends - user_friends - {user_id}:
+            pairs.add((user_id, candidate_id))
+        for candidate_id in user_friends - other_friends - {other_id}:
+            if (candidate_id, other_id) not in pairs:
+                pairs.add((other_id, candidate_id))
+    # only the friends of the candidates that can be mutual with an anchor
+    candidate_friends = {}
+    for from_id, to_id in Through.objects.filter(
+        from_user_id__in={candidate_id for _, candidate_id in pairs},
+        to_user_id__in=set().union(*friends.values()),
+    ).values_list("from_user_id", "to_user_id"):
+        candidate_friends.setdefault(from_id, set()).add(to_id)
+    counts = {
+        (anchor_id, candidate_id): len(
+            friends[anchor_id] & candidate_friends.get(candidate_id, set())
+        )
+        for anchor_id, candidate_id in pairs
+    }
+    _apply(user_id, other_ids, counts)
+
+
+def rebuild(batch_size=500):
+    """Recomputes the suggestions of every user from the friends table
+
+    Works through the users in primary key order, ``batch_size`` of them per
+    transaction. Returns the number of users rebuilt.
+    """
+    Through = _through()
+    rebuilt = 0
+    last_pk = 0
+    while True:
+        user_ids = list(
+            get_user_model()
+            .objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return rebuilt
+        friends = {user_id: set() for user_id in user_ids}
+        for user_id, friend_id in Through.objects.filter(
+            from_user_id__in=user_ids
+        ).values_list("from_user_id", "to_user_id"):
+            friends[user_id].add(friend_id)
+        friends_of = {}
+        for friend_id, candidate_id in Through.objects.filter(
+            from_user_id__in=set().union(*friends.values())
+        ).values_list("from_user_id", "to_user_id"):
+            friends_of.setdefault(friend_id, []).append(candidate_id)
+        suggestions = []
+        for user_id in user_ids:
+            counts = Counter(
+                candidate_id
+                for friend_id in friends[user_id]
+                for candidate_id in friends_of.get(friend_id, ())
+            )
+            suggestions += [
+                FriendSuggestion(
+                    user_id=user_id, candidate_id=candidate_id, mutual_count=count
+                )
+                for candidate_id, count in counts.items()
+                if candidate_id != user_id and candidate_id not in friends[user_id]
+            ]
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(user_id__in=user_ids).delete()
+            FriendSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+        rebuilt += len(user_ids)
+        last_pk = user_ids[-1]
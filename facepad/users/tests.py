@@ -1,21 +1,60 @@
 """Tests for the users app
 """
 
+from array import array
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from facepad.testing import (
+    PASSWORD,
+    APIFixturesMixin,
+    QueryBudgetMixin,
+    QueryPlanMixin,
+    befriend,
+    create_user,
+    create_users,
+)
 from rest_framework import status
 from rest_framework.test import APIClient
-from users.models import FriendRequest
+from rest_framework_simplejwt.tokens import AccessToken
+from users import friendships, suggestions
+from users.models import FriendRequest, FriendSuggestion
 
 REGISTER_USER_URL = reverse("users:register")
 LOGIN_USER_URL = reverse("users:login")
 REFRESH_TOKEN_URL = reverse("users:token_refresh")
 
 
-class UserRegistrationAPITest(TestCase):
+# most queries a request to each endpoint may run, see QueryBudgetMixin
+QUERY_BUDGETS = {
+    "users:friend_suggestions": 3,
+    "users:friends": 5,
+    "users:get_friend_requests": 4,
+    "users:get_user GET": 4,
+    "users:get_user PATCH": 4,
+    "users:get_user DELETE": 17,
+    "users:login": 1,
+    "users:mutual_friends": 5,
+    "users:register": 4,
+    "users:request_friend": 5,
+    "users:request_friends_bulk": 6,
+    "users:respond_to_friend_requests_bulk": 20,
+    "users:respond_to_friend_request": 13,
+    "users:token_refresh": 0,
+    "users_async:get_friend_requests": 2,
+}
+
+
+class UserRegistrationAPITest(QueryBudgetMixin, TestCase):
     """Test the User Regitration API"""
 
+    query_budgets = QUERY_BUDGETS
+
     def setUp(self):
         self.client = APIClient()
         self.user_model = get_user_model()
@@ -73,22 +112,14 @@ class UserRegistrationAPITest(TestCase):
         self.assertEqual(user.user_type, "regular")  # type: ignore
 
 
-class UserLoginAPITest(TestCase):
+class UserLoginAPITest(QueryBudgetMixin, TestCase):
     """Test the Login API"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user_model = get_user_model()
+    query_budgets = QUERY_BUDGETS
 
-        payload = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.client.post(REGISTER_USER_URL, payload)
+    @classmethod
+    def setUpTestData(cls):
+        create_user("jdoe")
 
     def test_login_returns_jwt(self):
         payload = {
@@ -111,48 +142,44 @@ class UserLoginAPITest(TestCase):
         self.assertTrue("access" in refresh.data)  # type: ignore
 
 
-class GetUserInfoAPITest(TestCase):
+class GetUserInfoAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """This is a test case to test the requirements for the user info get endpoint"""
 
+    query_budgets = QUERY_BUDGETS
+    payload_user = {
+        "first_name": "John",
+        "last_name": "Doe",
+        "username": "jdoe",
+        "email": "john.doe@gmail.com",
+        "date_of_birth": "1990-02-14",
+    }
+    payload_user_nologin = {
+        "first_name": "Jane",
+        "last_name": "Doe",
+        "username": "jdoe2",
+        "email": "jane.doe@gmail.com",
+        "date_of_birth": "1993-01-21",
+    }
+    payload_user_friend = {
+        "first_name": "Cool",
+        "last_name": "Guy",
+        "username": "cguy",
+        "email": "cool.guy@gmail.com",
+        "date_of_birth": "1993-10-21",
+    }
+
+    @classmethod
+    def setUpFixtures(cls):
+        for payload in (
+            cls.payload_user,
+            cls.payload_user_friend,
+            cls.payload_user_nologin,
+        ):
+            cls.users[payload["username"]] = create_user(**payload)
+
     def setUp(self):
-        self.client = APIClient()
+        super().setUp()
         self.client_noauth = APIClient()
-        self.user_model = get_user_model()
-
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_user_nologin = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-01-21",
-        }
-        self.payload_user_friend = {
-            "first_name": "Cool",
-            "last_name": "Guy",
-            "username": "cguy",
-            "email": "cool.guy@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-10-21",
-        }
-        payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        self.client.post(REGISTER_USER_URL, self.payload_user_friend)
-        self.client_noauth.post(REGISTER_USER_URL, self.payload_user_nologin)
-        login = self.client.post(LOGIN_USER_URL, payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
 
     def test_get_userinfo_loggedin(self):
         """Test to make sure that you get user data when
@@ -239,46 +266,20 @@ class GetUserInfoAPITest(TestCase):
         self.assertEqual(get_user_info.status_code, status.HTTP_404_NOT_FOUND)
 
 
-class CreateFriendRequestAPITest(TestCase):
+class CreateFriendRequestAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """This is a test case to test the create friend request endpoint"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user_model = get_user_model()
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-02-14",
-        }
-        payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        self.client.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2")
 
     def test_create_friend_request_creates_request(self):
         """Make sure that when you send a friend request it gets created"""
         friend_request_url = reverse("users:request_friend")
         payload = {"requestee": "jdoe2", "requestor": ""}
         self.client.post(friend_request_url, payload)
-        fq_query = FriendRequest.objects.filter(
-            requestor__username=self.payload_user["username"]
-        ).filter(requestee__username=self.payload_friend["username"])
+        fq_query = FriendRequest.objects.filter(requestor__username="jdoe").filter(
+            requestee__username="jdoe2"
+        )
         self.assertTrue(fq_query.exists())
 
     def test_create_friend_request_no_multiple_active(self):
@@ -298,49 +299,22 @@ class CreateFriendRequestAPITest(TestCase):
         self.assertEqual(post.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class GetFriendRequestsAPITest(TestCase):
+class GetFriendRequestsAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
     """Testing to make sure get friend requests endpoint works"""
 
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2")
+
+    @classmethod
+    def setUpFixtures(cls):
+        FriendRequest.objects.create(
+            requestor=cls.users["jdoe"], requestee=cls.users["jdoe2"]
+        )
+
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
-        self.user_model = get_user_model()
+        super().setUp()
+        self.client_friend = self.clients["jdoe2"]
         self.get_requests_url = reverse("users:get_friend_requests")
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-02-14",
-        }
-        payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        payload_friend_login = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        self.client.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.friend_request_url = reverse("users:request_friend")
-        payload = {"requestee": "jdoe2", "requestor": ""}
-        self.client.post(self.friend_request_url, payload)
-        login = self.client_friend.post(LOGIN_USER_URL, payload_friend_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_friend.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
 
     def test_get_friend_requests_list(self):
         friend_requests = self.client_friend.get(self.get_requests_url, format="json")
@@ -355,51 +329,41 @@ class GetFriendRequestsAPITest(TestCase):
             friend_requests.status_code, status.HTTP_401_UNAUTHORIZED  # type: ignore
         )
 
+    def test_get_friend_requests_async(self):
+        """Make sure the async view lists the same requests as the sync view"""
+        sync = self.client_friend.get(self.get_requests_url, format="json")
+        get = self.client_friend.get(
+            reverse("users_async:get_friend_requests"), format="json"
+        )
+        self.assertEqual(get.status_code, status.HTTP_200_OK)
+        self.assertEqual(get.content, sync.content)
+        self.assertEqual(get.json()["results"][0]["requestor"], "jdoe")
+
+    def test_get_friend_requests_async_authenticated(self):
+        """Make sure the async view requires an access token"""
+        self.client_friend.credentials()  # type: ignore
+        get = self.client_friend.get(
+            reverse("users_async:get_friend_requests"), format="json"
+        )
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RespondToRequestAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2")
+
+    @classmethod
+    def setUpFixtures(cls):
+        cls.friend_request = FriendRequest.objects.create(
+            requestor=cls.users["jdoe"], requestee=cls.users["jdoe2"]
+        )
 
-class RespondToRequestAPITest(TestCase):
     def setUp(self):
-        self.client = APIClient()
-        self.client_friend = APIClient()
-        self.user_model = get_user_model()
-        self.get_requests_url = reverse("users:get_friend_requests")
+        super().setUp()
+        self.client_friend = self.clients["jdoe2"]
         self.friend_request_respond_url = reverse(
-            "users:respond_to_friend_request", kwargs={"pk": "1"}
+            "users:respond_to_friend_request", kwargs={"pk": self.friend_request.pk}
         )
-        self.payload_user = {
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "jdoe",
-            "email": "john.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1990-02-14",
-        }
-        self.payload_friend = {
-            "first_name": "Jane",
-            "last_name": "Doe",
-            "username": "jdoe2",
-            "email": "jane.doe@gmail.com",
-            "password": "secret",
-            "date_of_birth": "1993-02-14",
-        }
-        payload_login = {
-            "username": "jdoe",
-            "password": "secret",
-        }
-        payload_friend_login = {
-            "username": "jdoe2",
-            "password": "secret",
-        }
-        self.client.post(REGISTER_USER_URL, self.payload_user)
-        self.client.post(REGISTER_USER_URL, self.payload_friend)
-        login = self.client.post(LOGIN_USER_URL, payload_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
-        self.friend_request_url = reverse("users:request_friend")
-        payload = {"requestee": "jdoe2", "requestor": ""}
-        self.client.post(self.friend_request_url, payload)
-        login = self.client_friend.post(LOGIN_USER_URL, payload_friend_login)
-        self.auth_token = login.data["access"]  # type: ignore
-        self.client_friend.credentials(HTTP_AUTHORIZATION="Bearer " + self.auth_token)
 
     def test_request_response_can_change_status(self):
         """Testing to see if the user can change the status
@@ -408,7 +372,7 @@ class RespondToRequestAPITest(TestCase):
         put = self.client_friend.put(
             self.friend_request_respond_url, payload, format="json"
         )
-        request = FriendRequest.objects.get(id=1)
+        request = FriendRequest.objects.get(id=self.friend_request.pk)
         self.assertEqual(request.status, payload["status"])
         self.assertEqual(put.status_code, status.HTTP_200_OK)  # type: ignore
 
@@ -429,14 +393,458 @@ class RespondToRequestAPITest(TestCase):
         put = self.client_friend.put(
             self.friend_request_respond_url, payload, format="json"
         )
-        friend_request = FriendRequest.objects.get(id=1)
-        user_friend = get_user_model().objects.get(
-            username=self.payload_friend["username"]
-        )
-        user = get_user_model().objects.get(username=self.payload_user["username"])
+        friend_request = FriendRequest.objects.get(id=self.friend_request.pk)
+        user_friend = get_user_model().objects.get(username="jdoe2")
+        user = get_user_model().objects.get(username="jdoe")
         is_user_a_friend_of_user_friend = user in user_friend.friends.all()  # type: ignore
         is_user_friend_a_friend_of_user = user_friend in user.friends.all()  # type: ignore
         self.assertEqual(friend_request.status, payload["status"])
         self.assertEqual(put.status_code, status.HTTP_200_OK)  # type: ignore
         self.assertTrue(is_user_a_friend_of_user_friend)
         self.assertTrue(is_user_friend_a_friend_of_user)
+
+
+class FriendshipsTest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the cached friendship checks"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "jdoe2", "bfriend")
+    fixture_friends = (("jdoe", "jdoe2"),)
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.users["jdoe"]
+        self.friend = self.users["jdoe2"]
+        self.other = self.users["bfriend"]
+
+    def test_are_friends_is_symmetric(self):
+        """Friendship is answered for both sides and never for strangers"""
+        self.assertTrue(friendships.are_friends(self.user, self.friend))
+        self.assertTrue(friendships.are_friends(self.friend.id, self.user.id))
+        self.assertFalse(friendships.are_friends(self.user, self.other))
+        self.assertFalse(friendships.are_friends(self.user, self.user))
+
+    def test_are_friends_uses_cached_friend_ids(self):
+        """Once the friend ids are cached no query is needed"""
+        self.assertEqual(friendships.get_friend_ids(self.user), {self.friend.id})
+        with self.assertNumQueries(0):
+            self.assertTrue(friendships.are_friends(self.user, self.friend))
+            self.assertTrue(friendships.are_friends(self.friend, self.user))
+            self.assertFalse(friendships.are_friends(self.user, self.other))
+
+    def test_friend_changes_invalidate_cache(self):
+        """Adding and removing friends is reflected straight away"""
+        friendships.get_friend_ids(self.user)
+        friendships.get_friend_ids(self.other)
+        self.other.friends.add(self.user)  # type: ignore
+        self.assertTrue(friendships.are_friends(self.user, self.other))
+        self.assertEqual(friendships.get_friend_ids(self.other), {self.user.id})
+        self.user.friends.remove(self.friend)  # type: ignore
+        self.assertFalse(friendships.are_friends(self.friend, self.user))
+
+    def test_invalidated_again_on_commit(self):
+        """Friend ids cached before the change commits are dropped on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.friends.add(self.other)  # type: ignore
+            # a concurrent read of the friends from before the change
+            friendships.local_cache.set(self.user.id, array("q", [self.friend.id]))
+        self.assertIsNone(friendships.local_cache.get(self.user.id))
+        self.assertTrue(friendships.are_friends(self.user, self.other))
+
+    def test_local_entries_expire(self):
+        """Local friend ids are only trusted for the ttl of the cache"""
+        cache = friendships.FriendIdCache(2, ttl=0)
+        cache.set(self.user.id, array("q", [self.friend.id]))
+        self.assertIsNone(cache.get(self.user.id))
+        cache = friendships.FriendIdCache(2)
+        cache.set(self.user.id, array("q", [self.friend.id]))
+        self.assertEqual(list(cache.get(self.user.id)), [self.friend.id])
+
+    def test_friend_ids_are_sorted_arrays(self):
+        """Friend ids are cached as compact sorted arrays"""
+        self.user.friends.add(self.other)  # type: ignore
+        friend_ids = friendships.get_friend_array(self.user)
+        self.assertEqual(friend_ids.typecode, "q")
+        self.assertEqual(list(friend_ids), sorted([self.friend.id, self.other.id]))
+
+    def test_intersect_sorted_arrays(self):
+        """Both the merge and the binary search intersection agree with sets"""
+        small = array("q", [3, 50, 900])
+        large = array("q", range(0, 1000, 3))
+        for first, second in ((small, large), (large, small), (large, large)):
+            self.assertEqual(
+                list(friendships.intersect(first, second)),
+                sorted(set(first) & set(second)),
+            )
+
+    def test_mutual_friend_ids(self):
+        """Mutual friends are the friends both users have"""
+        self.other.friends.add(self.friend)  # type: ignore
+        self.assertEqual(
+            list(friendships.mutual_friend_ids(self.user, self.other)),
+            [self.friend.id],
+        )
+        self.assertEqual(
+            list(friendships.mutual_friend_ids(self.user, self.friend)), []
+        )
+
+
+class FriendListAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the friend list and mutual friends endpoints"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "cfriend", "dfriend", "stranger")
+    fixture_friends = (
+        ("jdoe", "bfriend"),
+        ("jdoe", "cfriend"),
+        ("jdoe", "dfriend"),
+        ("bfriend", "cfriend"),
+        ("stranger", "dfriend"),
+    )
+
+    def usernames(self, response):
+        return [user["username"] for user in response.data["results"]]
+
+    def test_friend_list_pages(self):
+        """Make sure friends are listed in pages"""
+        url = reverse("users:friends", kwargs={"username": "jdoe"})
+        get = self.client.get(url, {"page_size": 2})
+        self.assertEqual(self.usernames(get), ["bfriend", "cfriend"])
+        get = self.client.get(get.data["next"])  # type: ignore
+        self.assertEqual(self.usernames(get), ["dfriend"])
+        self.assertIsNone(get.data["next"])  # type: ignore
+
+    def test_friend_list_of_friend(self):
+        """Make sure friends can see each other's friends but others cannot"""
+        get = self.client.get(reverse("users:friends", kwargs={"username": "bfriend"}))
+        self.assertEqual(self.usernames(get), ["jdoe", "cfriend"])
+        get = self.client.get(reverse("users:friends", kwargs={"username": "stranger"}))
+        self.assertEqual(get.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_mutual_friends(self):
+        """Make sure mutual friends are listed for anyone"""
+        get = self.client.get(
+            reverse("users:mutual_friends", kwargs={"username": "stranger"})
+        )
+        self.assertEqual(self.usernames(get), ["dfriend"])
+        get = self.client.get(
+            reverse("users:mutual_friends", kwargs={"username": "bfriend"})
+        )
+        self.assertEqual(self.usernames(get), ["cfriend"])
+
+
+class CachedJWTAuthenticationTest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing authentication from the access token and the user cache"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe",)
+
+    @classmethod
+    def setUpFixtures(cls):
+        cls.users["admin"] = create_user("admin", user_type="admin")
+
+    def setUp(self):
+        super().setUp()
+        self.admin_client = self.clients["admin"]
+        self.user_url = reverse("users:get_user", kwargs={"username": "jdoe"})
+
+    def login(self, username):
+        login = self.client.post(
+            LOGIN_USER_URL, {"username": username, "password": PASSWORD}
+        )
+        return login.data["access"]  # type: ignore
+
+    def test_access_token_carries_claims(self):
+        """Make sure the access token has the auth version and no copy of
+        fields the user can change"""
+        token = AccessToken(self.login("admin"))  # type: ignore
+        self.assertEqual(token["auth_version"], 0)
+        self.assertNotIn("user_type", token)
+
+    def test_minted_token_matches_login(self):
+        """Make sure the tokens of the test fixtures carry the claims of a login"""
+        minted = AccessToken(self.tokens["admin"])  # type: ignore
+        login = AccessToken(self.login("admin"))  # type: ignore
+        for claim in ("token_type", "user_id", "auth_version"):
+            self.assertEqual(minted[claim], login[claim])
+
+    def test_authenticated_request_skips_user_query(self):
+        """Make sure the user is not loaded once it is cached"""
+        self.client.get(self.user_url)
+        with CaptureQueriesContext(connection) as queries:
+            get = self.client.get(self.user_url)
+        self.assertEqual(get.status_code, status.HTTP_200_OK)  # type: ignore
+        # only the requested profile is looked up, never the user by id
+        self.assertTrue(queries)
+        for query in queries:
+            self.assertNotIn('"users_user"."id" = ', query["sql"])
+
+    def test_update_invalidates_cached_user(self):
+        """Make sure changing the user type stops older tokens from working"""
+        self.assertEqual(self.client.get(self.user_url).status_code, 200)
+        put = self.admin_client.patch(self.user_url, {"user_type": "admin"})
+        self.assertEqual(put.status_code, status.HTTP_200_OK)  # type: ignore
+        get = self.client.get(self.user_url)
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.login("jdoe"))
+        self.assertEqual(self.client.get(self.user_url).status_code, 200)
+
+    def test_delete_invalidates_cached_user(self):
+        """Make sure a deleted user cannot keep using its token"""
+        self.assertEqual(self.client.get(self.user_url).status_code, 200)
+        delete = self.admin_client.delete(self.user_url)
+        self.assertEqual(delete.status_code, status.HTTP_204_NO_CONTENT)  # type: ignore
+        get = self.client.get(self.user_url)
+        self.assertEqual(get.status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+
+    def test_user_response_cached_until_changed(self):
+        """Make sure a profile is read from the response cache until it changes"""
+        first = self.client.get(self.user_url)
+        second = self.client.get(self.user_url)
+        self.assertEqual(second.content, first.content)  # type: ignore
+        self.assertLess(second.metrics.queries, first.metrics.queries)  # type: ignore
+        patch = self.admin_client.patch(self.user_url, {"first_name": "Jane"})
+        self.assertEqual(patch.status_code, status.HTTP_200_OK)  # type: ignore
+        get = self.client.get(self.user_url)
+        self.assertEqual(get.data["first_name"], "Jane")  # type: ignore
+
+
+class FriendSuggestionsTest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing the precomputed friend of friend suggestions"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "bfriend", "cfriend", "dfriend", "efriend")
+    # bfriend knows cfriend and dfriend, efriend knows cfriend
+    fixture_friends = (
+        ("bfriend", "cfriend"),
+        ("bfriend", "dfriend"),
+        ("efriend", "cfriend"),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.suggestions_url = reverse("users:friend_suggestions")
+
+    def befriend(self, username, other_username):
+        befriend(self.users[username], self.users[other_username])
+
+    def ranked(self, username):
+        return list(
+            FriendSuggestion.objects.filter(user=self.users[username])
+            .order_by("-mutual_count", "candidate_id")
+            .values_list("candidate__username", "mutual_count")
+        )
+
+    def test_accepted_request_updates_suggestions(self):
+        """Make sure accepting a request suggests the friends of the new friend"""
+        friend_request = FriendRequest.objects.create(
+            requestor=self.users["bfriend"], requestee=self.users["jdoe"]
+        )
+        put = self.client.put(
+            reverse(
+                "users:respond_to_friend_request", kwargs={"pk": friend_request.pk}
+            ),
+            {"status": "accepted"},
+            format="json",
+        )
+        self.assertEqual(put.status_code, status.HTTP_200_OK)
+        get = self.client.get(self.suggestions_url)
+        self.assertEqual(
+            get.data["results"],  # type: ignore
+            [
+                {"username": "cfriend", "mutual_count": 1},
+                {"username": "dfriend", "mutual_count": 1},
+            ],
+        )
+        self.assertIn(("jdoe", 1), self.ranked("dfriend"))
+
+    def test_crossing_requests_count_once(self):
+        """Make sure accepting both of two crossing requests, and befriending
+        someone who already is a friend, counts the mutual friends once"""
+        for requestor, requestee in (("bfriend", "jdoe"), ("jdoe", "bfriend")):
+            friend_request = FriendRequest.objects.create(
+                requestor=self.users[requestor], requestee=self.users[requestee]
+            )
+            put = self.clients[requestee].put(
+                reverse(
+                    "users:respond_to_friend_request",
+                    kwargs={"pk": friend_request.pk},
+                ),
+                {"status": "accepted"},
+                format="json",
+            )
+            self.assertEqual(put.status_code, status.HTTP_200_OK)
+        self.befriend("jdoe", "bfriend")
+        self.assertEqual(self.ranked("jdoe"), [("cfriend", 1), ("dfriend", 1)])
+        self.assertIn(("jdoe", 1), self.ranked("cfriend"))
+
+    def test_mutual_friends_add_up(self):
+        """Make sure every mutual friend counts and friends are not suggested"""
+        self.befriend("jdoe", "bfriend")
+        self.befriend("jdoe", "efriend")
+        self.assertEqual(self.ranked("jdoe"), [("cfriend", 2), ("dfriend", 1)])
+        self.befriend("jdoe", "cfriend")
+        self.assertEqual(self.ranked("jdoe"), [("dfriend", 1)])
+        self.assertNotIn("jdoe", [name for name, _ in self.ranked("cfriend")])
+
+    def test_befriended_again_changes_nothing(self):
+        """Make sure updating the suggestions for existing friendships again
+        leaves the mutual counts as they are"""
+        self.befriend("jdoe", "bfriend")
+        self.befriend("jdoe", "efriend")
+        before = {username: self.ranked(username) for username in self.users}
+        suggestions.befriended(self.users["jdoe"], [self.users["bfriend"]])
+        suggestions.befriended(self.users["efriend"], [self.users["jdoe"]])
+        self.assertEqual(
+            {username: self.ranked(username) for username in self.users}, before
+        )
+        self.assertEqual(before["jdoe"], [("cfriend", 2), ("dfriend", 1)])
+
+    def test_rebuild_matches_incremental_updates(self):
+        """Make sure the rebuild command computes the same suggestions"""
+        self.befriend("jdoe", "bfriend")
+        self.befriend("jdoe", "efriend")
+        incremental = {username: self.ranked(username) for username in self.users}
+        FriendSuggestion.objects.all().delete()
+        call_command("rebuild_friend_suggestions", batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            {username: self.ranked(username) for username in self.users}, incremental
+        )
+
+
+class BulkFriendRequestAPITest(APIFixturesMixin, QueryBudgetMixin, TestCase):
+    """Testing sending and answering friend requests in bulk"""
+
+    query_budgets = QUERY_BUDGETS
+    fixture_users = ("jdoe", "afriend", "bfriend", "cfriend", "dfriend")
+    fixture_friends = (("afriend", "bfriend"), ("cfriend", "dfriend"))
+
+    def setUp(self):
+        super().setUp()
+        self.send_url = reverse("users:request_friends_bulk")
+        self.respond_url = reverse("users:respond_to_friend_requests_bulk")
+
+    def test_send_requests_in_bulk(self):
+        """Make sure requests are created and the rest is reported as skipped"""
+        self.clients["jdoe"].post(
+            reverse("users:request_friend"), {"requestee": "cfriend", "requestor": ""}
+        )
+        post = self.clients["jdoe"].post(
+            self.send_url,
+            {"usernames": ["afriend", "bfriend", "cfriend", "jdoe", "nobody"]},
+            format="json",
+        )
+        self.assertEqual(post.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [request["requestee"] for request in post.data["created"]],  # type: ignore
+            ["afriend", "bfriend"],
+        )
+        self.assertEqual(
+            set(post.data["skipped"]), {"cfriend", "jdoe", "nobody"}  # type: ignore
+        )
+        self.assertEqual(
+            FriendRequest.objects.filter(requestor=self.users["jdoe"]).count(), 3
+        )
+
+    def test_accept_requests_in_bulk(self):
+        """Make sure accepting many requests befriends everyone at once"""
+        request_ids = [
+            FriendRequest.objects.create(
+                requestor=self.users[username], requestee=self.users["jdoe"]
+            ).id
+            for username in ("afriend", "cfriend", "dfriend")
+        ]
+        post = self.clients["jdoe"].post(
+            self.respond_url,
+            {"ids": [*request_ids, 999], "status": "accepted"},
+            format="json",
+        )
+        self.assertEqual(post.status_code, status.HTTP_200_OK)
+        self.assertEqual(post.data["answered"], request_ids)  # type: ignore
+        self.assertEqual(post.data["skipped"], [999])  # type: ignore
+        jdoe = self.users["jdoe"]
+        self.assertEqual(
+            set(jdoe.friends.values_list("username", flat=True)),  # type: ignore
+            {"afriend", "cfriend", "dfriend"},
+        )
+        self.assertTrue(friendships.are_friends(self.users["cfriend"], jdoe))
+        self.assertFalse(
+            FriendRequest.objects.filter(requestee=jdoe, status="active").exists()
+        )
+
+    def test_accept_in_bulk_matches_rebuilt_suggestions(self):
+        """Make sure a batch of accepts counts mutual friends exactly once"""
+        for username in ("afriend", "bfriend", "cfriend"):
+            FriendRequest.objects.create(
+                requestor=self.users[username], requestee=self.users["jdoe"]
+            )
+        ids = list(FriendRequest.objects.values_list("id", flat=True))
+        self.clients["jdoe"].post(
+            self.respond_url, {"ids": ids, "status": "accepted"}, format="json"
+        )
+        incremental = sorted(
+            FriendSuggestion.objects.values_list("user", "candidate", "mutual_count")
+        )
+        call_command("rebuild_friend_suggestions", stdout=StringIO())
+        self.assertEqual(
+            sorted(
+                FriendSuggestion.objects.values_list(
+                    "user", "candidate", "mutual_count"
+                )
+            ),
+            incremental,
+        )
+
+    def test_reject_requests_in_bulk(self):
+        """Make sure only the requests sent to the user can be answered"""
+        mine = FriendRequest.objects.create(
+            requestor=self.users["afriend"], requestee=self.users["jdoe"]
+        )
+        theirs = FriendRequest.objects.create(
+            requestor=self.users["afriend"], requestee=self.users["cfriend"]
+        )
+        post = self.clients["jdoe"].post(
+            self.respond_url,
+            {"ids": [mine.id, theirs.id], "status": "rejected"},
+            format="json",
+        )
+        self.assertEqual(post.data["answered"], [mine.id])  # type: ignore
+        mine.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertEqual((mine.status, theirs.status), ("rejected", "active"))
+
+
+class FriendRequestIndexTest(QueryPlanMixin, TestCase):
+    """Testing that the friend request lookups are index scans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend = create_users("jdoe", "jdoe2")
+
+    def test_active_requests_use_partial_index(self):
+        """Listing the active requests of a user is a range of the partial index"""
+        self.assertUsesIndex(
+            FriendRequest.objects.filter(requestee=self.user, status="active").order_by(
+                "-created_date", "-id"
+            ),
+            "friendrequest_active_idx",
+        )
+
+    def test_active_pair_uses_unique_constraint(self):
+        """The active request of a pair is found through its unique index"""
+        self.assertUsesIndex(
+            FriendRequest.objects.filter(
+                requestor=self.user, requestee=self.friend, status="active"
+            ),
+            "friendrequest_one_active",
+            sorted_by_index=False,
+        )
+
+    def test_one_active_request_per_pair(self):
+        """The database refuses a second active request for a pair"""
+        FriendRequest.objects.create(requestor=self.user, requestee=self.friend)
+        FriendRequest.objects.create(
+            requestor=self.user, requestee=self.friend, status="rejected"
+        )
+        with self.assertRaises(IntegrityError):
+            FriendRequest.objects.create(requestor=self.user, requestee=self.friend)
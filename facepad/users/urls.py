@@ -2,9 +2,14 @@ from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from .views import (
+    BulkFriendRequestResponse,
+    BulkRequestFriends,
+    FriendListView,
     FriendRequestResponse,
+    FriendSuggestionsView,
     GetFriendRequests,
     GetUserView,
+    MutualFriendsView,
     RegisterView,
     RequestFriend,
 )
@@ -16,11 +21,32 @@ urlpatterns = [
     path("auth/login/", TokenObtainPairView.as_view(), name="login"),
     path("auth/token-refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("user/<username>/", GetUserView.as_view(), name="get_user"),
+    path("user/<username>/friends/", FriendListView.as_view(), name="friends"),
+    path(
+        "user/<username>/friends/mutual/",
+        MutualFriendsView.as_view(),
+        name="mutual_friends",
+    ),
     path("friends/friend-request/", RequestFriend.as_view(), name="request_friend"),
+    path(
+        "friends/friend-request/bulk/",
+        BulkRequestFriends.as_view(),
+        name="request_friends_bulk",
+    ),
     path("friends/requests/", GetFriendRequests.as_view(), name="get_friend_requests"),
     path(
         "friends/request/response/<int:pk>",
         FriendRequestResponse.as_view(),
         name="respond_to_friend_request",
     ),
+    path(
+        "friends/request/response/bulk/",
+        BulkFriendRequestResponse.as_view(),
+        name="respond_to_friend_requests_bulk",
+    ),
+    path(
+        "friends/suggestions/",
+        FriendSuggestionsView.as_view(),
+        name="friend_suggestions",
+    ),
 ]
@@ -1,13 +1,25 @@
+from bisect import bisect_right
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from facepad import responsecache
 from rest_framework import generics, status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from users.models import FriendRequest
+from users.models import FriendRequest, FriendSuggestion
 
+from . import authentication, friendrequests, friendships
 from .serializers import (
+    BulkFriendRequestResponseSerializer,
+    BulkFriendRequestSerializer,
     FriendRequestResponseSerializer,
     FriendRequestSerializer,
+    FriendSerializer,
+    FriendSuggestionSerializer,
     UserSerializer,
 )
 
@@ -28,21 +40,23 @@ class GetUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     lookup_field = "username"
     lookup_url_kwarg = "username"
+    permission_fields = ("user_type", "is_active", "is_staff", "is_superuser")
 
     def get(self, request, *args, **kwargs):
         desired_user = get_user_model().objects.get(
             username=self.kwargs[self.lookup_url_kwarg]
         )
-        if request.user.user_type == "admin":
-            return super().get(request, *args, **kwargs)
-        elif desired_user == self.request.user:
-            return super().get(request, *args, **kwargs)
-        elif desired_user in self.request.user.friends.all():  # type: ignore
-            return super().get(request, *args, **kwargs)
-        else:
+        visibility = responsecache.visibility(request.user, desired_user.pk)
+        if visibility is None:
             return Response(
                 status=status.HTTP_404_NOT_FOUND, data={"message", "user not found"}
             )
+        return responsecache.cached(
+            request,
+            [responsecache.USER.format(desired_user.pk)],
+            visibility,
+            partial(super().get, request, *args, **kwargs),
+        )
 
     def put(self, request, *args, **kwargs):
         if request.user.user_type == "admin":
@@ -68,6 +82,21 @@ class GetUserView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_404_NOT_FOUND, data={"message", "user not found"}
             )
 
+    def perform_update(self, serializer):
+        user = serializer.instance
+        permissions = [getattr(user, field) for field in self.permission_fields]
+        user = serializer.save()
+        if permissions != [getattr(user, field) for field in self.permission_fields]:
+            # tokens issued before the change must not keep the old rights
+            get_user_model().objects.filter(pk=user.pk).update(
+                auth_version=F("auth_version") + 1
+            )
+        authentication.invalidate(user)
+
+    def perform_destroy(self, instance):
+        authentication.invalidate(instance)
+        super().perform_destroy(instance)
+
 
 class RequestFriend(generics.CreateAPIView):
     queryset = FriendRequest.objects.all()
@@ -75,16 +104,13 @@ class RequestFriend(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        query = (
-            FriendRequest.objects.filter(
-                requestee__username=serializer.validated_data["requestee"]
-            )
-            .filter(requestor=self.request.user)
-            .filter(status="active")
-        )
-        if query.exists():
+        # one active request per pair is enforced by the database, checking
+        # first would leave a window for a concurrent duplicate
+        try:
+            with transaction.atomic():
+                serializer.save(requestor=self.request.user)  # type: ignore
+        except IntegrityError:
             raise ValidationError("Friend request is still active")
-        serializer.save(requestor=self.request.user)  # type: ignore
 
 
 class GetFriendRequests(generics.ListAPIView):
@@ -114,13 +140,113 @@ class FriendRequestResponse(generics.UpdateAPIView):
         ).filter(status="active")
         return super().get_queryset()
 
+    @transaction.atomic
     def perform_update(self, serializer):
-        if serializer.validated_data["status"] == "rejected":
-            serializer.save()
-        elif serializer.validated_data["status"] == "accepted":
-            fq = FriendRequest.objects.get(id=int(self.kwargs["pk"]))
-            requestor = get_user_model().objects.get(id=fq.requestor.id)
-            requestee = get_user_model().objects.get(id=fq.requestee.id)
-            requestee.friends.add(requestor)  # type: ignore
-            requestee.save()
-            serializer.save()
+        friend_request = serializer.save()
+        if friend_request.status == "accepted":
+            friendrequests.befriend(
+                friend_request.requestee_id, [friend_request.requestor_id]
+            )
+
+
+class BulkRequestFriends(generics.GenericAPIView):
+    """Endpoint to send friend requests to a list of usernames at once"""
+
+    serializer_class = BulkFriendRequestSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            created, skipped = friendrequests.send(
+                request.user, serializer.validated_data["usernames"]
+            )
+        except IntegrityError:
+            raise ValidationError("Friend requests changed meanwhile, try again")
+        return Response(
+            status=status.HTTP_201_CREATED,
+            data={
+                "created": FriendRequestSerializer(created, many=True).data,
+                "skipped": skipped,
+            },
+        )
+
+
+class BulkFriendRequestResponse(generics.GenericAPIView):
+    """Endpoint to accept or reject a list of friend requests at once"""
+
+    serializer_class = BulkFriendRequestResponseSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        request_ids = serializer.validated_data["ids"]
+        answered = friendrequests.respond(
+            request.user, request_ids, serializer.validated_data["status"]
+        )
+        return Response(
+            data={
+                "answered": answered,
+                "skipped": sorted(set(request_ids) - set(answered)),
+            }
+        )
+
+
+class FriendSuggestionsView(generics.ListAPIView):
+    """People the user may know, most friends in common first"""
+
+    serializer_class = FriendSuggestionSerializer
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ("-mutual_count", "candidate_id")
+
+    def get_queryset(self):
+        return FriendSuggestion.objects.filter(user=self.request.user).select_related(
+            "candidate"
+        )
+
+
+class FriendListView(generics.ListAPIView):
+    """Friends of a user, shown to the user, their friends and admins"""
+
+    serializer_class = FriendSerializer
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ("id",)
+
+    def get_user(self):
+        return get_object_or_404(
+            get_user_model().objects.only("id"), username=self.kwargs["username"]
+        )
+
+    def get_friend_ids(self, user):
+        """Sorted array of the ids to list"""
+        if responsecache.visibility(self.request.user, user.id) is None:
+            raise NotFound("user not found")
+        return friendships.get_friend_array(user)
+
+    def list(self, request, *args, **kwargs):
+        friend_ids = self.get_friend_ids(self.get_user())
+        position = self.paginator.decode_cursor(request)
+        if position is not None and not (
+            len(position) == 1 and isinstance(position[0], int)
+        ):
+            raise NotFound(self.paginator.invalid_cursor_message)
+        start = bisect_right(friend_ids, position[0]) if position else 0
+        page_ids = friend_ids[start : start + self.paginator.get_page_size(request) + 1]
+        rows = (
+            get_user_model()
+            .objects.filter(id__in=page_ids)
+            .order_by("id")
+            .values("id", *self.serializer_class.Meta.fields)
+        )
+        page = self.paginator.paginate_rows(list(rows), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class MutualFriendsView(FriendListView):
+    """Friends the user has in common with another user"""
+
+    def get_friend_ids(self, user):
+        return friendships.mutual_friend_ids(self.request.user, user)